@@ -1,63 +1,204 @@
+# -*- coding: utf-8 -*-
+'''
+@author: Marian Aldenhövel <marian.aldenhoevel@marian-aldenhoevel.de>
+'''
+
+# When does each of the challenges come round?
+#
+# Every day of a date range is mapped to its configuration of month, day and weekday in
+# one go with NumPy over a datetime64 range. From that we get the day on which each
+# configuration appears first, the intervals after which it repeats and the streaks of
+# days that bring a new challenge or only repeats. A full 400 year Gregorian cycle takes
+# milliseconds, so the solvers can use this to schedule configurations by when they
+# are needed.
+
+import time
 import datetime
+import argparse
+
+import numpy
+
+import Placements
+
+# The configuration key of each day, see Placements.configurationkey().
+def configurationkeys(dates):
+    months = dates.astype('datetime64[M]')
+    month = months.astype(numpy.int64) % 12 + 1
+    day = (dates - months).astype(numpy.int64) + 1
+
+    # 1970-01-01 was a Thursday.
+    weekday = (dates.astype(numpy.int64) + 3) % 7
+
+    return ((month - 1) * 31 + (day - 1)) * 7 + weekday
+
+# Analyse the given number of days from start. Returns a dict of NumPy arrays:
+#
+#   dates, keys    Each day and its configuration key.
+#   isnew          Wether a day brings a configuration not seen before in the range.
+#   first          Index of the first day with each configuration key, -1 if it does not appear.
+#   count          Number of days with each configuration key.
+#   mininterval,   Shortest and longest number of days between two appearances of each
+#   maxinterval    configuration key, 0 if it does not repeat.
+#   intervals      The number of days between any two consecutive appearances of a configuration.
+#   streaks        Runs of days that all are new or all are repeats, as rows of first day
+#                  index, number of days and wether they are new.
+def analyse(start, days):
+    start = numpy.datetime64(start, 'D')
+    dates = numpy.arange(start, start + days)
+    keys = configurationkeys(dates)
+
+    result = {
+        'dates': dates,
+        'keys': keys
+    }
+
+    # First appearance and number of appearances of each configuration.
+    uniquekeys, firstindex, counts = numpy.unique(keys, return_index = True, return_counts = True)
+    first = numpy.full(Placements.CONFIGURATIONS, -1, dtype = numpy.int64)
+    first[uniquekeys] = firstindex
+    count = numpy.zeros(Placements.CONFIGURATIONS, dtype = numpy.int64)
+    count[uniquekeys] = counts
+    isnew = numpy.zeros(len(dates), dtype = bool)
+    isnew[firstindex] = True
+
+    result['first'] = first
+    result['count'] = count
+    result['isnew'] = isnew
+
+    # Sorted by configuration, in order of date within each, consecutive entries of the same
+    # configuration are one repeat.
+    order = numpy.argsort(keys, kind = 'stable')
+    sortedkeys = keys[order]
+    repeats = sortedkeys[1:] == sortedkeys[:-1]
+    intervals = numpy.diff(order)[repeats]
+    intervalkeys = sortedkeys[1:][repeats]
+
+    mininterval = numpy.zeros(Placements.CONFIGURATIONS, dtype = numpy.int64)
+    maxinterval = numpy.zeros(Placements.CONFIGURATIONS, dtype = numpy.int64)
+    if len(intervals):
+        groups = numpy.concatenate([[0], numpy.flatnonzero(numpy.diff(intervalkeys)) + 1])
+        mininterval[intervalkeys[groups]] = numpy.minimum.reduceat(intervals, groups)
+        maxinterval[intervalkeys[groups]] = numpy.maximum.reduceat(intervals, groups)
+
+    result['intervals'] = intervals
+    result['mininterval'] = mininterval
+    result['maxinterval'] = maxinterval
+
+    # Streaks of new days and of repeats.
+    starts = numpy.concatenate([[0], numpy.flatnonzero(isnew[1:] != isnew[:-1]) + 1])
+    lengths = numpy.diff(numpy.concatenate([starts, [len(dates)]]))
+    result['streaks'] = numpy.stack([starts, lengths, isnew[starts]], axis = 1)
+
+    return result
 
-for y in range(2022,2024):
-    d = datetime.datetime(y,2,28)
-    if d.weekday()==1:
-        print(d)
-quit()
-
-
-challenges = []
-repeating = False
-stretch = 0
-year = 2022
-while True:
-    print(f'{year}:')
-    start = datetime.date(year,1,1)
-    end = datetime.date(year,12,31)
-    d = start
-    unique = 0
-    repeat = 0
-    while d<=end:
-        challenge = f'{d.month:02d}-{d.day:02d}-{d.weekday()}'
-        stretch += 1
-        if not challenge in challenges:
-            unique += 1
-            challenges.append(challenge)
-            if repeating:
-                print(f'  first unique {d} after {stretch} days')
-                stretch = 0
-            repeating = False
-            if len(challenges) == 366*7:
-                break
-        else:
-            repeat += 1
-            if not repeating:
-                print(f'  first repeat {d} after {stretch} days')
-                stretch = 0
-            repeating = True
-
-        d = d + datetime.timedelta(days=1)
-
-    print(f'  ({unique} unique, {repeat} repeats)')
-
-    if len(challenges) == 366*7:
-        print(f'{d}: Done, all {len(challenges)} challenges have been seen here.')
-        break
-    
-    year += 1
+# The first date from start on for each configuration that appears within the given
+# number of days, as {(month, day, weekday): datetime.date}.
+def firstdates(start, days):
+    analysis = analyse(start, days)
+    result = {}
+    for key in numpy.flatnonzero(analysis['first'] >= 0):
+        result[Placements.configurationfromkey(int(key))] = analysis['dates'][analysis['first'][key]].item()
+    return result
+
+def isodate(value):
+    return datetime.date.fromisoformat(value)
+
+# Set up argparse and get the command line options.
+def parse_commandline():
+    parser = argparse.ArgumentParser(
+        description = 'Analyse when the challenges of the calendar puzzle appear and repeat.'
+    )
+
+    parser.add_argument('-s', '--start',
+        action = 'store',
+        default = datetime.date(2022, 1, 1),
+        type = isodate,
+        help = 'First day to analyse (default: %(default)s)',
+        dest = 'start',
+        metavar = 'date'
+    )
+
+    parser.add_argument('-y', '--years',
+        action = 'store',
+        default = 400,
+        type = int,
+        help = 'Number of years to analyse, 400 is a full Gregorian cycle (default: %(default)s)',
+        dest = 'years',
+        metavar = 'years'
+    )
+
+    parser.add_argument('-c', '--configurations',
+        action = 'store_true',
+        help = 'List first appearance and repeat intervals of each configuration',
+        dest = 'configurations'
+    )
+
+    return parser.parse_args()
+
+def main():
+    options = parse_commandline()
+
+    end = datetime.date(options.start.year + options.years, options.start.month, 1) + (options.start - options.start.replace(day = 1))
+    days = (end - options.start).days
+
+    started = time.perf_counter()
+    analysis = analyse(options.start, days)
+    duration = time.perf_counter() - started
+
+    dates = analysis['dates']
+    isnew = analysis['isnew']
+    total = int(numpy.count_nonzero(analysis['count']))
+    newindex = numpy.flatnonzero(isnew)
+
+    print(f'Analysed {days} days from {options.start} in {duration*1000:.1f} ms. {total} challenges appear.')
+
+    # Per year until everything has been seen.
+    last = newindex[-1] if len(newindex) else 0
+    years = dates[:last+1].astype('datetime64[Y]')
+    bounds = numpy.concatenate([[0], numpy.flatnonzero(years[1:] != years[:-1]) + 1])
+    unique = numpy.add.reduceat(isnew[:last+1], bounds)
+    streaks = analysis['streaks']
+    for year, first, n in zip(years[bounds], bounds, unique):
+        print(f'{year}:')
+        for streakstart, length, new in streaks[(streaks[:, 0] >= first) & (streaks[:, 0] <= last)]:
+            if (streakstart > 0) and (dates[streakstart].astype('datetime64[Y]') == year):
+                kind = 'unique' if new else 'repeat'
+                print(f'  first {kind} {dates[streakstart]} after {streaks[streaks[:, 0] < streakstart][-1][1]} days')
+        print(f'  ({n} unique, {(years == year).sum() - n} repeats)')
+
+    print(f'{dates[last]}: Done, all {total} challenges have been seen here.')
+
+    # How long until a challenge comes round again.
+    intervals, counts = numpy.unique(analysis['intervals'], return_counts = True)
+    print('Repeat intervals:')
+    for interval, n in sorted(zip(intervals, counts), key = lambda entry: -entry[1])[:10]:
+        print(f'  {interval:6d} days ({interval/365.2425:5.2f} years): {n} times')
+
+    if options.configurations:
+        for key in numpy.flatnonzero(analysis['count']):
+            month, day, weekday = Placements.configurationfromkey(int(key))
+            print('{name}: first {first}, {count} times, every {mininterval} to {maxinterval} days'.format(
+                name=Placements.catalogname(month, day, weekday),
+                first=dates[analysis['first'][key]],
+                count=analysis['count'][key],
+                mininterval=analysis['mininterval'][key],
+                maxinterval=analysis['maxinterval'][key]
+            ))
+
+if __name__ == '__main__':
+    main()
 
 '''
 This puzzle offers challenges for all 366 valid dates and each weekday for a total of 2562 individual challenges.
 
-Starting on January 1st 2022 there is a new puzzle for 2191 consecutive days up to and including December 31st 2027. 
+Starting on January 1st 2022 there is a new puzzle for 2191 consecutive days up to and including December 31st 2027.
 The year 2028 starts on a Saturday just like 2022, but because it is a leap year there are only 31+29=59 puzzles repeated until
-there is a fresh one on February 29th. 
+there is a fresh one on February 29th.
 
-Then it repeats again through to a new challenge on March 1st 2029. There follow 306 new challenges in 2029 and 59 new ones in 2030 
+Then it repeats again through to a new challenge on March 1st 2029. There follow 306 new challenges in 2029 and 59 new ones in 2030
 where we will have seen everything from March 1st on.
 
 The five remaining new challenges appear on the leap days in 2032, 2036, 2040, 2044 and 2048.
 
-From January 1st 2049 on the cycle repeats. But Facebook will propably have forgotten the solutions by then. 
-'''
\ No newline at end of file
+From January 1st 2049 on the cycle repeats. But Facebook will propably have forgotten the solutions by then.
+'''
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+'''
+@author: Marian Aldenhövel <marian.aldenhoevel@marian-aldenhoevel.de>
+'''
+
+# Writes solutions to the catalog from a background thread.
+#
+# The solver hands each solution to put() and carries on. A writer thread takes them
+# from a bounded queue, appends everything that has arrived in the meantime to the
+# solution journal in one go and syncs it to disk once per batch. Optionally it also
+# writes the first solution of each configuration as a JSON file to the catalog folder
+# like the solvers always did, so existing tools keep working.
+
+import os
+import json
+import queue
+import atexit
+import logging
+import threading
+
+import Placements
+import SolutionPack
+
+class CatalogWriter:
+
+  def __init__(self, journalfile, jsonfolder = None, batchsize = 1000, queuesize = 10000):
+    self.journalfile = journalfile
+    self.jsonfolder = jsonfolder
+    self.batchsize = batchsize
+    self.queue = queue.Queue(maxsize = queuesize)
+    self.thread = threading.Thread(target = self.run, name = 'CatalogWriter', daemon = True)
+    self.written = 0
+    self.jsonwritten = set()
+    self.batches = 0
+    self.error = None
+
+  def start(self):
+    self.thread.start()
+
+    # Make sure everything queued is on disk even if the solver just quits.
+    atexit.register(self.close)
+
+    return self
+
+  # Queue a solution for writing. Only blocks if the writer is far behind.
+  def put(self, configuration, solution):
+    if self.error:
+      raise self.error
+    self.queue.put((configuration, solution))
+
+  # Block until everything queued so far is written and synced to disk.
+  def flush(self):
+    if self.thread.is_alive():
+      written = threading.Event()
+      self.queue.put(written)
+      written.wait()
+    if self.error:
+      raise self.error
+
+  # Write what is still queued and stop the writer thread.
+  def close(self):
+    if self.thread.is_alive():
+      self.queue.put(None)
+      self.thread.join()
+
+  def run(self):
+    logger = logging.getLogger('CatalogWriter')
+
+    flushed = []
+    try:
+      with SolutionPack.openjournal(self.journalfile) as journal:
+        done = False
+        while not done:
+          # Wait for the first solution, then take whatever else is queued up to the
+          # batch size without waiting.
+          batch = [self.queue.get()]
+          while (len(batch) < self.batchsize) and (batch[-1] is not None):
+            try:
+              batch.append(self.queue.get_nowait())
+            except queue.Empty:
+              break
+
+          if batch[-1] is None:
+            done = True
+            batch.pop()
+
+          # Events queued by flush() are set once the solutions before them are on disk.
+          flushed = [item for item in batch if isinstance(item, threading.Event)]
+          batch = [item for item in batch if not isinstance(item, threading.Event)]
+
+          if batch:
+            journal.write(b''.join(SolutionPack.journalrecord(configuration, solution) for configuration, solution in batch))
+            journal.flush()
+            os.fsync(journal.fileno())
+
+            if self.jsonfolder:
+              for configuration, solution in batch:
+                self.writejson(configuration, solution)
+
+            self.written += len(batch)
+            self.batches += 1
+            logger.debug(f'Wrote batch of {len(batch)} solutions, {self.written} in total.')
+
+          for event in flushed:
+            event.set()
+
+    except Exception as e:
+      logger.exception('Writing the catalog failed')
+      self.error = e
+
+      for event in flushed:
+        event.set()
+
+      # Keep draining so the solver does not block on a full queue or a flush.
+      while True:
+        item = self.queue.get()
+        if item is None:
+          break
+        if isinstance(item, threading.Event):
+          item.set()
+
+  # Write the solution as JSON unless the configuration already has one.
+  def writejson(self, configuration, solution):
+    if configuration in self.jsonwritten:
+      return
+    self.jsonwritten.add(configuration)
+
+    destname = os.path.join(self.jsonfolder, Placements.catalogname(*configuration) + '.json')
+    if not os.path.isfile(destname):
+      with open(destname, 'w') as f:
+        json.dump(Placements.jsonfromsolution(solution, configuration), f, sort_keys = True, indent = 4)
@@ -1,5 +1,10 @@
 import os
+import sys
 import math
+import json
+import argparse
+import functools
+import multiprocessing
 import cairo
 
 '''
@@ -86,135 +91,234 @@ def update_point(point, direction):
         print(f"Unsupported direction '{direction}'")
         quit()
 
-# For elegance we want to do the least number of cuts, so we want to join the paths defined above.
-# The (arbitrary) goal is to find the combination with the lowest number of individual cuts and 
-# the longest ones at that.
-#
-# Here is a naive implementation of an exhaustive search:
-'''
+# Move point along a list of steps and return where it ends.
 def walk_path(point, steps):
     for step in steps:
         point = update_point(point, step)
     return point
 
-def reverse_path(steps):
-    result = ''
-
-    for direction in steps[::-1]:
-        if direction.upper() == 'N':
-            result += 'S'
-        elif direction.upper() == 'W':
-            result += 'E'
-        elif direction.upper() == 'S':
-            result += 'N'
-        elif direction.upper() == 'E':
-            result += 'W'
-        else:
-            print(f"Unsupported direction '{direction}'")
-            quit()
-
-    return result
-
-bestroute=None
-
-def join_paths(pathstojoin):
-    # pathstojoin is a list of paths defined by starting point and steps
-    # to take from there.
-    # Find all possible ways of joining two of the entries. That can be done if
-    # either of the two ends are the same. For each of these possible joins
-    # simplify the list and recurse down.
-    # If there are no more possible joins evaluate the result and if it is better
-    # than bestroute replace bestroute.
-
-    global bestroute
-
-    for n in range(len(pathstojoin)-1):
-        start1, steps1 = pathstojoin[n]
-        end1 = walk_path(start1, steps1)
-
-        for m in range(n+1, len(pathstojoin)):
-            start2, steps2 = pathstojoin[m]
-            end2 = walk_path(start2, steps2)
-
-        # There are four ways we can join paths:
-        new = None
-        if end1 == start2:
-            # 1) The second starts at the end of the first one: Just do them in succession.
-            new = (start1, steps1 + steps2)  
-        elif end1 == end2:
-            # 2) The ends coincide: To the first one and then the second in reverse. 
-            new = (start1, steps1 + reverse_path(steps2))
-        elif start1 == start2:
-            # 3) They start at the same place: Start at the end of the first one, do that in reverse, then the second one.
-            new = (end1, reverse_path(steps1) + steps2)
-        elif end2 == start1:
-            # 4) The second one ends at the start of the first one: Like case 1, but in reversed order.
-            new = (start2, steps2 + steps1)
-
-        if new:
-            # We have found a way to join two paths. Update
-            # the list and recurse.
-            newpaths = pathstojoin.copy()
-            del newpaths[m]
-            del newpaths[n]
-            newpaths.append(new)
-            join_paths(newpaths)
-        else:
-            # Nothing left to join.
-            if bestroute:
-                if len(pathstojoin) < len(bestroute):
-                    # Less parts is better.
-                    bestroute = pathstojoin.copy()
-                    print(f"New best: {len(bestroute)} parts.")
-                    print(bestroute)
-                elif len(pathstojoin) == len(bestroute):
-                    # Add squares of lengths. The longer one wins.
-                    bestlen = 0
-                    for start, steps in bestroute:
-                        bestlen += len(steps)**2
-                    
-                    newlen = 0
-                    for start, steps in pathstojoin:
-                        newlen += len(steps)**2
-
-                    if newlen > bestlen:
-                        bestroute = pathstojoin.copy()
-                        print(f"New best: {len(bestroute)} parts, len^2 = {newlen}.")
-                        print(bestroute)
-                    else:
-                        # Not a better route than what we already have.
-                        pass    
-                else:
-                    # Not a better route than what we already have. 
-                    pass
-            else:
-                bestroute = pathstojoin.copy()
-                print(f"New best: {len(bestroute)} parts.")
-                print(bestroute)
-'''
+# The direction of one grid step from point a to point b.
+def step_direction(a, b):
+    return {(0, -1): 'N', (-1, 0): 'W', (0, 1): 'S', (1, 0): 'E'}[(b[0]-a[0], b[1]-a[1])]
 
-# Or: Just use this, found by a combination of the code above and manual scribbling:
-bestroute = [
-    ((5, 8), 'EENNNWSSWWNENWNNNENESSWSEEESSSSSWWWNWWWWNNNNNNNEESWSESWW'),
-    ((3, 1), 'EE'), 
-    ((3, 3), 'E'), 
-    ((6, 1), 'ESSES'), 
-    ((1, 5), 'EEE'), 
-    ((5, 4), 'S'), 
-    ((7, 4), 'S'), 
-    ((1, 7), 'ENEE'), 
-    ((4, 7), 'S'), 
-    ((7, 8), 'E')
-]
+# Head travel between two points.
+def distance(a, b):
+    return math.hypot(b[0]-a[0], b[1]-a[1])
+
+# For elegance we want to do the least number of cuts, and we want the laser head to travel
+# as little as possible between them. The paths above are treated as a graph of unit edges
+# between grid points.
+#
+# A connected graph can be cut in one continuous stroke if at most two points have an odd
+# number of edges. So the points with odd degree are paired up and each pair joined by
+# a travel move. With those every point has even degree, and an Eulerian circuit through
+# each connected part visits every edge exactly once. Split at the travel moves this gives
+# the least possible number of strokes: half the number of odd points.
+#
+# The strokes are then ordered to keep travel short, starting from the origin, by nearest
+# neighbour and improved by 2-opt.
+
+# Pair up the odd points with least total distance. Exact by dynamic programming over
+# subsets for up to MAX_EXACT_PAIRING points, greedy with pairwise improvement above that.
+MAX_EXACT_PAIRING = 16
+
+def pair_points(points):
+    n = len(points)
+    if n <= MAX_EXACT_PAIRING:
+        # cost[mask] is the least total distance pairing up the points in mask, partner[mask]
+        # the point paired with the lowest one for that.
+        d = [[distance(a, b) for b in points] for a in points]
+        cost = [0.0] * (1 << n)
+        partner = [0] * (1 << n)
+        for mask in range(3, 1 << n):
+            if bin(mask).count('1') % 2:
+                continue
+            i = (mask & -mask).bit_length() - 1
+            rest = mask ^ (1 << i)
+            best = None
+            bits = rest
+            while bits:
+                bit = bits & -bits
+                bits ^= bit
+                j = bit.bit_length() - 1
+                c = d[i][j] + cost[rest ^ bit]
+                if best is None or c < best:
+                    best = c
+                    partner[mask] = j
+            cost[mask] = best
+
+        pairs = []
+        mask = (1 << n) - 1
+        while mask:
+            i = (mask & -mask).bit_length() - 1
+            j = partner[mask]
+            pairs.append((i, j))
+            mask &= ~((1 << i) | (1 << j))
+    else:
+        # Greedy: closest pairs first.
+        candidates = sorted((distance(points[i], points[j]), i, j) for i in range(n) for j in range(i+1, n))
+        paired = set()
+        pairs = []
+        for _, i, j in candidates:
+            if i not in paired and j not in paired:
+                pairs.append((i, j))
+                paired.update((i, j))
+
+        # Then swap partners between two pairs as long as that helps.
+        improved = True
+        while improved:
+            improved = False
+            for p in range(len(pairs)):
+                for q in range(p+1, len(pairs)):
+                    a, b = pairs[p]
+                    c, d = pairs[q]
+                    current = distance(points[a], points[b]) + distance(points[c], points[d])
+                    for swapped in [((a, c), (b, d)), ((a, d), (b, c))]:
+                        cost = sum(distance(points[i], points[j]) for i, j in swapped)
+                        if cost < current - 1e-9:
+                            pairs[p], pairs[q] = swapped
+                            a, b = pairs[p]
+                            c, d = pairs[q]
+                            current = cost
+                            improved = True
+
+    return [(points[i], points[j]) for i, j in pairs]
+
+# Decompose the paths into the least number of continuous strokes. Returns each stroke
+# as a list of points.
+def find_strokes(paths):
+    edges = set()
+    for point, steps in paths:
+        for step in steps:
+            nextpoint = update_point(point, step)
+            edges.add(tuple(sorted([point, nextpoint])))
+            point = nextpoint
+
+    # Edges as (a, b, travel), travel moves are added for the pairs of odd points.
+    edgelist = [(a, b, False) for a, b in sorted(edges)]
+    degree = {}
+    for a, b, _ in edgelist:
+        degree[a] = degree.get(a, 0) + 1
+        degree[b] = degree.get(b, 0) + 1
+    odd = sorted(point for point in degree if degree[point] % 2)
+    edgelist += [(a, b, True) for a, b in pair_points(odd)]
+
+    adjacent = {}
+    for i, (a, b, _) in enumerate(edgelist):
+        adjacent.setdefault(a, []).append((b, i))
+        adjacent.setdefault(b, []).append((a, i))
+
+    # Hierholzer's algorithm, for each connected part in turn. The circuit is kept as
+    # the list of points and the edges taken between them.
+    used = [False] * len(edgelist)
+    strokes = []
+    for first in sorted(adjacent):
+        if all(used[i] for _, i in adjacent[first]):
+            continue
+
+        stack = [(first, None)]
+        circuit = []
+        while stack:
+            point, via = stack[-1]
+            while adjacent[point] and used[adjacent[point][-1][1]]:
+                adjacent[point].pop()
+            if adjacent[point]:
+                nextpoint, i = adjacent[point].pop()
+                used[i] = True
+                stack.append((nextpoint, i))
+            else:
+                circuit.append(stack.pop())
+        circuit.reverse()
+
+        # Cut the circuit at the travel moves. Start after one of them, if there is one,
+        # so no stroke wraps around the end.
+        travels = [k for k in range(1, len(circuit)) if edgelist[circuit[k][1]][2]]
+        if travels:
+            k = travels[0]
+            circuit = circuit[k:] + circuit[1:k+1]
+
+        stroke = [circuit[0][0]]
+        for point, via in circuit[1:]:
+            if edgelist[via][2]:
+                strokes.append(stroke)
+                stroke = [point]
+            else:
+                stroke.append(point)
+        if len(stroke) > 1:
+            strokes.append(stroke)
+
+    return strokes
+
+# Head travel for cutting the strokes in the given order, each given as (index, reversed).
+def travel_length(strokes, order, origin):
+    position = origin
+    total = 0
+    for index, reverse in order:
+        stroke = strokes[index]
+        start, end = (stroke[-1], stroke[0]) if reverse else (stroke[0], stroke[-1])
+        total += distance(position, start)
+        position = end
+    return total
+
+# Order the strokes and pick their directions for short travel between them.
+def order_strokes(strokes, origin = (0, 0)):
+    # Nearest neighbour: always go to the closest end of a stroke not cut yet.
+    remaining = set(range(len(strokes)))
+    order = []
+    position = origin
+    while remaining:
+        _, index, reverse = min(
+            (distance(position, strokes[i][-1 if r else 0]), i, r) for i in remaining for r in [False, True])
+        order.append((index, reverse))
+        remaining.remove(index)
+        position = strokes[index][0 if reverse else -1]
+
+    # 2-opt: Cutting a run of strokes backwards, in reverse order and direction, may shorten
+    # the travel into and out of it.
+    best = travel_length(strokes, order, origin)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(order)):
+            for j in range(i, len(order)):
+                candidate = order[:i] + [(index, not reverse) for index, reverse in reversed(order[i:j+1])] + order[j+1:]
+                length = travel_length(strokes, candidate, origin)
+                if length < best - 1e-9:
+                    order, best = candidate, length
+                    improved = True
+
+    return [strokes[index][::-1] if reverse else strokes[index] for index, reverse in order]
+
+# Plan the cuts for the paths: The least number of strokes in an order with short travel,
+# each as starting point and steps like the paths themselves.
+def plan_cuts(paths):
+    strokes = order_strokes(find_strokes(paths))
+    return [(stroke[0], ''.join(step_direction(a, b) for a, b in zip(stroke, stroke[1:]))) for stroke in strokes]
 
 FILENAME_TOP = 'top_and_parts.svg'
 FILENAME_BOTTOM = 'bottom.svg'
 
+# Space between boards nested on one sheet.
+SHEET_GAP = 5
+
 # https://pycairo.readthedocs.io/en/latest/reference/index.html
 
 # Global pyCairo context used by all the common drawing functions.
 context = None
 
+# A board variant as a dict. Everything not given in a variant file is taken from the
+# constants at the top.
+def make_variant(data = None):
+    data = data or {}
+    return {
+        'name': data.get('name', ''),
+        'day_names': data.get('day_names', DAY_NAMES),
+        'month_names': data.get('month_names', MONTH_NAMES),
+        'dedication': data.get('dedication', DEDICATION),
+        'font': data.get('font', FONTNAME),
+        'grid': data.get('grid', GRID)
+    }
+
 # Switch context to cutting. See your service provider design guidelines or the
 # rules your cutting software uses. 
 def set_to_cut():    
@@ -242,156 +346,272 @@ def roundrect(x, y, w, h, r):
     context.stroke()
     
 # Cut the outside border. This is common to both top and bottom layers.
-def cut_outside_border():
+def cut_outside_border(grid):
     set_to_cut()
-    roundrect((    0.3) * GRID, (    0.3) * GRID, (9 - 0.3 - 0.3) *GRID, (10 - 0.3 - 0.3) * GRID, GRID/4)
+    roundrect((    0.3) * grid, (    0.3) * grid, (9 - 0.3 - 0.3) *grid, (10 - 0.3 - 0.3) * grid, grid/4)
+
+# Measuring text is slow and the same labels come up for every board, so measurements are
+# cached per font, size and text. They are taken on an SVG surface without output so they
+# match what the boards are drawn on.
+measure_context = None
+
+@functools.lru_cache(maxsize = None)
+def text_extents(fontname, font_size, text):
+    global measure_context
+
+    if measure_context is None:
+        measure_context = cairo.Context(cairo.SVGSurface(None, 1, 1))
+    measure_context.select_font_face(fontname, cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL)
+    measure_context.set_font_size(font_size)
+    return tuple(measure_context.text_extents(text))
+
+# Select font and size for drawing text.
+def set_font(fontname, font_size):
+    context.select_font_face(fontname, cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL)
+    context.set_font_size(font_size)
 
 # Draw text centered in grid cell.
-def center_text_in_cell(cellx, celly, text):
-    x_bearing, y_bearing, width, height, x_advance, y_advance = context.text_extents(text)
+def center_text_in_cell(cellx, celly, text, grid, fontname, font_size):
+    x_bearing, y_bearing, width, height, x_advance, y_advance = text_extents(fontname, font_size, text)
 
-    tx = (cellx + 0.5) * GRID - x_bearing - width/2
-    ty = (celly + 0.5) * GRID - y_bearing - height/2
+    tx = (cellx + 0.5) * grid - x_bearing - width/2
+    ty = (celly + 0.5) * grid - y_bearing - height/2
 
     context.move_to(tx, ty)
     context.text_path(text)
     context.stroke()
 
-def main():
-    global context
-    
-    # Uncomment, if you also uncommented the optimization code at the top.
-    # join_paths(paths)
-
-    # Remove existing output files so we are not confused by old versions if something goes wrong.
-    if os.path.exists(FILENAME_TOP):
-        os.remove(FILENAME_TOP)
+# Draw the top layer of one board at the origin. This has a border, the dedication if any,
+# and the parts themselves.
+def draw_top(variant, cuts):
+    grid = variant['grid']
+    dedication = variant['dedication']
 
-    if os.path.exists(FILENAME_BOTTOM):
-        os.remove(FILENAME_BOTTOM)
-
-    # Draw the top layer. This has a border, the dedication if any, and the parts themselves.
-    with cairo.SVGSurface(FILENAME_TOP, 9*GRID, 10*GRID) as surface:
-        context = cairo.Context(surface)
+    # Engrave the dedication.
+    if dedication:
+        set_to_engrave()
+        font_size = 0.4 * grid
+ 
+        available_width = (4 - 0.2) * grid
+        available_height = (1 - 0.2) * grid 
+
+        x_bearing, y_bearing, width, height, x_advance, y_advance = text_extents(variant['font'], font_size, dedication)
+        scalex = available_width / width
+        scaley = available_height / height
+        if scalex < 1.0 or scaley < 1.0:
+            scale = min(scalex, scaley)
+            font_size = font_size * scale
+
+        x_bearing, y_bearing, width, height, x_advance, y_advance = text_extents(variant['font'], font_size, dedication)
         
-        # Engrave the dedication.
-        if DEDICATION:
-            set_to_engrave()
-            font_size = 0.4 * GRID
-            context.set_font_size(font_size)
-            context.select_font_face(FONTNAME, cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL)
-     
-            available_width = (4 - 0.2) * GRID
-            available_height = (1 - 0.2) * GRID 
-
-            x_bearing, y_bearing, width, height, x_advance, y_advance = context.text_extents(DEDICATION)
-            scalex = available_width / width
-            scaley = available_height / height
-            if scalex < 1.0 or scaley < 1.0:
-                scale = min(scalex, scaley)
-                font_size = font_size * scale
-                context.set_font_size(font_size)
-
-            x_bearing, y_bearing, width, height, x_advance, y_advance = context.text_extents(DEDICATION)
-            
-            # Center in available rect.
-            tx = 3 * GRID - x_bearing - width/2
-            ty = (8 + 0.5) * GRID - y_bearing - height/2
-
-            # OR: Left-Justify
-            tx = 1 * GRID - x_bearing
-            
-            # OR: Bottom-Justify with bottom row
-            ty = 9 * GRID - y_bearing - height
-
-            context.move_to(tx, ty)
-            context.text_path(DEDICATION)
-            context.stroke()
-             
-        # Cut each path as specified.
-        set_to_cut()
-        for p, steps in bestroute:
-            # For debugging: Draw a circle at the starting point.
-            '''
-            context.arc(p[0] * GRID, p[1] * GRID, 0.5, 0, 2*math.pi)
-            context.stroke()
-            '''
-
-            # Move to starting point.
-            context.move_to(p[0] * GRID, p[1] * GRID)
-            
-            # Cut a line for each step.
-            for direction in steps:        
-                p = update_point(p, direction)
-                context.line_to(p[0] * GRID, p[1] * GRID)
-            
-            # One path segment done.
-            context.stroke()
+        # Center in available rect.
+        tx = 3 * grid - x_bearing - width/2
+        ty = (8 + 0.5) * grid - y_bearing - height/2
 
-            # For debugging: Draw a circle at the end point.
-            '''
-            context.arc(p[0] * GRID, p[1] * GRID, 0.5, 0, 2*math.pi)
-            context.stroke()
-            '''
+        # OR: Left-Justify
+        tx = 1 * grid - x_bearing
+        
+        # OR: Bottom-Justify with bottom row
+        ty = 9 * grid - y_bearing - height
 
-        cut_outside_border()
+        set_font(variant['font'], font_size)
+        context.move_to(tx, ty)
+        context.text_path(dedication)
+        context.stroke()
+         
+    # Cut each path as planned.
+    set_to_cut()
+    for p, steps in cuts:
+        # For debugging: Draw a circle at the starting point.
+        '''
+        context.arc(p[0] * grid, p[1] * grid, 0.5, 0, 2*math.pi)
+        context.stroke()
+        '''
 
-    with cairo.SVGSurface(FILENAME_BOTTOM, 9*GRID, 10*GRID) as surface:
-        context = cairo.Context(surface)
+        # Move to starting point.
+        context.move_to(p[0] * grid, p[1] * grid)
+        
+        # Cut a line for each step.
+        for direction in steps:        
+            p = update_point(p, direction)
+            context.line_to(p[0] * grid, p[1] * grid)
+        
+        # One path segment done.
+        context.stroke()
 
-        # Engrave inside border. Could be useful in alignment on assembly.
+        # For debugging: Draw a circle at the end point.
         '''
-        set_to_engrave()
-        context.move_to(1 * GRID, 1 * GRID)
-        context.line_to(7 * GRID, 1 * GRID)
-        context.line_to(7 * GRID, 3 * GRID)
-        context.line_to(8 * GRID, 3 * GRID)
-        context.line_to(8 * GRID, 9 * GRID)
-        context.line_to(5 * GRID, 9 * GRID)
-        context.line_to(5 * GRID, 8 * GRID)
-        context.line_to(1 * GRID, 8 * GRID)
-        context.line_to(1 * GRID, 1 * GRID)
+        context.arc(p[0] * grid, p[1] * grid, 0.5, 0, 2*math.pi)
         context.stroke()
         '''
 
-        # Engrave vertical grid lines.
-        set_to_engrave()
-        for x in range(2, 8):
-            context.move_to(x * GRID, (1 if x<7 else 3) * GRID)
-            context.line_to(x * GRID, (8 if x<6 else 9) * GRID)
-            context.stroke()
-        
-        # Engrave horizontal grid lines.
-        set_to_engrave()
-        for y in range(2, 9):
-            context.move_to((1 if y<8 else 5) * GRID, y * GRID)
-            context.line_to((7 if y<4 else 8) * GRID, y * GRID)
-            context.stroke()
+    cut_outside_border(grid)
+
+# Draw the bottom layer of one board at the origin.
+def draw_bottom(variant):
+    grid = variant['grid']
+
+    # Engrave inside border. Could be useful in alignment on assembly.
+    '''
+    set_to_engrave()
+    context.move_to(1 * grid, 1 * grid)
+    context.line_to(7 * grid, 1 * grid)
+    context.line_to(7 * grid, 3 * grid)
+    context.line_to(8 * grid, 3 * grid)
+    context.line_to(8 * grid, 9 * grid)
+    context.line_to(5 * grid, 9 * grid)
+    context.line_to(5 * grid, 8 * grid)
+    context.line_to(1 * grid, 8 * grid)
+    context.line_to(1 * grid, 1 * grid)
+    context.stroke()
+    '''
+
+    # Engrave vertical grid lines.
+    set_to_engrave()
+    for x in range(2, 8):
+        context.move_to(x * grid, (1 if x<7 else 3) * grid)
+        context.line_to(x * grid, (8 if x<6 else 9) * grid)
+        context.stroke()
+    
+    # Engrave horizontal grid lines.
+    set_to_engrave()
+    for y in range(2, 9):
+        context.move_to((1 if y<8 else 5) * grid, y * grid)
+        context.line_to((7 if y<4 else 8) * grid, y * grid)
+        context.stroke()
+    
+    # Engrave labels for dates.
+    set_to_engrave()
+    font_size = 0.4 * grid
+    set_font(variant['font'], font_size)
+ 
+    # Month names:
+    for m in range(0, 12):
+        center_text_in_cell(1 + m%6, 1 + m//6, variant['month_names'][m], grid, variant['font'], font_size)
+
+    # Day numbers:
+    for d in range(0, 31):
+        center_text_in_cell(1 + d%7, 3 + d//7, str(d+1), grid, variant['font'], font_size)
+
+    # Weekday names:
+    for w in range(0, 7):
+        x = 4 + w%4
+        y = 7 + w//4
+        if w>3:
+            x += 1
+        center_text_in_cell(x, y, variant['day_names'][w], grid, variant['font'], font_size)
         
-        # Engrave labels for dates.
-        set_to_engrave()
-        context.set_font_size(0.4 * GRID)
-        context.select_font_face(FONTNAME, cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL)
-     
-        # Month names:
-        for m in range(0, 12):
-            center_text_in_cell(1 + m%6, 1 + m//6, MONTH_NAMES[m])
-
-        # Day numbers:
-        for d in range(0, 31):
-            center_text_in_cell(1 + d%7, 3 + d//7, str(d+1))
-
-        # Weekday names:
-        for w in range(0, 7):
-            x = 4 + w%4
-            y = 7 + w//4
-            if w>3:
-                x += 1
-            center_text_in_cell(x, y, DAY_NAMES[w])
-            
-        cut_outside_border()
+    cut_outside_border(grid)
+
+# Draw the top and bottom layers of a sheet with one or more boards side by side. Returns
+# the names of the files written.
+def draw_sheet(boards, filename_top, filename_bottom, cuts):
+    global context
+
+    # Remove existing output files so we are not confused by old versions if something goes wrong.
+    for filename in [filename_top, filename_bottom]:
+        if os.path.exists(filename):
+            os.remove(filename)
+
+    width = sum(9 * variant['grid'] for variant in boards) + SHEET_GAP * (len(boards) - 1)
+    height = max(10 * variant['grid'] for variant in boards)
+
+    for filename, draw_board in [(filename_top, lambda variant: draw_top(variant, cuts)), (filename_bottom, draw_bottom)]:
+        with cairo.SVGSurface(filename, width, height) as surface:
+            context = cairo.Context(surface)
+
+            x = 0
+            for variant in boards:
+                context.save()
+                context.translate(x, 0)
+                draw_board(variant)
+                context.restore()
+                x += 9 * variant['grid'] + SHEET_GAP
+
+    return [filename_top, filename_bottom]
+
+def draw_sheet_job(job):
+    return draw_sheet(*job)
+
+# Set up argparse and get the command line options.
+def parse_commandline():
+    parser = argparse.ArgumentParser(
+        description = 'Draw the cut files for the calendar puzzle.'
+    )
+
+    parser.add_argument('-v', '--variants',
+        action = 'store',
+        default = None,
+        help = 'JSON file with a list of board variants to draw, each with any of name, day_names, month_names, dedication, font and grid (default: one board from the constants in this file)',
+        dest = 'variants',
+        metavar = 'file'
+    )
+
+    parser.add_argument('-n', '--nest',
+        action = 'store',
+        default = 1,
+        type = int,
+        help = 'Number of boards to nest side by side on one sheet (default: %(default)s)',
+        dest = 'nest',
+        metavar = 'count'
+    )
+
+    parser.add_argument('-j', '--jobs',
+        action = 'store',
+        default = os.cpu_count(),
+        type = int,
+        help = 'Number of sheets to draw in parallel (default: %(default)s)',
+        dest = 'jobs',
+        metavar = 'count'
+    )
+
+    return parser.parse_args()
+
+def main():
+    options = parse_commandline()
+
+    if options.variants:
+        with open(options.variants, encoding = 'utf-8') as f:
+            variants = [make_variant(data) for data in json.load(f)]
+
+        # Every board drawn on a sheet of its own goes to the folder named after it, so
+        # unnamed variants are numbered and names must not repeat.
+        for n, variant in enumerate(variants):
+            if not variant['name']:
+                variant['name'] = f'variant{n + 1:02d}'
+        names = [variant['name'] for variant in variants]
+        duplicates = sorted(set(name for name in names if names.count(name) > 1))
+        if duplicates:
+            sys.exit(f"{options.variants}: Variant names used more than once: {', '.join(duplicates)}")
+    else:
+        variants = [make_variant()]
+
+    # The cuts are the same for every board, only scaled.
+    cuts = plan_cuts(paths)
+
+    # Sheets of options.nest boards each. A single board goes to the usual file names, in a
+    # folder named after the variant if it has a name.
+    jobs = []
+    for first in range(0, len(variants), options.nest):
+        boards = variants[first:first + options.nest]
+        if len(boards) == 1:
+            folder = boards[0]['name']
+            prefix = ''
+        else:
+            folder = ''
+            prefix = f'sheet{first // options.nest + 1:02d}_'
+        if folder:
+            os.makedirs(folder, exist_ok = True)
+        jobs.append((boards, os.path.join(folder, prefix + FILENAME_TOP), os.path.join(folder, prefix + FILENAME_BOTTOM), cuts))
+
+    if len(jobs) == 1 or options.jobs <= 1:
+        for filenames in map(draw_sheet_job, jobs):
+            print(f"Wrote {', '.join(filenames)}")
+    else:
+        with multiprocessing.Pool(min(options.jobs, len(jobs))) as pool:
+            for filenames in pool.imap_unordered(draw_sheet_job, jobs):
+                print(f"Wrote {', '.join(filenames)}")
 
 if __name__ == "__main__":
 
     main()
-
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+'''
+@author: Marian Aldenhövel <marian.aldenhoevel@marian-aldenhoevel.de>
+'''
+
+# Distinct orientations of the parts.
+#
+# A part can be turned in steps of 90 degrees and, if allowed, flipped over. Depending
+# on its symmetry several of these eight attitudes give the same shape, and a solver
+# that tries all of them finds every solution more than once. This module works out
+# for a catalog of parts which (ismirrored, rotation) pairs give distinct shapes, in the
+# convention the calling solver uses to mirror and rotate.
+#
+# The result is computed once per catalog and convention and kept as a small JSON file
+# in .cache next to the programs, keyed by a hash of the catalog.
+
+import os
+import json
+import hashlib
+import logging
+
+cachefolder = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+
+# Shift a list of cells so that the bounding box starts at (0, 0). Returns a sorted
+# tuple so the result can be compared and hashed.
+def normalize(cellist):
+  minx = min(x for x, y in cellist)
+  miny = min(y for x, y in cellist)
+  return tuple(sorted((x - minx, y - miny) for x, y in cellist))
+
+# The convention of Solver1.py, Solver2.py and Placements.py: Mirror along x, then rotate
+# counter-clockwise.
+def shapelyconvention(cellist, ismirrored, rotation):
+  p = [(-x, y) for x, y in cellist] if ismirrored else list(cellist)
+  for _ in range(0, (rotation // 90) % 4):
+    p = [(-y, x) for x, y in p]
+  return normalize(p)
+
+# The convention of Solver3.py: Mirror by reversing the columns of the array, then rotate
+# clockwise.
+def arrayconvention(cellist, ismirrored, rotation):
+  p = [(x, -y) for x, y in cellist] if ismirrored else list(cellist)
+  for _ in range(0, (rotation // 90) % 4):
+    p = [(y, -x) for x, y in p]
+  return normalize(p)
+
+conventions = {
+  'shapely': shapelyconvention,
+  'array': arrayconvention
+}
+
+# The (ismirrored, rotation) pairs that give distinct shapes of one part, unmirrored
+# first and in order of rotation. Mirror images are only considered if mirror is set.
+def distinct(cellist, convention, mirror = True):
+  result = []
+  shapes = set()
+  for ismirrored in ([False, True] if mirror else [False]):
+    for rotation in [0, 90, 180, 270]:
+      shape = convention(cellist, ismirrored, rotation)
+      if shape not in shapes:
+        shapes.add(shape)
+        result.append((ismirrored, rotation))
+  return result
+
+# Hash of a catalog given as {name: (cellist, mirror)}. The position of a part's cells
+# does not matter, only its shape.
+def catalogkey(catalog, conventionname):
+  data = [conventionname] + [(name, normalize(cellist), bool(mirror)) for name, (cellist, mirror) in sorted(catalog.items())]
+  return hashlib.sha1(repr(data).encode('ascii')).hexdigest()[:16]
+
+tables = {}
+
+# The distinct orientations of all parts of a catalog given as {name: (cellist, mirror)},
+# as {name: [(ismirrored, rotation), ...]}. Read from the cache if it was computed before.
+def table(catalog, conventionname = 'shapely'):
+  logger = logging.getLogger('Orientations')
+
+  key = catalogkey(catalog, conventionname)
+  if key in tables:
+    return tables[key]
+
+  filename = os.path.join(cachefolder, f'orientations-{key}.json')
+  try:
+    with open(filename, 'r') as f:
+      result = {name: [tuple(orientation) for orientation in orientations] for name, orientations in json.load(f).items()}
+    if sorted(result.keys()) == sorted(catalog.keys()):
+      tables[key] = result
+      return result
+  except (OSError, ValueError):
+    pass
+
+  convention = conventions[conventionname]
+  result = {name: distinct(cellist, convention, mirror) for name, (cellist, mirror) in catalog.items()}
+  tables[key] = result
+
+  # The cache is only an optimization, so do not fail if it cannot be written.
+  try:
+    os.makedirs(cachefolder, exist_ok = True)
+    tmpname = filename + '.tmp'
+    with open(tmpname, 'w') as f:
+      json.dump(result, f, sort_keys = True)
+    os.replace(tmpname, filename)
+    logger.debug(f'Cached orientations of {len(catalog)} parts in {filename}')
+  except OSError as e:
+    logger.debug(f'Could not cache orientations in {filename}: {e}')
+
+  return result
@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+'''
+@author: Marian Aldenhövel <marian.aldenhoevel@marian-aldenhoevel.de>
+'''
+
+# Canonical geometry of the calendar puzzle.
+#
+# The three solvers each model the board and the parts in their own way and store
+# the placement of a part as name, x/y-offset, rotation and mirror-flag in their own
+# coordinate system. This module maps all of them onto one board: The cells are
+# numbered 0..49 (months, then days, then weekdays) and every way a part can lie on
+# the board is an entry in a fixed placement table. A complete solution then is just
+# one index into that table for each of the ten parts.
+#
+# Board coordinates are those of Solver3.py and Render.py: x runs 0..6 from left to
+# right, y runs 0..7 from the bottom row (Thu, Fri, Sat) to the top row of months.
+
+import hashlib
+import functools
+
+import Orientations
+
+monthlabels = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+weekdaylabels = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+BOARDWIDTH = 7
+BOARDHEIGHT = 8
+
+# Number of slots for configurations if indexed by month, day and weekday. This includes
+# some impossible ones like Feb 31st, those simply remain empty.
+CONFIGURATIONS = 12 * 31 * 7
+
+def monthcell(month):
+  return ((month-1) % 6, 7 - (month-1) // 6)
+
+def daycell(day):
+  return ((day-1) % 7, 5 - (day-1) // 7)
+
+def weekdaycell(weekday):
+  return [(4, 1), (5, 1), (6, 1), (4, 0), (5, 0), (6, 0), (3, 1)][weekday]
+
+# The cells of the board in index order and what each of them stands for.
+boardcells = []
+cellkinds = []
+for month in range(1, 13):
+  boardcells.append(monthcell(month))
+  cellkinds.append(('month', month))
+for day in range(1, 32):
+  boardcells.append(daycell(day))
+  cellkinds.append(('day', day))
+for weekday in range(0, 7):
+  boardcells.append(weekdaycell(weekday))
+  cellkinds.append(('weekday', weekday))
+
+cellindex = {cell: i for i, cell in enumerate(boardcells)}
+
+def mask(cells):
+  result = 0
+  for cell in cells:
+    result |= 1 << cellindex[cell]
+  return result
+
+def cells(m):
+  return [boardcells[i] for i in range(len(boardcells)) if m & (1 << i)]
+
+# The parts as lists of cells. This is the catalog of Solver3.py.
+partcells = {
+  'A': [(0, 0), (1, 0), (2, 0), (3, 0)],
+  'B': [(0, 0), (1, 0), (2, 0), (3, 0), (0, 1)],
+  'C': [(0, 0), (1, 0), (2, 0), (0, 1)],
+  'D': [(0, 0), (1, 0), (2, 0), (1, 1), (1, 2)],
+  'E': [(0, 0), (1, 0), (1, 1), (1, 2), (2, 2)],
+  'F': [(0, 0), (1, 0), (0, 1), (1, 1), (2, 1)],
+  'G': [(0, 0), (1, 0), (2, 0), (2, 1), (2, 2)],
+  'H': [(0, 0), (1, 0), (2, 0), (0, 1), (2, 1)],
+  'I': [(0, 0), (1, 0), (2, 0), (2, 1), (3, 1)],
+  'J': [(0, 0), (1, 0), (1, 1), (2, 1)]
+}
+
+# The parts as outlines. This is the catalog of Solver1.py and Solver2.py.
+partoutlines = {
+  'A': [(0, 0), (4, 0), (4, 1), (0, 1), (0, 0)],
+  'B': [(0, 0), (4, 0), (4, 2), (3, 2), (3, 1), (0, 1), (0, 0)],
+  'C': [(0, 0), (3, 0), (3, 2), (2, 2), (2, 1), (0, 1), (0, 0)],
+  'D': [(0, 0), (3, 0), (3, 1), (2, 1), (2, 3), (1, 3), (1, 1), (0, 1), (0, 0)],
+  'E': [(0, 0), (2, 0), (2, 2), (3, 2), (3, 3), (1, 3), (1, 1), (0, 1), (0, 0)],
+  'F': [(0, 0), (2, 0), (2, 1), (3, 1), (3, 2), (0, 2), (0, 0)],
+  'G': [(0, 0), (3, 0), (3, 3), (2, 3), (2, 1), (0, 1), (0, 0)],
+  'H': [(0, 0), (3, 0), (3, 2), (2, 2), (2, 1), (1, 1), (1, 2), (0, 2), (0, 0)],
+  'I': [(0, 0), (3, 0), (3, 1), (4, 1), (4, 2), (2, 2), (2, 1), (0, 1), (0, 0)],
+  'J': [(0, 0), (2, 0), (2, 1), (3, 1), (3, 2), (1, 2), (1, 1), (0, 1), (0, 0)]
+}
+
+partnames = sorted(partcells.keys())
+
+# Shift a list of cells so that the bounding box starts at (0, 0). Returns a sorted
+# tuple so the result can be compared and hashed.
+def normalize(cellist):
+  minx = min(x for x, y in cellist)
+  miny = min(y for x, y in cellist)
+  return tuple(sorted((x - minx, y - miny) for x, y in cellist))
+
+# Find the cells covered by an outline by testing the center of each cell in the
+# bounding box. A simple ray-casting point-in-polygon does for these shapes.
+def rasterize(outline):
+  def inside(px, py):
+    result = False
+    for (x1, y1), (x2, y2) in zip(outline, outline[1:]):
+      if (y1 > py) != (y2 > py):
+        if px < x1 + (py - y1) * (x2 - x1) / (y2 - y1):
+          result = not result
+    return result
+
+  maxx = max(x for x, y in outline)
+  maxy = max(y for x, y in outline)
+  return [(x, y) for x in range(0, maxx) for y in range(0, maxy) if inside(x + 0.5, y + 0.5)]
+
+# All distinct fixed orientations of each part, mirror images included.
+partorientations = Orientations.table({name: (partcells[name], True) for name in partnames})
+
+# The placement table. For each part a list of bitmasks of the board cells it covers,
+# one for each orientation and position where it fits on the board completely.
+placements = {}
+placementindex = {}
+for name in partnames:
+  placements[name] = []
+  for ismirrored, rotation in partorientations[name]:
+    orientation = Orientations.shapelyconvention(partcells[name], ismirrored, rotation)
+    for yoffset in range(0, BOARDHEIGHT):
+      for xoffset in range(0, BOARDWIDTH):
+        placed = [(x + xoffset, y + yoffset) for x, y in orientation]
+        if all(cell in cellindex for cell in placed):
+          placements[name].append(mask(placed))
+  placementindex[name] = {m: i for i, m in enumerate(placements[name])}
+
+# Fingerprint of the placement table. Anything storing placement indices records this
+# so it can detect a change of the table.
+fingerprint = hashlib.sha1(repr([(name, placements[name]) for name in partnames]).encode('ascii')).digest()[:8]
+
+# Trace the boundary of a set of cells. Returns the corners as a closed list of points
+# like the entries in partoutlines, counter-clockwise. The cells must form one piece
+# without holes, which all the parts do.
+def outline(cellist):
+  cellset = set(cellist)
+
+  # Boundary edges as a map from start to end corner, walking with the piece on the left.
+  edges = {}
+  for x, y in cellset:
+    if (x, y-1) not in cellset:
+      edges[(x, y)] = (x+1, y)
+    if (x+1, y) not in cellset:
+      edges[(x+1, y)] = (x+1, y+1)
+    if (x, y+1) not in cellset:
+      edges[(x+1, y+1)] = (x, y+1)
+    if (x-1, y) not in cellset:
+      edges[(x, y+1)] = (x, y)
+
+  start = min(edges)
+  points = [start]
+  corner = edges[start]
+  while corner != start:
+    points.append(corner)
+    corner = edges[corner]
+  points.append(start)
+
+  # Only keep the corners where the direction changes.
+  def turns(a, b, c):
+    return (b[0]-a[0]) * (c[1]-b[1]) != (b[1]-a[1]) * (c[0]-b[0])
+  corners = [p for a, p, c in zip(points[-2:-1] + points[:-2], points[:-1], points[1:]) if turns(a, p, c)]
+  return corners + corners[:1]
+
+# Outline of a placement on the board, computed on first use.
+@functools.lru_cache(maxsize = None)
+def placementoutline(name, index):
+  return tuple(outline(cells(placements[name][index])))
+
+def configurationkey(month, day, weekday):
+  return ((month-1) * 31 + (day-1)) * 7 + weekday
+
+def configurationfromkey(key):
+  return (key // (31*7) + 1, (key // 7) % 31 + 1, key % 7)
+
+def configurationmask(month, day, weekday):
+  return mask([monthcell(month), daycell(day), weekdaycell(weekday)])
+
+def catalogname(month, day, weekday):
+  return f'{month:02d}{day:02d}{weekday:02d}-{monthlabels[month-1]}-{day:02d}-{weekdaylabels[weekday]}'
+
+fullmask = (1 << len(boardcells)) - 1
+
+# Check a solution given as placement indices. Returns the configuration it solves as
+# (month, day, weekday) or None if the parts overlap or do not leave exactly one month,
+# one day and one weekday free.
+def configurationofsolution(solution):
+  covered = 0
+  for name, index in zip(partnames, solution):
+    m = placements[name][index]
+    if covered & m:
+      return None
+    covered |= m
+
+  free = [cellkinds[i] for i in range(len(boardcells)) if not covered & (1 << i)]
+  kinds = sorted(free)
+  if [kind for kind, _ in kinds] != ['day', 'month', 'weekday']:
+    return None
+  return (kinds[1][1], kinds[0][1], kinds[2][1])
+
+# Cells covered by a part placed by Solver3.py. There the part is a 2D-array that is
+# mirrored by reversing the columns and rotated clockwise, then trimmed to the origin
+# and offset. Coordinates are board coordinates already.
+def arraycells(name, xoffset, yoffset, rotation, ismirrored):
+  p = partcells[name]
+  h = max(y for x, y in p) + 1
+  if ismirrored:
+    p = [(x, h-1-y) for x, y in p]
+  for _ in range(0, (rotation // 90) % 4):
+    p = [(y, -x) for x, y in p]
+  return [(x + xoffset, y + yoffset) for x, y in normalize(p)]
+
+# Cells covered by a part placed by Solver1.py or Solver2.py. There the part is a Shapely
+# polygon mirrored along x and rotated counter-clockwise, both around the center of its
+# bounding box, then offset. Offsets may be fractional for some rotations. The board
+# of these solvers sits one row lower.
+def shapelycells(name, xoffset, yoffset, rotation, ismirrored):
+  p = rasterize(partoutlines[name])
+  w = max(x for x, y in p) + 1
+  h = max(y for x, y in p) + 1
+  if ismirrored:
+    p = [(w-1-x, y) for x, y in p]
+  a = w / 2
+  b = h / 2
+  rotation = (rotation // 90) % 4
+  if rotation == 1:
+    p = [(a + b - y - 1, b - a + x) for x, y in p]
+  elif rotation == 2:
+    p = [(w-1-x, h-1-y) for x, y in p]
+  elif rotation == 3:
+    p = [(a - b + y, a + b - x - 1) for x, y in p]
+  return [(round(x + xoffset), round(y + yoffset) + 1) for x, y in p]
+
+# Convert the list of parts from a JSON solution to placement indices, using one of the
+# conventions above. Returns None if the parts do not map to a valid placement.
+def solutionfromparts(jsonparts, convention):
+  bypart = {}
+  for part in jsonparts:
+    partcellist = convention(part['name'], part['xoffset'], part['yoffset'], part['rotation'], part['ismirrored'])
+    if not all(cell in cellindex for cell in partcellist):
+      return None
+    index = placementindex[part['name']].get(mask(partcellist))
+    if index is None:
+      return None
+    bypart[part['name']] = index
+
+  if sorted(bypart.keys()) != partnames:
+    return None
+  return tuple(bypart[name] for name in partnames)
+
+# Convert the rows of a board as Solver3.py writes it to placement indices.
+def solutionfromboard(rows):
+  bypart = {name: [] for name in partnames}
+  for row, line in enumerate(rows):
+    for x, c in enumerate(line):
+      if c in bypart:
+        bypart[c].append((x, len(rows) - 1 - row))
+
+  solution = []
+  for name in partnames:
+    if not all(cell in cellindex for cell in bypart[name]):
+      return None
+    index = placementindex[name].get(mask(bypart[name]))
+    if index is None:
+      return None
+    solution.append(index)
+  return tuple(solution)
+
+# Convert the JSON data of a solution as written by any of the solvers to placement
+# indices. The legacy format of Solver2.py is just the list of parts. Returns None
+# if the data does not describe a valid solution.
+def solutionfromjson(jsondata):
+  if isinstance(jsondata, list):
+    jsonparts = jsondata
+    conventions = [shapelycells, arraycells]
+  else:
+    jsonparts = jsondata['parts']
+    if 'board' in jsondata:
+      solution = solutionfromboard(jsondata['board'])
+      if solution and configurationofsolution(solution):
+        return solution
+      conventions = [arraycells, shapelycells]
+    else:
+      conventions = [shapelycells, arraycells]
+
+  # Try the likely convention first, but verify the result.
+  for convention in conventions:
+    solution = solutionfromparts(jsonparts, convention)
+    if solution and configurationofsolution(solution):
+      return solution
+
+  return None
+
+# The JSON parts-entry for a placement in the convention of Solver3.py.
+def arraypart(name, index):
+  placed = cells(placements[name][index])
+  shape = normalize(placed)
+  xoffset = min(x for x, y in placed)
+  yoffset = min(y for x, y in placed)
+  for ismirrored in [False, True]:
+    for rotation in [0, 90, 180, 270]:
+      if tuple(sorted(arraycells(name, 0, 0, rotation, ismirrored))) == shape:
+        return {
+          'name': name,
+          'xoffset': xoffset,
+          'yoffset': yoffset,
+          'rotation': rotation,
+          'ismirrored': ismirrored
+        }
+  raise ValueError(f'No orientation of part {name} matches placement {index}')
+
+# Format the board of a solution the way Solver3.py does.
+def boardrows(solution, configuration):
+  owner = {}
+  for name, index in zip(partnames, solution):
+    for cell in cells(placements[name][index]):
+      owner[cell] = name
+  free = cells(configurationmask(*configuration))
+
+  rows = []
+  for y in reversed(range(0, BOARDHEIGHT)):
+    row = ''
+    for x in range(0, BOARDWIDTH):
+      if (x, y) in owner:
+        row += owner[(x, y)]
+      elif (x, y) in free:
+        row += 'x'
+      else:
+        row += ' '
+    rows.append(row)
+  return rows
+
+# Convert a solution to JSON data in the format Solver3.py writes.
+def jsonfromsolution(solution, configuration = None):
+  if configuration is None:
+    configuration = configurationofsolution(solution)
+  month, day, weekday = configuration
+
+  return {
+    'configuration': {
+      'month': month,
+      'monthlabel': monthlabels[month-1],
+      'day': day,
+      'weekday': weekday,
+      'weekdaylabel': weekdaylabels[weekday]
+    },
+    'board': boardrows(solution, configuration),
+    'parts': [arraypart(name, index) for name, index in zip(partnames, solution)]
+  }
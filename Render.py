@@ -1,381 +1,191 @@
-import sys
+import io
+import hashlib
 import datetime
 import calendar
 import os 
 import json
 import cairo
 import math
+import time
+import queue
+import argparse
+import threading
+import multiprocessing
 import xlsxwriter
 import collections
 import random
 
+from PIL import Image
+
+import Placements
+import SolutionPack
+import SolutionIndex
+
 # Create a calendar for each year in the range from the solutions discovered
-# by the Solver. For each day find the solution-JSON in the catalog, load it
-# and render as a pretty picture.
+# by the Solver. The solutions are loaded in one go from the JSON files in the
+# catalog or from a solution pack, then each day is rendered as a pretty picture. Rendering runs in parallel in a number of
+# worker processes, see --jobs.
 #
 # Also write a XLSX file with general statistics.
 
-basename = ''
-if len(sys.argv)>1:
-    basename = sys.argv[1]
-if not basename:
-    basename = '..\\catalog'
+# Bump when a change to the drawing code changes the images, so a run re-renders them.
+RENDERVERSION = 3
 
-#basename = 'do'
-#basename = 'xrcloud'
-#basename = 'complete'
+monthlabels = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+weekdaylabels = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
 
-print(f'Basename={basename}')
+# Size of the cells and the image.
+cellwidth = 50
+cellheight = cellwidth
+margin = 2
+boardmargin = cellwidth // 2
 
-COVERAGEFILE = f'.\\render\\{basename}\\coverage.xlsx'
-if os.path.isfile(COVERAGEFILE):
-    os.remove(COVERAGEFILE)
+renderwidth =  7 * cellwidth  + 2 * margin + 2 * boardmargin
+renderheight = 8 * cellheight + 2 * margin + 2 * boardmargin 
 
-'''
-    A: XXXX
+# Pick the style for a configuration. Every date with the same configuration gets the
+# same style so the board can be drawn once for all of them.
+def stylefor(configuration, stylecount):
+    return random.Random(str(configuration)).randrange(stylecount)
 
-    B:    X
-       XXXX
-        
-    C:   X
-       XXX
-
-    D: XXX
-        X
-        X
-
-    E: X
-       XXX
-         X 
-
-    F: XXXX
-       XXX
-
-    G: XXX
-         X
-         X
-
-    H: X X
-       XXX
-
-    I: XXX
-         XX
-
-    J:  XX
-         XX      
-'''
-
-partscatalog = {
-    'A': [(0, 0), (4, 0), (4, 1), (0, 1), (0, 0)],       
-    'B': [(0, 0), (4, 0), (4, 2), (3, 2), (3, 1), (0, 1), (0, 0)],    
-    'C': [(0, 0), (3, 0), (3, 2), (2, 2), (2, 1), (0, 1), (0, 0)],
-    'D': [(0, 0), (3, 0), (3, 1), (2, 1), (2, 3), (1, 3), (1, 1), (0, 1), (0, 0)],
-    'E': [(0, 0), (2, 0), (2, 2), (3, 2), (3, 3), (1, 3), (1, 1), (0, 1), (0, 0)],
-    'F': [(0, 0), (2, 0), (2, 1), (3, 1), (3, 2), (0, 2), (0, 0)],
-    'G': [(0, 0), (3, 0), (3, 3), (2, 3), (2, 1), (0, 1), (0, 0)],
-    'H': [(0, 0), (3, 0), (3, 2), (2, 2), (2, 1), (1, 1), (1, 2), (0, 2), (0, 0)],
-    'I': [(0, 0), (3, 0), (3, 1), (4, 1), (4, 2), (2, 2), (2, 1), (0, 1), (0, 0)],
-    'J': [(0, 0), (2, 0), (2, 1), (3, 1), (3, 2), (1, 2), (1, 1), (0, 1), (0, 0)]
-}
-
-def render(d, jsondata, destbasename, style):
-
-    def arctopleft(ctx, cornerx, cornery, radius):
-        ctx.arc(cornerx + radius, cornery + radius, radius, math.pi, 3*math.pi/2)
-    
-    def arctopright(ctx, cornerx, cornery, radius):
-        ctx.arc(cornerx - radius, cornery + radius, radius, 3*math.pi/2, 0)
-    
-    def arcbottomright(ctx, cornerx, cornery, radius):
-        ctx.arc(cornerx - radius, cornery - radius, radius, 0, math.pi/2)
-    
-    def arcbottomleft(ctx, cornerx, cornery, radius):
-        ctx.arc(cornerx + radius, cornery - radius, radius, math.pi/2, math.pi)    
-    
-    def arctopleftinside(ctx, cornerx, cornery, radius):
-        ctx.arc_negative(cornerx + radius, cornery + radius, radius, 3*math.pi/2, math.pi)
-    
-    def arctoprightinside(ctx, cornerx, cornery, radius):
-        ctx.arc_negative(cornerx - radius, cornery + radius, radius, 0, 3*math.pi/2)
-    
-    def arcbottomrightinside(ctx, cornerx, cornery, radius):
-        ctx.arc_negative(cornerx - radius, cornery - radius, radius, math.pi/2, ß)
-    
-    def arcbottomleftinside(ctx, cornerx, cornery, radius):
-        ctx.arc_negative(cornerx + radius, cornery - radius, radius, math.pi, math.pi/2)    
-    
-    def cellx(cellindex):
-        return margin + boardmargin + cellindex * cellwidth
-
-    def celly(cellindex):
-        return renderheight - margin - boardmargin - cellheight - cellindex * cellheight
-
-    def recttext(ctx, rx, ry, rw, rh, label):
-
-        x, y, textwidth, textheight, dx, dy = ctx.text_extents(label)
-
-        #print(f'{rx}, {ry}, {rw}, {rh}, {textwidth}, {textheight}, "{label}"')
-
-        ctx.move_to(rx + rw/2 - textwidth/2, ry + rh/2 + textheight/4)    
-        ctx.show_text(label)
-
-    def celltext(ctx, xindex, yindex, label):        
-        cx = cellx(xindex)
-        cy = celly(yindex)
-
-        recttext(ctx, cx, cy, cellwidth, cellheight, label)
-
-    def outer(ctx):
-        ctx.move_to(margin, margin + boardmargin)
-        arctopleft(ctx, margin + 0, margin + 0, radius)
-        arctopright(ctx, renderwidth - cellwidth - margin, margin + 0, radius)    
-        ctx.line_to(renderwidth - cellwidth - margin, margin + 2 * cellheight)
-        arctopright(ctx, renderwidth - margin, margin + 2 * cellheight, radius)
-        arcbottomright(ctx, renderwidth - margin, renderheight - margin, radius)
-        arcbottomleft(ctx, margin + 0, renderheight - margin, radius)
-        ctx.close_path()
+# Surfaces for images that have been encoded and can be drawn on again, by size.
+surfacepool = collections.defaultdict(list)
+surfacepoolsize = 4
 
-    def partpoly(ctx, points):
-        ctx.new_path()    
-        ctx.move_to(cellx(points[0][0]), celly(points[0][1]))
-        for point in points[1:]:
-            ctx.line_to(cellx(point[0]), celly(point[1]))
-        ctx.close_path()
-        
-    cellwidth = 50
-    cellheight = cellwidth
-    margin = 2
-    boardmargin = cellwidth // 2
-
-    renderwidth =  7 * cellwidth  + 2 * margin + 2 * boardmargin
-    renderheight = 8 * cellheight + 2 * margin + 2 * boardmargin 
-    
-    yearlabel_x = margin + boardmargin + cellwidth * 2
-    yearlabel_y = renderheight - margin - boardmargin - cellheight / 2
-    yearlabel_width = cellwidth * 1.5
-    yearlabel_height = cellheight / 2
-    
-    ims = cairo.ImageSurface(cairo.FORMAT_ARGB32, renderwidth, renderheight)
-    ctx = cairo.Context(ims)
-    
+def takesurface(width, height):
+    if surfacepool[(width, height)]:
+        return surfacepool[(width, height)].pop()
+    return cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+
+# Hand back a surface from renderimage() once it is no longer needed.
+def releasesurface(ims):
+    pool = surfacepool[(ims.get_width(), ims.get_height())]
+    if len(pool) < surfacepoolsize:
+        pool.append(ims)
+
+# Drawing is done in the coordinates of the full size image, smaller images are drawn from
+# the same paths with ctx.scale().
+
+def arctopleft(ctx, cornerx, cornery, radius):
+    ctx.arc(cornerx + radius, cornery + radius, radius, math.pi, 3*math.pi/2)
+
+def arctopright(ctx, cornerx, cornery, radius):
+    ctx.arc(cornerx - radius, cornery + radius, radius, 3*math.pi/2, 0)
+
+def arcbottomright(ctx, cornerx, cornery, radius):
+    ctx.arc(cornerx - radius, cornery - radius, radius, 0, math.pi/2)
+
+def arcbottomleft(ctx, cornerx, cornery, radius):
+    ctx.arc(cornerx + radius, cornery - radius, radius, math.pi/2, math.pi)    
+
+def arctopleftinside(ctx, cornerx, cornery, radius):
+    ctx.arc_negative(cornerx + radius, cornery + radius, radius, 3*math.pi/2, math.pi)
+
+def arctoprightinside(ctx, cornerx, cornery, radius):
+    ctx.arc_negative(cornerx - radius, cornery + radius, radius, 0, 3*math.pi/2)
+
+def arcbottomrightinside(ctx, cornerx, cornery, radius):
+    ctx.arc_negative(cornerx - radius, cornery - radius, radius, math.pi/2, ß)
+
+def arcbottomleftinside(ctx, cornerx, cornery, radius):
+    ctx.arc_negative(cornerx + radius, cornery - radius, radius, math.pi, math.pi/2)    
+
+def cellx(cellindex):
+    return margin + boardmargin + cellindex * cellwidth
+
+def celly(cellindex):
+    return renderheight - margin - boardmargin - cellheight - cellindex * cellheight
+
+def recttext(ctx, rx, ry, rw, rh, label):
+
+    x, y, textwidth, textheight, dx, dy = ctx.text_extents(label)
+
+    #print(f'{rx}, {ry}, {rw}, {rh}, {textwidth}, {textheight}, "{label}"')
+
+    ctx.move_to(rx + rw/2 - textwidth/2, ry + rh/2 + textheight/4)    
+    ctx.show_text(label)
+
+outerradius = boardmargin // 3 * 2
+innerradius = cellwidth // 10
+
+def outer(ctx):
+    ctx.move_to(margin, margin + boardmargin)
+    arctopleft(ctx, margin + 0, margin + 0, outerradius)
+    arctopright(ctx, renderwidth - cellwidth - margin, margin + 0, outerradius)    
+    ctx.line_to(renderwidth - cellwidth - margin, margin + 2 * cellheight)
+    arctopright(ctx, renderwidth - margin, margin + 2 * cellheight, outerradius)
+    arcbottomright(ctx, renderwidth - margin, renderheight - margin, outerradius)
+    arcbottomleft(ctx, margin + 0, renderheight - margin, outerradius)
+    ctx.close_path()
+
+# Outlines are in board coordinates of the corners of the cells.
+def cornerx(x):
+    return margin + boardmargin + x * cellwidth
+
+def cornery(y):
+    return renderheight - margin - boardmargin - y * cellheight
+
+yearlabel_x = margin + boardmargin + cellwidth * 2
+yearlabel_y = renderheight - margin - boardmargin - cellheight / 2
+yearlabel_width = cellwidth * 1.5
+yearlabel_height = cellheight / 2
+
+# The labels on the board as (cell x, cell y, text). They are the same for every style.
+weekdaycells = {'Mon': (4, 1), 'Tue': (5, 1), 'Wed': (6, 1), 'Thu': (4, 0), 'Fri': (5, 0), 'Sat': (6, 0), 'Sun': (3, 1)}
+
+boardlabels = []
+for month in range(1,13):
+    monthx = (month - 1) % 6      # 0..5
+    monthy = 7 - (month - 1) // 6  # 6 or 5
+    boardlabels.append((monthx, monthy, monthlabels[month-1]))
+
+for day in range(0, 32):
+    dayx = (day-1) % 7 # 0..6
+    dayy = 5 - (day-1) // 7 # 4..0
+    boardlabels.append((dayx, dayy, str(day)))
+
+for weekdaystr in weekdaylabels:
+    wdx, wdy = weekdaycells[weekdaystr]
+    boardlabels.append((wdx, wdy, weekdaystr))
+
+def setupcontext(ctx):
     ctx.select_font_face('Courier', cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_BOLD)
     ctx.set_font_size(20)
     ctx.set_fill_rule(cairo.FILL_RULE_EVEN_ODD)    
     ctx.set_line_width(1)
 
+# Bottom layer: The board with its texture and all the labels.
+def drawbottom(ctx, style):
     # Draw outer border
-    radius = boardmargin // 3 * 2
     outer(ctx)
 
     ctx.set_source_rgb(1, 1, 1)
     if style['texture_low']:
         ctx.set_source(style['texture_low'])    
-    ctx.fill_preserve()
+    ctx.fill()
 
     ctx.set_source_rgb(0, 0, 0)
-    
-    recttext(ctx, yearlabel_x, yearlabel_y, yearlabel_width, yearlabel_height, str(year))
-
-    for month in range(1,13):
-        monthx = (month - 1) % 6      # 0..5
-        monthy = 7 - (month - 1) // 6  # 6 or 5
-        celltext(ctx, monthx, monthy, monthlabels[month-1])
-
-    for day in range(0, 32):
-        dayx = (day-1) % 7 # 0..6
-        dayy = 5 - (day-1) // 7 # 4..0
-        celltext(ctx, dayx, dayy, str(day))
-
-    for weekdaystr in weekdaylabels:
-        if (weekdaystr == 'Mon'):
-            wdx, wdy = (4, 1)
-        elif (weekdaystr == 'Tue'):
-            wdx, wdy = (5, 1)
-        elif (weekdaystr == 'Wed'):
-            wdx, wdy = (6, 1)
-        elif (weekdaystr == 'Thu'):
-            wdx, wdy = (4, 0)
-        elif (weekdaystr == 'Fri'):
-            wdx, wdy = (5, 0)
-        elif (weekdaystr == 'Sat'):
-            wdx, wdy = (6, 0)
-        elif (weekdaystr == 'Sun'):
-            wdx, wdy = (3, 1)
-        else:
-            raise ValueError(f'Unsupported weekday {weekdaystr}')
-        
-        celltext(ctx, wdx, wdy, weekdaystr)
 
-    # Draw parts
-    i = 0
-    for part in jsondata['parts']:
-        
-        name = part['name']
-        xoffset = part['xoffset']
-        yoffset = part['yoffset']
-        rotation = part['rotation']
-        ismirrored = part['ismirrored']
-
-        #if name != 'F':
-        #    continue
-
-        # Now. This is terrible. When I build a new solver I modelled the orientation of parts
-        # differently completely screwing up the renderer. Instead of fixing it properly I
-        # fudged the values here so that everything lines up again. This is just a unit-conversion
-        # done in the worst possible way. 
-        # Look in the JSON solution for the proper layout if something is broken.
-
-        v3 = True
-        if v3:
-
-            if (name != 'B') and (name != 'C') and (name != 'F'):
-                if rotation == 90:
-                    rotation = 270
-                elif rotation == 270:
-                    rotation = 90
-
-            while rotation < 0:
-                rotation +=360
-            while rotation > 360:
-                rotation -=360
-                
-            yoffset -= 1
-            if name == 'A':
-                if rotation == 90 or rotation == 270:
-                    xoffset -= 1.5
-                    yoffset += 1.5  
-            elif name == 'B':
-                ismirrored = not ismirrored
-                
-                if not ismirrored:
-                    if rotation == 180:
-                        rotation = 0
-                    elif rotation == 0:
-                        rotation = 180
-
-                if rotation == 90 or rotation == 270:
-                    xoffset -= 1
-                    yoffset += 1
-            elif name == 'C':                
-                ismirrored = not ismirrored
-                
-                if not ismirrored:
-                    if rotation == 180:
-                        rotation = 0
-                    elif rotation == 0:
-                        rotation = 180
-
-                if rotation == 90 or rotation == 270:
-                    xoffset -= 0.5
-                    yoffset += 0.5   
-            elif name == 'D':
-                pass                
-            elif name == 'E':
-                pass
-            elif name == 'F':
-                pass
-                
-                if ismirrored:
-                    if rotation == 0:
-                        rotation = 180
-                    elif rotation == 180:
-                        rotation = 0
-
-                if True: #not ismirrored:
-                    if rotation == 90:
-                        rotation = 270
-                    elif rotation == 270:
-                        rotation = 90
-
-                if rotation == 90 or rotation == 270:
-                    xoffset -= 0.5
-                    yoffset += 0.5
-            elif name == 'G':
-                pass
-                #rotation -= 180
-            elif name == 'H':
-                if rotation == 90 or rotation == 270:
-                    xoffset -= 0.5
-                    yoffset += 0.5
-            elif name == 'I':
-
-                if ismirrored:
-                    if rotation == 180:
-                        rotation = 0
-                    elif rotation == 0:
-                        rotation = 180
-
-                if rotation == 90 or rotation == 270:
-                    xoffset -= 1
-                    yoffset += 1                
-            elif name == 'J':
-                if rotation == 90 or rotation == 270:
-                    xoffset -= 0.5
-                    yoffset += 0.5 
-
-        if name in partscatalog:
-            poly = partscatalog[name]
-        
-            ctx.save()
-
-            # Translate into position.
-            ctx.translate(cellwidth * xoffset, -cellheight * yoffset)
-            
-            # Rotate around and mirror about the center:
-            # Create path so we can get the extents.
-            partpoly(ctx, poly)
-            # Translate to center.
-            x1, y1, x2, y2 = ctx.fill_extents()
-            xc = (x1 + x2) / 2
-            yc = (y1 + y2) / 2
-
-            ctx.translate(xc, yc)
-            # Mirror (v3 before rotation and on y-axis)
-            if v3 and ismirrored:
-                ctx.scale(-1, 1)
-            # Rotate.
-            ctx.rotate(-rotation * math.pi / 180)
-            # Mirror (non-v3 after rotation and on x-axis).
-            if not v3 and ismirrored:
-                ctx.scale(-1, 1)
-            # Translate back.
-            ctx.translate(-xc, -yc)            
-            
-            ctx.new_path()
-            partpoly(ctx, poly)
-            
-            if style['color_parts']:
-                pcol = style['color_parts'][i % len(style['color_parts'])]
-                ctx.set_source_rgba(pcol[0], pcol[1], pcol[2], pcol[3])
-            if style['texture_parts']:
-                ctx.set_source(style['texture_parts'])
-            ctx.fill_preserve()
-
-            ctx.set_source_rgb(0, 0, 0)
-            ctx.stroke()
-
-            ctx.restore()
-        
-            i += 1
-    
-    ctx.set_source_rgb(0, 0, 0)
-    ctx.stroke()
+    for labelx, labely, label in boardlabels:
+        recttext(ctx, cellx(labelx), celly(labely), cellwidth, cellheight, label)
 
+# Top layer: The frame between the outer and inner border that goes over the parts,
+# with a cutout for the year-label.
+def drawtop(ctx, style):
     # Draw set of outer and inner border
     outer(ctx)
 
-    radius = cellwidth // 10
-    ctx.move_to(margin + boardmargin, margin + boardmargin + radius)
-    arctopleft(ctx, margin + boardmargin, margin + boardmargin, radius)
-    arctopright(ctx, renderwidth - cellwidth - boardmargin - margin, boardmargin + margin, radius)
-    arcbottomleftinside(ctx, renderwidth - cellwidth - boardmargin - margin, margin + boardmargin + 2 * cellheight, radius)
-    arctopright(ctx, renderwidth - boardmargin - margin, margin + boardmargin + 2 * cellheight, radius)
-    arcbottomright(ctx, renderwidth - boardmargin - margin, renderheight - boardmargin - margin, radius)
+    ctx.move_to(margin + boardmargin, margin + boardmargin + innerradius)
+    arctopleft(ctx, margin + boardmargin, margin + boardmargin, innerradius)
+    arctopright(ctx, renderwidth - cellwidth - boardmargin - margin, boardmargin + margin, innerradius)
+    arcbottomleftinside(ctx, renderwidth - cellwidth - boardmargin - margin, margin + boardmargin + 2 * cellheight, innerradius)
+    arctopright(ctx, renderwidth - boardmargin - margin, margin + boardmargin + 2 * cellheight, innerradius)
+    arcbottomright(ctx, renderwidth - boardmargin - margin, renderheight - boardmargin - margin, innerradius)
 
-    arcbottomleft(ctx, margin + boardmargin + 4 * cellwidth, renderheight - boardmargin - margin, radius)
-    arctoprightinside(ctx, margin + boardmargin + 4 * cellwidth, renderheight - boardmargin - margin - cellheight, radius)
+    arcbottomleft(ctx, margin + boardmargin + 4 * cellwidth, renderheight - boardmargin - margin, innerradius)
+    arctoprightinside(ctx, margin + boardmargin + 4 * cellwidth, renderheight - boardmargin - margin - cellheight, innerradius)
 
-    arcbottomleft(ctx, margin + boardmargin, renderheight - boardmargin - margin - cellheight, radius)
+    arcbottomleft(ctx, margin + boardmargin, renderheight - boardmargin - margin - cellheight, innerradius)
     ctx.close_path()
 
     # cutout for year-label
@@ -389,12 +199,173 @@ def render(d, jsondata, destbasename, style):
     ctx.set_source_rgb(0, 0, 0)
     ctx.stroke()
 
-    ims.write_to_png(destbasename + '.png')
+# Draw onto a new surface of the image size at scale.
+def layer(draw, scale):
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, int(renderwidth * scale), int(renderheight * scale))
+    layerctx = cairo.Context(surface)
+    layerctx.scale(scale, scale)
+    setupcontext(layerctx)
+    draw(layerctx)
+    surface.flush()
+    return surface
+
+# Paint a layer made at this scale without scaling it again.
+def paintlayer(ctx, surface, scale):
+    ctx.save()
+    ctx.scale(1 / scale, 1 / scale)
+    ctx.set_source_surface(surface)
+    ctx.paint()
+    ctx.restore()
+
+# The bottom and top layers only depend on the style. Draw them once and keep them with the style.
+def stylelayers(style, scale):
+    layers = style.setdefault('layers', {})
+    if scale not in layers:
+        layers[scale] = (layer(lambda ctx: drawbottom(ctx, style), scale), layer(lambda ctx: drawtop(ctx, style), scale))
+    return layers[scale]
+
+# The outlines of the parts of a solution as paths in image coordinates. They do not depend
+# on the style or the scale, so they are worked out once per solution and replayed for
+# every image drawn from it.
+def partpaths(solution):
+    return [[(cornerx(x), cornery(y)) for x, y in Placements.placementoutline(name, index)] for name, index in zip(Placements.partnames, solution)]
+
+# Draw parts. Each part is filled with its path in the colors or texture of the style.
+def drawparts(ctx, paths, style):
+    for i, points in enumerate(paths):
+        ctx.new_path()    
+        ctx.move_to(*points[0])
+        for point in points[1:]:
+            ctx.line_to(*point)
+        ctx.close_path()
+
+        if style['color_parts']:
+            pcol = style['color_parts'][i % len(style['color_parts'])]
+            ctx.set_source_rgba(pcol[0], pcol[1], pcol[2], pcol[3])
+        if style['texture_parts']:
+            ctx.set_source(style['texture_parts'])
+        ctx.fill_preserve()
+
+        ctx.set_source_rgb(0, 0, 0)
+        ctx.stroke()
+
+# The board with the parts but without the year-label. Paint the frame on top of the parts.
+def drawbase(ctx, paths, style, scale):
+    bottom, top = stylelayers(style, scale)
+    paintlayer(ctx, bottom, scale)
+    drawparts(ctx, paths, style)
+    paintlayer(ctx, top, scale)
+
+# Year-label, clipped to the cutout in the frame.
+def drawyearlabel(ctx, d):
+    ctx.rectangle(yearlabel_x, yearlabel_y, yearlabel_width, yearlabel_height)
+    ctx.clip()
+    ctx.set_source_rgb(0, 0, 0)
+    recttext(ctx, yearlabel_x, yearlabel_y, yearlabel_width, yearlabel_height, str(d.year))
+
+# The boards with parts but without the year-label for a solution, one for each of a list of
+# (style, scale) targets, all drawn from one pass over the geometry of the solution. A board
+# only depends on the style and the solution, so the caller keeps them for all the years in
+# which the configuration comes round and drops them when done.
+def renderbases(solution, targets):
+    paths = partpaths(solution)
+    return [layer(lambda ctx: drawbase(ctx, paths, style, scale), scale) for style, scale in targets]
+
+# Draw the calendar for date d on a copy of a board from renderbases().
+def renderonbase(d, base, scale, yearlabel = True):
+    # The surface may come from the pool, so replace everything on it.
+    ims = takesurface(int(renderwidth * scale), int(renderheight * scale))
+    ctx = cairo.Context(ims)
+    ctx.set_operator(cairo.OPERATOR_SOURCE)
+    ctx.set_source_surface(base)
+    ctx.paint()
+    ctx.set_operator(cairo.OPERATOR_OVER)
+
+    if yearlabel:
+        ctx.scale(scale, scale)
+        setupcontext(ctx)
+        drawyearlabel(ctx, d)
+
+    return ims
+
+# Render the calendar for date d with the solution given as placement indices, see
+# Placements.py, once for each of a list of (style, scale) targets. Returns the list of
+# cairo.ImageSurface, hand them back with releasesurface() when done. Without yearlabel d is
+# not used and the images are the same for all years. bases are the boards from
+# renderbases() for the same solution and targets, if they are at hand already.
+def renderimages(d, solution, targets, yearlabel = True, bases = None):
+    if bases is None:
+        bases = renderbases(solution, targets)
+    return [renderonbase(d, base, scale, yearlabel) for (style, scale), base in zip(targets, bases)]
+
+# Draw the calendar for date d in one style, see renderimages(). If a context is given the
+# calendar is drawn to that instead, for instance to a page of a PDF, and None is returned.
+def renderimage(d, solution, style, yearlabel = True, ctx = None, scale = 1):
+    if ctx is None:
+        return renderimages(d, solution, [(style, scale)], yearlabel)[0]
+
+    # Draw the parts between the layers directly. This way all pages of a document share
+    # the layers and the textures and they are embedded only once.
+    ctx.save()
+    ctx.scale(scale, scale)
+    setupcontext(ctx)
+    drawbase(ctx, partpaths(solution), style, scale)
+    if yearlabel:
+        drawyearlabel(ctx, d)
+    ctx.restore()
+
+    return None
+
+# Image formats we can write, by file extension.
+imageformats = ['jpg', 'webp', 'png']
+
+# Encode the rendered surface in imageformat and return the file data. Pillow reads the
+# pixels straight from the cairo buffer. Cairo keeps them as premultiplied BGRA in native
+# byte order, which the raw decoders take care of.
+def encodeimage(ims, imageformat, quality = 85):
+
+    buffer = io.BytesIO()
+
+    if imageformat == 'png':
+        ims.write_to_png(buffer)
+        return buffer.getvalue()
+
+    width = ims.get_width()
+    height = ims.get_height()
+
+    if imageformat == 'jpg':
+        # No alpha in JPEG. Put the image on a white background first, otherwise the
+        # transparent corners come out black.
+        flat = cairo.ImageSurface(cairo.FORMAT_RGB24, width, height)
+        ctx = cairo.Context(flat)
+        ctx.set_source_rgb(1, 1, 1)
+        ctx.paint()
+        ctx.set_source_surface(ims)
+        ctx.paint()
+        flat.flush()
+
+        image = Image.frombuffer('RGB', (width, height), flat.get_data(), 'raw', 'BGRX', flat.get_stride(), 1)
+        image.save(buffer, 'JPEG', quality = quality)
+
+    elif imageformat == 'webp':
+        ims.flush()
+        image = Image.frombuffer('RGBA', (width, height), ims.get_data(), 'raw', 'BGRa', ims.get_stride(), 1)
+        image.save(buffer, 'WEBP', quality = quality)
+
+    else:
+        raise ValueError(f'Unsupported image format {imageformat}')
+
+    return buffer.getvalue()
 
-    # Convert to a jpg using imagemagick and delete the png. This is for size.
-    cmdline = f'magick.exe convert {destbasename}.png -quality 85% {destbasename}.jpg'
-    os.system(cmdline)
-    os.remove(destbasename + '.png')
+# Render the calendar for date d to a file for each of a list of (style, scale, suffix)
+# targets, named destbasename with the suffix.
+def render(d, solution, destbasename, targets, imageformat = 'jpg', quality = 85):
+
+    surfaces = renderimages(d, solution, [(style, scale) for style, scale, _ in targets])
+    for (_, _, suffix), ims in zip(targets, surfaces):
+        with open(f'{destbasename}{suffix}.{imageformat}', 'wb') as f:
+            f.write(encodeimage(ims, imageformat, quality))
+        releasesurface(ims)
 
 def counter(i):
     if i<=1:
@@ -402,279 +373,662 @@ def counter(i):
     else:
         return f' ({i})'
 
-monthlabels = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-weekdaylabels = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+# Load the textures and set up the styles a calendar can be rendered in.
+def loadstyles():
+
+    teximage = cairo.ImageSurface.create_from_png('texture.png')
+    texture = cairo.SurfacePattern(teximage)
+    texture.set_extend(cairo.EXTEND_REFLECT)
+
+    teximage = cairo.ImageSurface.create_from_png('texture_low.png')
+    texture_low = cairo.SurfacePattern(teximage)
+    texture_low.set_extend(cairo.EXTEND_REFLECT)
+
+    styles = []
+
+    styles.append({
+        'texture_high':  texture,
+        'texture_low':   texture_low,
+        'texture_parts': texture,
+        'color_parts':   None
+    })
+
+    styles.append({
+        'texture_high':  texture,
+        'texture_low':   texture_low,
+        'texture_parts': None,
+        'color_parts':
+            # Color for the parts as RGBA-tuple. Only used if tex_part is None
+            [
+                (0, 0, 1, 0.4),
+                (0, 0, 1, 0.5),
+                (0, 0, 1, 0.6)
+            ]
+    })
+
+    styles.append({
+        'texture_high':  texture,
+        'texture_low':   texture_low,
+        'texture_parts': None,
+        'color_parts':
+            # Color for the parts as RGBA-tuple. Only used if tex_part is None
+            [
+                (0, 143/255, 0, 0.4),
+                (0, 143/255, 0, 0.5),
+                (0, 143/255, 0, 0.6)
+            ]
+    })
+
+    return styles
+
+# The images to render for a configuration as (styleindex, scale, suffix for the file name).
+# By default one in the style picked for the configuration, otherwise one for each style
+# and scale.
+def variants(configuration, stylecount, allstyles = False, scales = [1]):
+    styleindices = range(0, stylecount) if allstyles else [stylefor(configuration, stylecount)]
+
+    result = []
+    for styleindex in styleindices:
+        for scale in scales:
+            suffix = (f'-{styleindex}' if allstyles else '') + (f'@{scale:g}x' if scale != 1 else '')
+            result.append((styleindex, scale, suffix))
+    return result
+
+# Pipeline stages. The loader queues the solutions for the render workers,
+# each worker is a separate process with its own copy of the styles, and the writer in the
+# main process saves the images and reports progress. The queues are bounded so the loader
+# never gets far ahead of the workers.
+
+# Queue each configuration to render for the workers together with all the dates that
+# use it, so the board is drawn only once.
+def loader(todo, tasks, jobs, stylecount, allstyles, scales, errors):
+
+    try:
+        configurations = {}
+        for d, configuration, solution, destbasename in todo:
+            configurations.setdefault(configuration, (solution, []))[1].append((d.isoformat() if d else None, destbasename))
+
+        for configuration, (solution, dates) in configurations.items():
+            tasks.put((solution, variants(configuration, stylecount, allstyles, scales), dates))
+
+    except Exception as e:
+        errors.append(e)
+
+    finally:
+        # One stop marker for each worker.
+        for _ in range(0, jobs):
+            tasks.put(None)
+
+# Render worker process. Renders and encodes the queued dates and hands the image data to
+# the writer.
+def renderworker(tasks, results, imageformat, quality):
+
+    styles = loadstyles()
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+
+        solution, targets, dates = task
+        styletargets = [(styles[styleindex], scale) for styleindex, scale, _ in targets]
+
+        # All dates of a task share the solution. Draw its boards once for them and drop
+        # them with the task.
+        try:
+            bases = renderbases(solution, styletargets)
+        except Exception as e:
+            for isodate, destbasename in dates:
+                results.put((isodate or os.path.basename(destbasename), destbasename, None, repr(e)))
+            continue
+
+        for isodate, destbasename in dates:
+            label = isodate or os.path.basename(destbasename)
+            try:
+                # Without a date the image is for all years and gets no year-label.
+                d = datetime.date.fromisoformat(isodate) if isodate else None
+                surfaces = renderimages(d, solution, styletargets, yearlabel = d is not None, bases = bases)
+                for (_, _, suffix), ims in zip(targets, surfaces):
+                    results.put((label, destbasename + suffix, encodeimage(ims, imageformat, quality), None))
+                    releasesurface(ims)
+            except Exception as e:
+                results.put((label, destbasename, None, repr(e)))
+
+        # Do not hold on to the boards while waiting for the next task.
+        del bases
+
+    results.put(None)
+
+# Save a rendered image.
+def writer(destbasename, data, imageformat):
+
+    folder = os.path.dirname(destbasename)
+    if folder:
+        os.makedirs(folder, exist_ok = True)
+
+    with open(f'{destbasename}.{imageformat}', 'wb') as f:
+        f.write(data)
+
+# Run the pipeline over the list of (date, configuration, solution, destbasename) in todo.
+# Without a date the image is rendered without year-label.
+def renderall(todo, jobs, imageformat, quality, onwritten = None, allstyles = False, scales = [1]):
+
+    stylecount = len(loadstyles())
+    total = len(todo) * len(variants(None, stylecount, allstyles, scales))
+
+    tasks = multiprocessing.Queue(maxsize = 4 * jobs)
+    results = multiprocessing.Queue(maxsize = 4 * jobs)
+
+    workers = [multiprocessing.Process(target = renderworker, args = (tasks, results, imageformat, quality), daemon = True) for _ in range(0, jobs)]
+    for worker in workers:
+        worker.start()
+
+    loadererrors = []
+    loaderthread = threading.Thread(target = loader, args = (todo, tasks, jobs, stylecount, allstyles, scales, loadererrors), daemon = True)
+    loaderthread.start()
+
+    rendered = 0
+    failed = 0
+    running = jobs
+    crashed = set()
+    starttime = time.perf_counter()
+
+    while running:
+        try:
+            result = results.get(timeout = 1)
+        except queue.Empty:
+            # A render process that dies, say in cairo or for lack of memory, never sends its
+            # stop marker. Stop waiting for it, the images it was working on are lost.
+            for worker in workers:
+                if (worker.exitcode not in (None, 0)) and (worker.pid not in crashed):
+                    crashed.add(worker.pid)
+                    running -= 1
+                    print('')
+                    print(f'  Render process {worker.pid} died with exit code {worker.exitcode}')
+            continue
+
+        if result is None:
+            running -= 1
+            continue
+
+        isodate, destbasename, data, error = result
+        if error:
+            print('')
+            print(f'  {isodate}: Rendering failed: {error}')
+            failed += 1
+            continue
+
+        writer(destbasename, data, imageformat)
+        rendered += 1
+        if onwritten:
+            onwritten(destbasename)
+
+        elapsed = time.perf_counter() - starttime
+        print(f'  Rendered {rendered} of {total} ({rendered/elapsed:.1f}/s): {isodate}' + ' '*20, end = '\r')
+
+    # With render processes gone the loader may be stuck on a full queue. It is a daemon
+    # thread, so it does not keep us from finishing.
+    loaderthread.join(timeout = 1 if crashed else None)
+    for worker in workers:
+        worker.join()
+
+    print('')
+
+    if crashed:
+        failed += len(crashed)
+    if loadererrors:
+        raise loadererrors[0]
+
+    return rendered, failed
+
+# Book mode. Instead of one image per day the days are streamed in date order into a
+# few documents: one PDF with a page per day for each year or for the whole range, or a
+# montage sheet per month with the days laid out like a calendar.
+def renderbook(dates, root, book, imageformat, quality):
+
+    styles = loadstyles()
+
+    def styleof(configuration):
+        return styles[stylefor(configuration, len(styles))]
+
+    folder = os.path.join(root, 'book')
+    os.makedirs(folder, exist_ok = True)
+
+    pages = 0
+
+    if book in ['year', 'all']:
+        bykey = collections.defaultdict(list)
+        for d, configuration, solution in dates:
+            bykey[d.year if book == 'year' else 'all'].append((d, configuration, solution))
+
+        for key, keydates in bykey.items():
+            filename = os.path.join(folder, f'{key}.pdf' if book == 'year' else f'{keydates[0][0].year}-{keydates[-1][0].year}.pdf')
+            with cairo.PDFSurface(filename, renderwidth, renderheight) as pdf:
+                ctx = cairo.Context(pdf)
+                for d, configuration, solution in keydates:
+                    renderimage(d, solution, styleof(configuration), ctx = ctx)
+                    ctx.show_page()
+
+                    pages += 1
+                    print(f'  {filename}: {d:%d.%m.%Y}' + ' '*20, end = '\r')
+
+    elif book == 'month':
+        bymonth = collections.defaultdict(list)
+        for d, configuration, solution in dates:
+            bymonth[(d.year, d.month)].append((d, configuration, solution))
+
+        # Sheets are half size, a column per weekday and a row per week.
+        scale = 0.5
+        cols = 7
+        rows = 6
+        for (year, month), monthdates in bymonth.items():
+            sheet = cairo.ImageSurface(cairo.FORMAT_ARGB32, int(cols * renderwidth * scale), int(rows * renderheight * scale))
+            ctx = cairo.Context(sheet)
+            ctx.set_source_rgb(1, 1, 1)
+            ctx.paint()
+
+            firstweekday = calendar.monthrange(year, month)[0]
+            for d, configuration, solution in monthdates:
+                cell = firstweekday + d.day - 1
+                ims = renderimage(d, solution, styleof(configuration))
+
+                ctx.save()
+                ctx.translate((cell % cols) * renderwidth * scale, (cell // cols) * renderheight * scale)
+                ctx.scale(scale, scale)
+                ctx.set_source_surface(ims)
+                ctx.paint()
+                ctx.restore()
+
+                pages += 1
+
+            filename = os.path.join(folder, f'{year}-{month:02d}.{imageformat}')
+            with open(filename, 'wb') as f:
+                f.write(encodeimage(sheet, imageformat, quality))
+            print(f'  {filename}' + ' '*20, end = '\r')
+
+    print('')
+    return pages
+
+# Hash for each style of what goes into it, so changing a texture or the colors
+# re-renders the images in that style.
+def stylesignatures():
+
+    textures = hashlib.sha1()
+    for filename in ['texture.png', 'texture_low.png']:
+        with open(filename, 'rb') as f:
+            textures.update(f.read())
+
+    signatures = []
+    for style in loadstyles():
+        signature = hashlib.sha1(textures.digest())
+        signature.update(repr([(key, style[key] if key == 'color_parts' else bool(style[key])) for key in sorted(style)]).encode('utf-8'))
+        signatures.append(signature.hexdigest())
+
+    return signatures
+
+# Find all files below root in one pass. Returns a dict of the paths relative to root,
+# with / as the separator, to the os.DirEntry.
+def scanfiles(root):
+
+    files = {}
+    folders = ['']
+    while folders:
+        folder = folders.pop()
+        try:
+            entries = os.scandir(os.path.join(root, *folder.split('/')))
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                relname = folder + '/' + entry.name if folder else entry.name
+                if entry.is_dir():
+                    folders.append(relname)
+                else:
+                    files[relname] = entry
 
-found = 0
-notfound = 0
-freshlyrendered = 0
-consrendered = 0
-consmissing = 0
-
-datesrendered = []
-configurationsfound = []
-configurationsmissing = []
-
-teximage = cairo.ImageSurface.create_from_png('texture.png')
-texture = cairo.SurfacePattern(teximage)
-texture.set_extend(cairo.EXTEND_REFLECT)
-
-teximage = cairo.ImageSurface.create_from_png('texture_low.png')
-texture_low = cairo.SurfacePattern(teximage)
-texture_low.set_extend(cairo.EXTEND_REFLECT)
-
-styles = []
-
-styles.append({
-    'texture_high':  texture,
-    'texture_low':   texture_low,
-    'texture_parts': texture,
-    'color_parts':   None
-})
-
-styles.append({
-    'texture_high':  texture,
-    'texture_low':   texture_low,
-    'texture_parts': None,
-    'color_parts':
-        # Color for the parts as RGBA-tuple. Only used if tex_part is None
-        [
-            (0, 0, 1, 0.4),
-            (0, 0, 1, 0.5),
-            (0, 0, 1, 0.6)
-        ]
-})
-
-styles.append({
-    'texture_high':  texture,
-    'texture_low':   texture_low,
-    'texture_parts': None,
-    'color_parts':
-        # Color for the parts as RGBA-tuple. Only used if tex_part is None
-        [
-            (0, 143/255, 0, 0.4),
-            (0, 143/255, 0, 0.5),
-            (0, 143/255, 0, 0.6)
-        ]
-})
-
-for year in range(2022,2049):
-    start = datetime.datetime(year, 1, 1)
-    end = datetime.datetime(year, 12, 31)
-
-    d = start
-    while (d<=end):
-        catalogbasename = f'.\\render\\{basename}\\{d.month:02d}{d.day:02d}{d.weekday():02d}-{monthlabels[d.month-1]}-{d.day:02d}-{weekdaylabels[d.weekday()]}'
-        destbasename = f'.\\render\\{basename}\\{d.year}\\{d.month:02d}\\{d.year}-{d.month:02d}-{d.day:02d}'
-
-        configuration = f'{d.month}-{d.day}-{d.weekday()}'
-            
-        jsonfile = catalogbasename + '.json'
-        if os.path.isfile(jsonfile):
-            found += 1
-                
-            if configuration not in configurationsfound:
-                configurationsfound.append(configuration)
+    return files
 
-            if os.path.isfile(destbasename + '.jpg'):
-                consmissing = 0
-                if consrendered == 0:
-                    print('')
-                consrendered += 1
-                print(('..' if consrendered>1 else '  ') + f'{d:%d.%m.%Y}: Already rendered       ' + counter(consrendered) + ' '*50, end = '\r')
-            else:
-                print('')
-                consrendered = 0
-                consmissing = 0
-                with open(jsonfile) as f:
-                    try:
-                        jsondata = json.load(f)
-                    except:
-                        print(f'  Error loading JSON from {jsonfile}')
-                        raise
-
-                    # We forgot to put the information on configuration in when saving the file and 
-                    # it is only encoded in the filename. If we encounter such a file we parse the
-                    # filename and add the information in on the fly.                    
-                    if isinstance(jsondata, collections.abc.Sequence):
-                        # jsondata is still "just" an array. Turn into an object, add the
-                        # missing information from the filename, then save back.
-                        bn = os.path.basename(jsonfile)
-                        month = int(bn[0:2])
-                        day = int(bn[2:4])
-                        weekday = int(bn[4:6])
-
-                        jsondata = {
-                            'configuration': {
-                                'month': month,
-                                'monthlabel': monthlabels[month-1],
-                                'day': day,
-                                'weekday': weekday,
-                                'weekdaylabel': weekdaylabels[weekday]
-                            },
-                            'parts': jsondata
-                        }
-
-                        with open(jsonfile, 'w') as f:
-                            json.dump(jsondata, f, sort_keys=False, indent=4)
-                       
-                    print(f'  {d:%d.%m.%Y}: Rendering ({weekdaylabels[d.weekday()]})' + ' '*50, end='\r')
-                    os.makedirs(f'render\\{basename}\\{d.year}\\{d.month:02d}', exist_ok = True)
-                    
-                    render(d, jsondata, destbasename, random.choice(styles))
-                    freshlyrendered += 1
-            
-            datesrendered.append(d)                    
-        else:
-            consrendered = 0
-            if consmissing == 0:
-                print('')
-            consmissing += 1
+# The manifest records for each image a hash of everything it was rendered from.
+def loadmanifest(filename):
 
-            if configuration not in configurationsmissing:
-                configurationsmissing.append(configuration)
+    try:
+        with open(filename) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        manifest = {}
 
-            print(('..' if consmissing>1 else '  ') + f'{d:%d.%m.%Y}: Solution missing' + counter(consmissing) + ' '*50, end = '\r')
-            notfound += 1
-        
-        d = d + datetime.timedelta(days = 1)
+    manifest.setdefault('outputs', {})
+    return manifest
 
-workbook = xlsxwriter.Workbook(COVERAGEFILE)
+def savemanifest(filename, manifest):
 
-format_label =         workbook.add_format({'bold': True, 'align': 'center'})
-format_invalid =       workbook.add_format({'bg_color': '#CCCCCC','font_color': '#000000', 'align': 'center'})
-format_valid_found =   workbook.add_format({'bg_color': '#00FF00','font_color': '#000000', 'align': 'center'})
-format_valid_missing = workbook.add_format({'bg_color': '#FF0000','font_color': '#000000', 'align': 'center'})
+    with open(filename + '.tmp', 'w') as f:
+        json.dump(manifest, f, sort_keys = True, indent = 1)
+    os.replace(filename + '.tmp', filename)
 
-# Overview of all years.
-worksheet = workbook.add_worksheet('Overview')
-worksheet.set_zoom(50)
+# Write the coverage report. A day is covered if there is a solution for its
+# configuration. The workbook is streamed to disk row by row in constant memory, so
+# every sheet is written strictly in row order.
+def writecoverage(filename, configurationsfound, years):
 
-yearstatus = {}
+    def covered(year, month, day):
+        return (month, day, calendar.weekday(year, month, day)) in configurationsfound
 
-rowoffset = 0
+    def valid(year, month, day):
+        return day <= calendar.monthrange(year, month)[1]
 
-col = 1
-for year in range(2022,2049):
+    yearstatus = {}
+    for year in years:
+        days = 0
+        missing = 0
+        for month in range(1,13):
+            for day in range(1, calendar.monthrange(year, month)[1] + 1):
+                days += 1
+                if not covered(year, month, day):
+                    missing += 1
+        yearstatus[year] = (days, missing)
 
-    if year == 2036:
-        col = 1
-        rowoffset = 34
+    workbook = xlsxwriter.Workbook(filename, {'constant_memory': True})
 
-    row = 0 + rowoffset
-    worksheet.merge_range(row, col, row, col+11, year, format_label)
-    row += 1
-        
-    start = datetime.datetime(year, 1, 1)
-    end = datetime.datetime(year, 12, 31)
+    format_label =         workbook.add_format({'bold': True, 'align': 'center'})
+    format_invalid =       workbook.add_format({'bg_color': '#CCCCCC','font_color': '#000000', 'align': 'center'})
+    format_valid_found =   workbook.add_format({'bg_color': '#00FF00','font_color': '#000000', 'align': 'center'})
+    format_valid_missing = workbook.add_format({'bg_color': '#FF0000','font_color': '#000000', 'align': 'center'})
 
-    days = 0
-    missing = 0
+    def writeday(worksheet, row, col, year, month, day):
+        if not valid(year, month, day):
+            worksheet.write(row, col, 'X', format_invalid)
+        elif covered(year, month, day):
+            worksheet.write(row, col, '1', format_valid_found)
+        else:
+            worksheet.write(row, col, '0', format_valid_missing)
+
+    # Overview of all years. The years are in blocks of 14 side by side, each year with a
+    # column per month and a row per day.
+    worksheet = workbook.add_worksheet('Overview')
+    worksheet.set_zoom(50)
+
+    years = list(years)
+    blocks = [years[i:i+14] for i in range(0, len(years), 14)]
+
+    row = 0
+    for block in blocks:
+        worksheet.set_row(row, 14)
+        for i, year in enumerate(block):
+            col = 1 + i*12
+            worksheet.merge_range(row, col, row, col+11, year, format_label)
+        row += 1
 
-    for month in range(1,13):
-        row = 1 + rowoffset    
-        
-        worksheet.set_column(col, col, 1.5)
-        worksheet.write(row, col, month, format_label)
+        worksheet.set_row(row, 14)
+        for i, year in enumerate(block):
+            for month in range(1,13):
+                col = 1 + i*12 + month-1
+                worksheet.set_column(col, col, 1.5)
+                worksheet.write(row, col, month, format_label)
         row += 1
-        
+
         for day in range(1, 32):
+            worksheet.set_row(row, 14)
             worksheet.write(row, 0, day, format_label)
-            
-            # Valid day?
-            valid = True
-            covered = False
-
-            if (month == 2) and (day > (29 if calendar.isleap(year) else 28)):
-                valid = False
-            elif (month in [4,6,9,11]) and (day > 30):
-                valid = False
-
-            if valid:
-                d = datetime.datetime(year, month, day)
-                covered = (d in datesrendered)
-            
-            if not valid:
-                worksheet.write(row, col, 'X', format_invalid)
-            else:
-                days += 1
-                
-                if covered:
-                    worksheet.write(row, col, '1', format_valid_found)
-                else:
-                    worksheet.write(row, col, '0', format_valid_missing)
-                    missing += 1
+            for i, year in enumerate(block):
+                for month in range(1,13):
+                    writeday(worksheet, row, 1 + i*12 + month-1, year, month, day)
+            row += 1
 
-            row += 1        
-
-        col += 1
+        # Empty row between the blocks.
+        row += 1
 
-    yearstatus[year] = (days, missing)
+    worksheet.freeze_panes(2, 1)
 
-for r in range(0, row):
-    worksheet.set_row(r, 14)
-        
+    # Year by year.
+    for year in years:
+        days = yearstatus[year][0]
+        missing = yearstatus[year][1]
+        worksheetname = str(year) + ('✅' if missing == 0 else f' ({(days-missing)/days*100:.1f}%)')
+        worksheet = workbook.add_worksheet(worksheetname)
 
-worksheet.freeze_panes(2, 1)
-
-# Year by year.
-for year in range(2022,2049):
-    days = yearstatus[year][0]
-    missing = yearstatus[year][1]
-    worksheetname = str(year) + ('✅' if missing == 0 else f' ({(days-missing)/days*100:.1f}%)')
-    worksheet = workbook.add_worksheet(worksheetname)
-    
-    start = datetime.datetime(year, 1, 1)
-    end = datetime.datetime(year, 12, 31)
-
-    row = 1
-    for month in range(1,13):
-        worksheet.write(row, 0, monthlabels[month-1], format_label)
-        
-        col = 1
+        worksheet.set_column(1, 31, 2)
         for day in range(1, 32):
-            worksheet.write(0, col, f'{day:02d}', format_label)
-            worksheet.set_column(col, col, 2)
-            
-            # Valid day? 31sts and Feb 29ths.
-            valid = True
-            covered = False
-
-            if (month == 2):
-                if (day > 29):
-                    valid = False
-                elif (day == 29) and (not calendar.isleap(year)):
-                    valid = False
-            elif (month in [4,6,9,11]) and (day > 30):
-                valid = False
-
-            if valid:
-                d = datetime.datetime(year, month, day)
-                covered = (d in datesrendered)
-            
-            if not valid:
-                worksheet.write(row, col, 'X', format_invalid)
-            else:
-                if covered:
-                    worksheet.write(row, col, '1', format_valid_found)
+            worksheet.write(0, day, f'{day:02d}', format_label)
+
+        for month in range(1,13):
+            worksheet.write(month, 0, monthlabels[month-1], format_label)
+            for day in range(1, 32):
+                writeday(worksheet, month, day, year, month, day)
+
+        worksheet.freeze_panes(1, 1)
+
+    workbook.close()
+
+def parse_commandline():
+
+    parser = argparse.ArgumentParser(
+        description = 'Render the Calendar-puzzle solutions for each day and write a coverage report.'
+    )
+
+    parser.add_argument('basename',
+        nargs = '?',
+        default = os.path.join('..', 'catalog'),
+        help = 'Name of the catalog folder below render (default: %(default)s)'
+    )
+
+    parser.add_argument('-p', '--pack',
+        action = 'store',
+        default = None,
+        help = 'Read the solutions from this solution pack instead of the JSON files in the catalog folder',
+        dest = 'pack',
+        metavar = 'file'
+    )
+
+    parser.add_argument('-j', '--jobs',
+        action = 'store',
+        default = os.cpu_count(),
+        type = int,
+        help = 'Number of render processes (default: %(default)s)',
+        dest = 'jobs',
+        metavar = 'count'
+    )
+
+    parser.add_argument('-f', '--format',
+        action = 'store',
+        default = 'jpg',
+        choices = imageformats,
+        help = 'Image format to write (default: %(default)s)',
+        dest = 'format'
+    )
+
+    parser.add_argument('-q', '--quality',
+        action = 'store',
+        default = 85,
+        type = int,
+        help = 'Quality for jpg and webp images (default: %(default)s)',
+        dest = 'quality',
+        metavar = 'percent'
+    )
+
+    parser.add_argument('-ya', '--year-agnostic',
+        action = 'store_true',
+        help = 'Render one image without year-label per configuration next to its JSON file instead of one per day',
+        dest = 'yearagnostic'
+    )
+
+    parser.add_argument('-as', '--all-styles',
+        action = 'store_true',
+        help = 'Render each day in all styles instead of the one picked for its configuration',
+        dest = 'allstyles'
+    )
+
+    parser.add_argument('-sc', '--scales',
+        action = 'store',
+        default = [1],
+        nargs = '+',
+        type = float,
+        help = 'Sizes to render each day in, e.g. 1 0.25 for thumbnails as well (default: 1)',
+        dest = 'scales',
+        metavar = 'scale'
+    )
+
+    parser.add_argument('-b', '--book',
+        action = 'store',
+        default = None,
+        choices = ['year', 'all', 'month'],
+        help = 'Write a PDF with a page per day for each year or for all years, or a montage sheet per month, instead of an image per day',
+        dest = 'book'
+    )
+
+    parser.add_argument('-fo', '--force',
+        action = 'store_true',
+        help = 'Render all images, even those that are up to date',
+        dest = 'force'
+    )
+
+    return parser.parse_args()
+
+def main():
+
+    options = parse_commandline()
+    basename = options.basename
+
+    #basename = 'do'
+    #basename = 'xrcloud'
+    #basename = 'complete'
+
+    print(f'Basename={basename}')
+
+    root = os.path.join('render', basename)
+
+    COVERAGEFILE = os.path.join(root, 'coverage.xlsx')
+    MANIFESTFILE = os.path.join(root, 'manifest.json')
+    if os.path.isfile(COVERAGEFILE):
+        os.remove(COVERAGEFILE)
+
+    found = 0
+    notfound = 0
+    consrendered = 0
+    consmissing = 0
+
+    configurationsfound = set()
+    configurationsmissing = set()
+
+    todo = []
+    queued = set()
+    available = []
+
+    # All solutions are loaded in one go, from a pack if given or else from the folder of
+    # JSON files.
+    if options.pack:
+        index = SolutionIndex.SolutionIndex.load(options.pack)
+    else:
+        index = SolutionIndex.SolutionIndex.fromsolutions(SolutionPack.readjsoncatalog(root))
+
+    # What is there and what it was rendered from.
+    files = scanfiles(root)
+    manifest = loadmanifest(MANIFESTFILE)
+    signatures = stylesignatures()
+
+    # Hash of the inputs for each image to render, by destbasename.
+    inputhashes = {}
+
+    for year in range(2022,2049):
+        start = datetime.datetime(year, 1, 1)
+        end = datetime.datetime(year, 12, 31)
+
+        d = start
+        while (d<=end):
+            configuration, solutions = index.lookup(d)
+            catalogname = Placements.catalogname(*configuration)
+            destname = f'{d.year}/{d.month:02d}/{d.year}-{d.month:02d}-{d.day:02d}'
+            if options.yearagnostic:
+                destname = catalogname
+            destbasename = os.path.join(root, *destname.split('/'))
+
+            if solutions:
+                solution = solutions[0]
+                found += 1
+                
+                configurationsfound.add(configuration)
+                available.append((d.date(), configuration, solution))
+
+                # The day is up to date if all its images are.
+                uptodate = not options.force
+                for styleindex, scale, suffix in variants(configuration, len(signatures), options.allstyles, options.scales):
+                    variantname = f'{destname}{suffix}.{options.format}'
+                    inputhash = hashlib.sha1(repr((
+                        solution,
+                        signatures[styleindex],
+                        scale,
+                        RENDERVERSION,
+                        options.format,
+                        options.quality,
+                        options.yearagnostic
+                    )).encode('utf-8')).hexdigest()
+                    inputhashes[destbasename + suffix] = (variantname, inputhash)
+
+                    if (variantname not in files) or (manifest['outputs'].get(variantname) != inputhash):
+                        uptodate = False
+
+                if uptodate:
+                    consmissing = 0
+                    if consrendered == 0:
+                        print('')
+                    consrendered += 1
+                    print(('..' if consrendered>1 else '  ') + f'{d:%d.%m.%Y}: Already rendered       ' + counter(consrendered) + ' '*50, end = '\r')
                 else:
-                    worksheet.write(row, col, '0', format_valid_missing)
-                    
-            col += 1        
-    
-        row += 1
-    
-    worksheet.freeze_panes(1, 1)
+                    consrendered = 0
+                    consmissing = 0
+                    if not options.yearagnostic:
+                        todo.append((d.date(), configuration, solution, destbasename))
+                    elif destbasename not in queued:
+                        todo.append((None, configuration, solution, destbasename))
+                    queued.add(destbasename)
 
-workbook.close()
+            else:
+                consrendered = 0
+                if consmissing == 0:
+                    print('')
+                consmissing += 1
 
-print('')
-print(f'Total {found+notfound} days.')
-print(f'Freshly rendered {freshlyrendered} days.')
-print(f'Found {len(configurationsfound)} configurations used by {found} days.')
-print(f'Missing {len(configurationsmissing)} configurations for {notfound} days.')
+                configurationsmissing.add(configuration)
 
-D = len(configurationsfound)+len(configurationsmissing)
-if D != 0:
-    complete = 100*len(configurationsfound)/D
-    print(f'Overall {complete:.1f}% complete.')
\ No newline at end of file
+                print(('..' if consmissing>1 else '  ') + f'{d:%d.%m.%Y}: Solution missing' + counter(consmissing) + ' '*50, end = '\r')
+                notfound += 1
+        
+            d = d + datetime.timedelta(days = 1)
+
+    print('')
+
+    # Record each image in the manifest when it has been written.
+    def onwritten(destbasename):
+        destname, inputhash = inputhashes[destbasename]
+        manifest['outputs'][destname] = inputhash
+
+    freshlyrendered = 0
+    if options.book:
+        print(f'Rendering {len(available)} days into a book.')
+        freshlyrendered = renderbook(available, root, options.book, options.format, options.quality)
+    elif todo:
+        print(f'Rendering {len(todo)} images with {options.jobs} processes.')
+        try:
+            freshlyrendered, failed = renderall(todo, max(1, options.jobs), options.format, options.quality, onwritten, options.allstyles, options.scales)
+            if failed:
+                print(f'Rendering failed for {failed} days.')
+        finally:
+            savemanifest(MANIFESTFILE, manifest)
+    elif files:
+        savemanifest(MANIFESTFILE, manifest)
+
+    writecoverage(COVERAGEFILE, configurationsfound, range(2022,2049))
+
+    print('')
+    print(f'Total {found+notfound} days.')
+    print(f'Freshly rendered {freshlyrendered} images.')
+    print(f'Found {len(configurationsfound)} configurations used by {found} days.')
+    print(f'Missing {len(configurationsmissing)} configurations for {notfound} days.')
+
+    D = len(configurationsfound)+len(configurationsmissing)
+    if D != 0:
+        complete = 100*len(configurationsfound)/D
+        print(f'Overall {complete:.1f}% complete.')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+'''
+@author: Marian Aldenhövel <marian.aldenhoevel@marian-aldenhoevel.de>
+'''
+
+# Works out which configurations a solver still has to solve, in what order, and hands
+# them out to it.
+#
+# Every date maps to one of the 2562 configurations of month, day and weekday. So instead
+# of walking all dates from 2022 to 2048 and looking for each one in the catalog, the
+# dates are reduced to configurations up front with CalendarTest.py and the catalog is
+# read with one scan of its folder.
+#
+# What is left is ordered either by need, the configuration whose next date comes soonest
+# first, or by difficulty, the one that is expected to take longest first so the long tail
+# is spread over the worker processes. Every configuration solved adds the seconds it took
+# to difficulty.json next to the catalog folders. As all solvers share the file, the times
+# one solver took order the work of the next. Configurations nobody has solved yet are
+# ordered by an estimate of the size of their search tree.
+
+import os
+import json
+import time
+import random
+import logging
+import platform
+import datetime
+import collections
+import concurrent.futures
+
+import numpy
+import portalocker
+
+import Placements
+import Orientations
+import CalendarTest
+
+orders = ['need', 'difficulty']
+
+# The Gregorian calendar repeats after 400 years, every configuration appears in them.
+CYCLEDAYS = 146097
+
+# All configurations as (configuration, date) with the first date on or after start each
+# comes round on, soonest first.
+def configurations(start = None):
+  analysis = CalendarTest.analyse(start or datetime.date.today(), CYCLEDAYS)
+  first = analysis['first']
+  keys = numpy.flatnonzero(first >= 0)
+  keys = keys[numpy.argsort(first[keys], kind = 'stable')]
+  return [(Placements.configurationfromkey(int(key)), analysis['dates'][first[key]].item()) for key in keys]
+
+# One scan of the catalog folder. Returns the names of the configurations that have a JSON
+# file and the paths of the lock files.
+def scancatalog(folder):
+  solved = set()
+  lockfiles = []
+  try:
+    with os.scandir(folder) as entries:
+      for entry in entries:
+        name, ext = os.path.splitext(entry.name)
+        if (ext == '.json') and name[:6].isdigit():
+          solved.add(name)
+        elif ext == '.lck':
+          lockfiles.append(entry.path)
+  except FileNotFoundError:
+    pass
+  return solved, lockfiles
+
+# Attempt to clean up stale lock files.
+def removelocks(lockfiles):
+  for lockfile in lockfiles:
+    try:
+      os.remove(lockfile)
+    except OSError:
+      pass # Most propably still locked
+
+# Seconds it took to solve each configuration by catalog name.
+def loaddifficulty(filename):
+  try:
+    with open(filename, 'r') as f:
+      return json.load(f)
+  except (OSError, ValueError):
+    return {}
+
+# Add the seconds a configuration took to the file. Concurrent runs share it, so it is read
+# again and written under a lock to keep what the others added in the meantime.
+def recorddifficulty(filename, catalogname, seconds):
+  with portalocker.Lock(filename + '.lck', 'w', timeout = 10):
+    difficulty = loaddifficulty(filename)
+    difficulty[catalogname] = round(seconds, 3)
+    tmpname = filename + '.tmp'
+    with open(tmpname, 'w') as f:
+      json.dump(difficulty, f, sort_keys = True, indent = 1)
+    os.replace(tmpname, filename)
+
+# For each board square the placements covering it as (part bit, placement mask).
+squareplacements = [[] for _ in Placements.boardcells]
+for n, name in enumerate(Placements.partnames):
+  for m in Placements.placements[name]:
+    for i in range(0, len(Placements.boardcells)):
+      if (m >> i) & 1:
+        squareplacements[i].append((1 << n, m))
+
+# Estimate the size of the search tree for covering the free squares of a configuration
+# with the parts, by Knuth's random probing. Each probe goes down one random path, always
+# covering the lowest free square, and adds up the product of the branching on the way.
+# The mean over the probes is an unbiased estimate of the number of nodes. The random
+# generator is seeded with the configuration so the estimate does not change between runs.
+def estimatetreesize(configuration, probes = 32):
+  rng = random.Random(Placements.configurationkey(*configuration))
+  start = Placements.fullmask & ~Placements.configurationmask(*configuration)
+  allparts = (1 << len(Placements.partnames)) - 1
+
+  total = 0
+  for _ in range(0, probes):
+    free = start
+    parts = allparts
+    branches = 1
+    nodes = 1
+    while free:
+      square = (free & -free).bit_length() - 1
+      fits = [(part, m) for part, m in squareplacements[square] if (parts & part) and ((m & free) == m)]
+      if not fits:
+        break
+      branches *= len(fits)
+      nodes += branches
+      part, m = rng.choice(fits)
+      free &= ~m
+      parts &= ~part
+    total += nodes
+
+  return total / probes
+
+# Estimated search tree sizes by catalog name for the given configurations. They only depend
+# on the placement table, so they are computed once and cached in .cache like the orientations.
+def estimates(configurations):
+  logger = logging.getLogger('Scheduler')
+
+  filename = os.path.join(Orientations.cachefolder, f'estimates-{Placements.fingerprint.hex()}.json')
+  result = loaddifficulty(filename)
+
+  missing = [configuration for configuration in configurations if Placements.catalogname(*configuration) not in result]
+  if missing:
+    for configuration in missing:
+      result[Placements.catalogname(*configuration)] = round(estimatetreesize(configuration))
+
+    # The cache is only an optimization, so do not fail if it cannot be written.
+    try:
+      os.makedirs(Orientations.cachefolder, exist_ok = True)
+      tmpname = filename + '.tmp'
+      with open(tmpname, 'w') as f:
+        json.dump(result, f, sort_keys = True, indent = 1)
+      os.replace(tmpname, filename)
+    except OSError as e:
+      logger.debug(f'Could not cache estimates in {filename}: {e}')
+
+  return result
+
+# Leave out the configurations already solved and order the rest. By difficulty those that
+# took longest in an earlier attempt come first, by the seconds recorded in difficulty, the
+# rest follow by their estimated search tree size.
+def schedule(configurations, solved, order = 'need', difficulty = {}):
+  pending = [(configuration, date) for configuration, date in configurations if Placements.catalogname(*configuration) not in solved]
+  if order == 'difficulty':
+    estimated = estimates([configuration for configuration, date in pending])
+    def hardest(entry):
+      catalogname = Placements.catalogname(*entry[0])
+      if catalogname in difficulty:
+        return (1, difficulty[catalogname])
+      return (0, estimated[catalogname])
+    pending.sort(key = hardest, reverse = True)
+  return pending
+
+# Solve one configuration with solvefor(month, day, weekday) unless a concurrent process has
+# solved it in the meantime or is working on it. A lock file in the catalog folder tells the
+# other processes that the configuration is taken. solvefor must have its solutions on disk
+# when it returns, as the lock is released then. issolved(configuration) tells wether there
+# is a solution on disk, by default from the JSON file in the catalog folder. Returns the
+# configuration, 'solved', 'done' or 'locked' and the seconds it took.
+def solvelocked(solvefor, catalogfolder, configuration, date, issolved = None):
+  logger = logging.getLogger('Scheduler')
+
+  catalogname = Placements.catalogname(*configuration)
+  if issolved is None:
+    issolved = lambda configuration: os.path.isfile(os.path.join(catalogfolder, Placements.catalogname(*configuration) + '.json'))
+
+  # No solution was known at startup. Create a lock file so other processes know we are working on this.
+  lockfilename = os.path.join(catalogfolder, catalogname + '.lck')
+  locked = False
+  try:
+    with portalocker.Lock(lockfilename, 'wt', timeout = 1) as lockfile:
+      locked = True
+
+      # Only this one configuration is looked up, and only under the lock, so a solution
+      # a concurrent process wrote since the scan at startup is found.
+      if issolved(configuration):
+        logger.info(f'Already done {catalogname}')
+        return configuration, 'done', 0
+
+      lockfile.write(f'PID {os.getpid()}, started {datetime.datetime.now()}')
+      lockfile.flush()
+      os.fsync(lockfile.fileno())
+
+      # In Windows rename the shell title.
+      if platform.system() == 'Windows':
+        os.system(f'cmd.exe /C title {catalogname}')
+
+      logger.info(f'Now solving for {catalogname}, next needed on {date}')
+      start = time.perf_counter()
+      solvefor(*configuration)
+      return configuration, 'solved', time.perf_counter() - start
+
+  except portalocker.exceptions.LockException:
+    logger.info(f'{catalogname} locked, being solved by concurrent process')
+    return configuration, 'locked', 0
+
+  finally:
+    # The lock file of a concurrent process is left alone.
+    if locked:
+      try:
+        os.remove(lockfilename)
+      except OSError:
+        pass
+
+# Call solve(configuration, date) for each scheduled configuration and yield what it returns
+# as the results come in. With more than one job they are solved in a process pool, then
+# solve must be a module level function and initializer sets up each worker process.
+def run(pending, solve, jobs = 1, initializer = None, initargs = ()):
+  if jobs == 1:
+    for configuration, date in pending:
+      yield solve(configuration, date)
+    return
+
+  with concurrent.futures.ProcessPoolExecutor(max_workers = jobs or None, initializer = initializer, initargs = initargs) as pool:
+    futures = [pool.submit(solve, configuration, date) for configuration, date in pending]
+    try:
+      for future in concurrent.futures.as_completed(futures):
+        yield future.result()
+    finally:
+      # Do not wait for the rest if we stop early.
+      for future in futures:
+        future.cancel()
+
+# Solve every configuration that has no solution in the catalog folder and is not in known
+# yet, by need or by difficulty. Returns the count of configurations by outcome.
+def solveall(catalogfolder, solve, order = 'need', jobs = 1, known = (), initializer = None, initargs = ()):
+  logger = logging.getLogger('Scheduler')
+
+  os.makedirs(catalogfolder, exist_ok = True)
+
+  solved, lockfiles = scancatalog(catalogfolder)
+  removelocks(lockfiles)
+  solved.update(Placements.catalogname(*configuration) for configuration in known)
+
+  difficultyfile = os.path.join(os.path.dirname(os.path.abspath(catalogfolder)), 'difficulty.json')
+  difficulty = loaddifficulty(difficultyfile)
+
+  pending = schedule(configurations(), solved, order, difficulty)
+  logger.info(f'{len(solved)} configurations solved, {len(pending)} to solve by {order} in {jobs or os.cpu_count()} processes.')
+
+  counts = collections.Counter()
+  for configuration, status, seconds in run(pending, solve, jobs, initializer, initargs):
+    counts[status] += 1
+    if status == 'solved':
+      recorddifficulty(difficultyfile, Placements.catalogname(*configuration), seconds)
+    logger.info(f'{sum(counts.values())} of {len(pending)} scheduled configurations processed.')
+
+  logger.info('Scheduled configurations: {solved} solved, {done} done by concurrent processes, {locked} locked.'.format(
+    solved=counts['solved'],
+    done=counts['done'],
+    locked=counts['locked']
+  ))
+
+  return counts
@@ -0,0 +1,416 @@
+# -*- coding: utf-8 -*-
+'''
+@author: Marian Aldenhövel <marian.aldenhoevel@marian-aldenhoevel.de>
+'''
+
+# A small HTTP server for the solution of the day and its rendered image.
+#
+#   GET /solution/2023-09-11        solution as JSON in the format of Solver3.py
+#   GET /render/2023-09-11.jpg      the calendar rendered by Render.py, also .webp and .png
+#
+# Solutions come from a SolutionIndex loaded at startup. Rendered images are kept in an
+# LRU cache, cache misses are rendered in a process pool so the event loop never waits
+# for cairo.
+#
+# There is a load test built in, run it against a running server:
+#
+#   python Server.py serve --solution-pack ../catalog3.pack
+#   python Server.py loadtest --requests 10000 --concurrency 50
+
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import datetime
+import collections
+import concurrent.futures
+
+import Placements
+import SolutionIndex
+
+options = None
+
+# Render worker. Each process of the pool loads Render.py and the styles once.
+workerstyles = None
+
+def initworker():
+    global workerstyles
+
+    import Render
+    workerstyles = Render.loadstyles()
+
+def renderworker(isodate, solution, imageformat):
+    import Render
+
+    d = datetime.date.fromisoformat(isodate)
+    style = workerstyles[Render.stylefor((d.month, d.day, d.weekday()), len(workerstyles))]
+
+    ims = Render.renderimage(d, solution, style)
+    data = Render.encodeimage(ims, imageformat)
+    Render.releasesurface(ims)
+    return data
+
+contenttypes = {
+    'jpg': 'image/jpeg',
+    'webp': 'image/webp',
+    'png': 'image/png'
+}
+
+# Keeps rendered images by date in memory, evicting the least recently used. Concurrent
+# requests for the same image share one render.
+class RenderCache:
+
+    def __init__(self, makepool, capacity):
+        self.makepool = makepool
+        self.pool = makepool()
+        self.capacity = capacity
+        self.images = collections.OrderedDict()
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, d, solution, imageformat):
+        key = (d, imageformat)
+
+        if key in self.images:
+            self.hits += 1
+            self.images.move_to_end(key)
+            return self.images[key]
+
+        self.misses += 1
+        if key not in self.pending:
+            self.pending[key] = self.submit(d, solution, imageformat)
+
+        future, pool = self.pending[key]
+        try:
+            image = await asyncio.shield(future)
+        except concurrent.futures.BrokenExecutor:
+            self.renewpool(pool)
+            raise
+        finally:
+            self.pending.pop(key, None)
+
+        self.images[key] = image
+        while len(self.images) > self.capacity:
+            self.images.popitem(last = False)
+
+        return image
+
+    # Start rendering, returns the future and the pool it runs in.
+    def submit(self, d, solution, imageformat):
+        loop = asyncio.get_running_loop()
+        pool = self.pool
+        try:
+            return loop.run_in_executor(pool, renderworker, d.isoformat(), solution, imageformat), pool
+        except concurrent.futures.BrokenExecutor:
+            self.renewpool(pool)
+            return loop.run_in_executor(self.pool, renderworker, d.isoformat(), solution, imageformat), self.pool
+
+    # A worker process that dies breaks the whole pool. Replace it, so only the renders
+    # that were running at the time fail and not every one after.
+    def renewpool(self, pool):
+        if pool is self.pool:
+            logging.getLogger('RenderCache').error('Render pool broken, starting a new one.')
+            pool.shutdown(wait = False, cancel_futures = True)
+            self.pool = self.makepool()
+
+    def close(self):
+        self.pool.shutdown()
+
+class Server:
+
+    def __init__(self, index, cache):
+        self.index = index
+        self.cache = cache
+        self.requests = 0
+
+    async def respond(self, writer, status, contenttype, body, keepalive):
+        reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}[status]
+        writer.write((
+            f'HTTP/1.1 {status} {reason}\r\n'
+            f'Content-Type: {contenttype}\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'Connection: {"keep-alive" if keepalive else "close"}\r\n'
+            '\r\n').encode('ascii') + body)
+        await writer.drain()
+
+    async def handle(self, method, path):
+        if method != 'GET':
+            return 405, 'text/plain', b'Only GET is supported.\n'
+
+        parts = path.strip('/').split('/')
+        if len(parts) != 2:
+            return 404, 'text/plain', b'Not found.\n'
+
+        kind, name = parts
+        datestr, _, imageformat = name.partition('.')
+        try:
+            d = datetime.date.fromisoformat(datestr)
+        except ValueError:
+            return 400, 'text/plain', b'Expected a date as YYYY-MM-DD.\n'
+
+        configuration, solutions = self.index.lookup(d)
+        if not solutions:
+            return 404, 'text/plain', f'No solution known for {Placements.catalogname(*configuration)}.\n'.encode('ascii')
+
+        if (kind == 'solution') and not imageformat:
+            jsondata = Placements.jsonfromsolution(solutions[0], configuration)
+            jsondata['date'] = d.isoformat()
+            jsondata['solutions'] = len(solutions)
+            return 200, 'application/json', json.dumps(jsondata, indent = 4).encode('utf-8')
+
+        if (kind == 'render') and (imageformat in contenttypes):
+            image = await self.cache.get(d, solutions[0], imageformat)
+            return 200, contenttypes[imageformat], image
+
+        return 404, 'text/plain', b'Not found.\n'
+
+    # One connection, possibly with several requests if the client keeps it alive.
+    async def connection(self, reader, writer):
+        logger = logging.getLogger('connection')
+
+        try:
+            while True:
+                requestline = await reader.readline()
+                if not requestline:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+
+                try:
+                    method, path, version = requestline.decode('latin-1').split()
+                except ValueError:
+                    await self.respond(writer, 400, 'text/plain', b'Bad request.\n', False)
+                    break
+
+                keepalive = (version == 'HTTP/1.1') and (headers.get('connection', '').lower() != 'close')
+
+                self.requests += 1
+                try:
+                    status, contenttype, body = await self.handle(method, path)
+                except Exception:
+                    logger.exception(f'Error handling {path}')
+                    status, contenttype, body = 500, 'text/plain', b'Internal error.\n'
+
+                logger.debug(f'{method} {path} {status}')
+                await self.respond(writer, status, contenttype, body, keepalive)
+
+                if not keepalive:
+                    break
+
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+
+        finally:
+            writer.close()
+
+async def serve():
+    logger = logging.getLogger('serve')
+
+    index = SolutionIndex.loadindex(options.pack)
+    logger.info(f'{len(index)} configurations known from {options.pack}.')
+
+    cache = RenderCache(lambda: concurrent.futures.ProcessPoolExecutor(max_workers = options.jobs or None, initializer = initworker), options.cachesize)
+    server = Server(index, cache)
+
+    httpserver = await asyncio.start_server(server.connection, options.host, options.port)
+    logger.info(f'Listening on http://{options.host}:{options.port}/')
+
+    async with httpserver:
+        try:
+            await httpserver.serve_forever()
+        finally:
+            logger.info(f'Served {server.requests} requests, render cache {cache.hits} hits, {cache.misses} misses.')
+            cache.close()
+
+# Fire requests for random dates at a running server from a number of concurrent
+# keep-alive connections and report the latency distribution.
+async def loadtest():
+    latencies = []
+    errors = 0
+
+    first = datetime.date(2022, 1, 1).toordinal()
+    last = datetime.date(2048, 12, 31).toordinal()
+    rng = random.Random(options.seed)
+
+    async def client(count):
+        nonlocal errors
+
+        reader, writer = await asyncio.open_connection(options.host, options.port)
+        try:
+            for _ in range(0, count):
+                d = datetime.date.fromordinal(rng.randint(first, last))
+                kind = options.kind if options.kind != 'mixed' else rng.choice(['solution', 'render'])
+                path = f'/solution/{d.isoformat()}' if kind == 'solution' else f'/render/{d.isoformat()}.jpg'
+
+                start = time.perf_counter()
+                writer.write(f'GET {path} HTTP/1.1\r\nHost: {options.host}\r\n\r\n'.encode('ascii'))
+                await writer.drain()
+
+                status = int((await reader.readline()).split()[1])
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    if key.strip().lower() == 'content-length':
+                        length = int(value)
+                await reader.readexactly(length)
+                latencies.append(time.perf_counter() - start)
+
+                if status != 200:
+                    errors += 1
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    # The first clients take one request more if they do not divide evenly.
+    perclient, remainder = divmod(options.requests, options.concurrency)
+    outcomes = await asyncio.gather(*[client(perclient + (1 if i < remainder else 0)) for i in range(0, options.concurrency)], return_exceptions = True)
+    duration = time.perf_counter() - start
+
+    # A client that cannot connect or loses its connection ends early, the others carry on.
+    failures = [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+    if failures:
+        print(f'{len(failures)} of {options.concurrency} connections failed, first with: {failures[0]!r}')
+
+    if not latencies:
+        print('No responses.')
+        return
+
+    latencies.sort()
+    def percentile(p):
+        return latencies[min(len(latencies)-1, int(p / 100 * len(latencies)))] * 1000
+
+    print(f'{len(latencies)} requests in {duration:.2f}s ({len(latencies)/duration:.0f}/s), {errors} errors.')
+    print(f'Latency p50={percentile(50):.2f}ms p90={percentile(90):.2f}ms p99={percentile(99):.2f}ms max={latencies[-1]*1000:.2f}ms')
+
+# Conversion function for argparse counts that must be at least 1.
+def positiveint(v):
+    value = int(v)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f'Expected a count of at least 1, got {v}.')
+    return value
+
+def parse_commandline():
+    global options
+
+    parser = argparse.ArgumentParser(
+        description = 'Serve Calendar-puzzle solutions and renders over HTTP.'
+    )
+
+    parser.add_argument('-ho', '--host',
+        action = 'store',
+        default = '127.0.0.1',
+        help = 'Address to listen on or connect to (default: %(default)s)',
+        dest = 'host',
+        metavar = 'host'
+    )
+
+    parser.add_argument('-po', '--port',
+        action = 'store',
+        default = 8080,
+        type = int,
+        help = 'Port to listen on or connect to (default: %(default)s)',
+        dest = 'port',
+        metavar = 'port'
+    )
+
+    subparsers = parser.add_subparsers(dest = 'command', required = True)
+
+    p = subparsers.add_parser('serve', help = 'Run the server')
+
+    p.add_argument('-sp', '--solution-pack',
+        action = 'store',
+        default = '../catalog3.pack',
+        help = 'Solution pack to serve from (default: %(default)s)',
+        dest = 'pack',
+        metavar = 'file'
+    )
+
+    p.add_argument('-cs', '--cache-size',
+        action = 'store',
+        default = 1000,
+        type = int,
+        help = 'Number of rendered images to keep in memory (default: %(default)s)',
+        dest = 'cachesize',
+        metavar = 'count'
+    )
+
+    p.add_argument('-j', '--jobs',
+        action = 'store',
+        default = 0,
+        type = int,
+        help = 'Number of render processes (default: one per core)',
+        dest = 'jobs',
+        metavar = 'count'
+    )
+
+    p = subparsers.add_parser('loadtest', help = 'Run a load test against a running server')
+
+    p.add_argument('-n', '--requests',
+        action = 'store',
+        default = 10000,
+        type = positiveint,
+        help = 'Total number of requests (default: %(default)s)',
+        dest = 'requests',
+        metavar = 'count'
+    )
+
+    p.add_argument('-c', '--concurrency',
+        action = 'store',
+        default = 50,
+        type = positiveint,
+        help = 'Number of concurrent connections (default: %(default)s)',
+        dest = 'concurrency',
+        metavar = 'count'
+    )
+
+    p.add_argument('-k', '--kind',
+        action = 'store',
+        default = 'mixed',
+        choices = ['solution', 'render', 'mixed'],
+        help = 'What to request (default: %(default)s)',
+        dest = 'kind'
+    )
+
+    p.add_argument('-rs', '--random-seed',
+        action = 'store',
+        default = None,
+        help = 'Seed for the random dates (default: use entropy source to randomize)',
+        dest = 'seed',
+        metavar = 'seed'
+    )
+
+    options = parser.parse_args()
+
+def main():
+    parse_commandline()
+
+    logging.basicConfig(level = logging.INFO, format = '{asctime} [{levelname:5}] {name} - {message}', datefmt = '%H:%M:%S', style = '{')
+
+    # Render.py finds its textures relative to the working directory.
+    if options.command == 'serve':
+        options.pack = os.path.abspath(options.pack)
+    os.chdir(os.path.dirname(os.path.realpath(__file__)))
+
+    try:
+        if options.command == 'serve':
+            asyncio.run(serve())
+        else:
+            asyncio.run(loadtest())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+'''
+@author: Marian Aldenhövel <marian.aldenhoevel@marian-aldenhoevel.de>
+'''
+
+# In-memory index of known solutions by date.
+#
+# Any date of any year maps to one of the configurations of month, day and weekday. The
+# index keeps the solutions for each configuration in a flat list by configuration key,
+# so a lookup is the date arithmetic plus one list access. It is filled once from a
+# solution pack at startup.
+
+import os
+
+import Placements
+import SolutionPack
+
+class SolutionIndex:
+
+  def __init__(self):
+    self.slots = [()] * Placements.CONFIGURATIONS
+
+  # Build an index from a solution pack. The pack is only read during loading.
+  @classmethod
+  def load(cls, packfile):
+    index = cls()
+    with SolutionPack.SolutionPack(packfile) as pack:
+      for configuration in pack.configurations():
+        index.slots[Placements.configurationkey(*configuration)] = tuple(pack.solutions(*configuration))
+    return index
+
+  # Build an index from solutions by configuration, as SolutionPack.readjsoncatalog() returns them.
+  @classmethod
+  def fromsolutions(cls, solutions):
+    index = cls()
+    for configuration, configurationsolutions in solutions.items():
+      index.slots[Placements.configurationkey(*configuration)] = tuple(configurationsolutions)
+    return index
+
+  def add(self, configuration, solution):
+    key = Placements.configurationkey(*configuration)
+    if solution not in self.slots[key]:
+      self.slots[key] = self.slots[key] + (solution,)
+
+  # Configuration as (month, day, weekday) and the tuple of known solutions for a date.
+  def lookup(self, date):
+    weekday = date.weekday()
+    return (date.month, date.day, weekday), self.slots[((date.month-1) * 31 + (date.day-1)) * 7 + weekday]
+
+  # The first known solution for a date or None.
+  def solution(self, date):
+    solutions = self.lookup(date)[1]
+    return solutions[0] if solutions else None
+
+  def __contains__(self, date):
+    return bool(self.lookup(date)[1])
+
+  # The configurations with at least one solution as (month, day, weekday).
+  def configurations(self):
+    return [Placements.configurationfromkey(key) for key, solutions in enumerate(self.slots) if solutions]
+
+  # Number of configurations with at least one solution.
+  def __len__(self):
+    return sum(1 for solutions in self.slots if solutions)
+
+# Load an index if the pack exists, otherwise start with an empty one.
+def loadindex(packfile):
+  if packfile and os.path.isfile(packfile):
+    return SolutionIndex.load(packfile)
+  return SolutionIndex()
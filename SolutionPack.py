@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+'''
+@author: Marian Aldenhövel <marian.aldenhoevel@marian-aldenhoevel.de>
+'''
+
+# A compact binary file holding many solutions for many configurations.
+#
+# Each solution is stored as the placement indices of the ten parts into the table in
+# Placements.py, one byte each. The file starts with a header, followed by an index
+# with the number of the first solution for each configuration slot and then the
+# solutions themselves:
+#
+#   header      magic 'CPSP', version, number of parts, record size, number of
+#               configuration slots, number of solutions, placement table fingerprint
+#   index       (slots + 1) x uint32, solutions of slot k are [index[k], index[k+1])
+#   records     solutions x record size bytes
+#
+# All numbers are little-endian. The file is read through mmap, looking up the
+# solutions for a configuration is two integer reads and a slice of the mapping.
+#
+# Run as a script to convert between a folder of JSON solutions and a pack:
+#
+#   python SolutionPack.py pack ../catalog3 ../catalog3.pack --journal ../catalog3.journal
+#   python SolutionPack.py unpack ../catalog3.pack ../catalog3
+#   python SolutionPack.py info ../catalog3.pack
+
+import os
+import mmap
+import json
+import struct
+import argparse
+import collections
+
+import Placements
+
+MAGIC = b'CPSP'
+VERSION = 1
+
+header = struct.Struct('<4sHBBII8s')
+indexentry = struct.Struct('<I')
+indexrange = struct.Struct('<II')
+
+class SolutionPack:
+
+  def __init__(self, filename):
+    self.filename = filename
+    self.file = open(filename, 'rb')
+    self.map = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+    self.view = memoryview(self.map)
+
+    magic, version, parts, self.recordsize, self.slots, self.count, fingerprint = header.unpack_from(self.map, 0)
+    if magic != MAGIC:
+      raise ValueError(f'{filename} is not a solution pack')
+    if version != VERSION:
+      raise ValueError(f'{filename} has unsupported version {version}')
+    if (parts != len(Placements.partnames)) or (fingerprint != Placements.fingerprint):
+      raise ValueError(f'{filename} was written for a different placement table')
+
+    self.indexstart = header.size
+    self.recordsstart = self.indexstart + indexentry.size * (self.slots + 1)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+  def close(self):
+    self.view.release()
+    self.map.close()
+    self.file.close()
+
+  def __len__(self):
+    return self.count
+
+  # Number of the first and one past the last solution for a configuration slot.
+  def range(self, key):
+    return indexrange.unpack_from(self.map, self.indexstart + indexentry.size * key)
+
+  # All solutions for a configuration as a memoryview into the file, record size
+  # bytes per solution.
+  def records(self, month, day, weekday):
+    first, last = self.range(Placements.configurationkey(month, day, weekday))
+    return self.view[self.recordsstart + first * self.recordsize:self.recordsstart + last * self.recordsize]
+
+  def solutions(self, month, day, weekday):
+    records = self.records(month, day, weekday)
+    return [tuple(records[i:i + self.recordsize]) for i in range(0, len(records), self.recordsize)]
+
+  # The first solution for a configuration or None.
+  def solution(self, month, day, weekday):
+    records = self.records(month, day, weekday)
+    if records:
+      return tuple(records[0:self.recordsize])
+    return None
+
+  # Iterate over all configurations with at least one solution.
+  def configurations(self):
+    for key in range(0, self.slots):
+      first, last = self.range(key)
+      if last > first:
+        yield Placements.configurationfromkey(key)
+
+# Write solutions, a dictionary from (month, day, weekday) to lists of placement index
+# tuples, to a pack. The file is replaced atomically.
+def writepack(filename, solutions):
+  index = []
+  records = bytearray()
+  count = 0
+  for key in range(0, Placements.CONFIGURATIONS):
+    index.append(count)
+    for solution in solutions.get(Placements.configurationfromkey(key), []):
+      records += bytes(solution)
+      count += 1
+  index.append(count)
+
+  tmpname = filename + '.tmp'
+  with open(tmpname, 'wb') as f:
+    f.write(header.pack(MAGIC, VERSION, len(Placements.partnames), len(Placements.partnames),
+      Placements.CONFIGURATIONS, count, Placements.fingerprint))
+    f.write(struct.pack(f'<{len(index)}I', *index))
+    f.write(records)
+    f.flush()
+    os.fsync(f.fileno())
+  os.replace(tmpname, filename)
+
+  return count
+
+# Read all the solutions from a pack into a dictionary like writepack() takes.
+def readpack(filename):
+  solutions = {}
+  with SolutionPack(filename) as pack:
+    for configuration in pack.configurations():
+      solutions[configuration] = pack.solutions(*configuration)
+  return solutions
+
+# The journal is the append-only companion of a pack. Solvers append solutions to it as
+# they find them, the pack command merges it in. After a header with the placement table
+# fingerprint each record is the configuration key followed by the placement indices.
+JOURNALMAGIC = b'CPSJ'
+
+journalheader = struct.Struct('<4sHB8s')
+journalkey = struct.Struct('<H')
+
+# Open a journal for appending, creating it if needed. A new journal is written with its
+# header under a temporary name and linked into place, which fails if the file exists. So
+# when several solvers start on a fresh journal together only one header gets written.
+def openjournal(filename):
+  if not os.path.exists(filename):
+    tmpname = f'{filename}.{os.getpid()}.tmp'
+    with open(tmpname, 'wb') as f:
+      f.write(journalheader.pack(JOURNALMAGIC, VERSION, len(Placements.partnames), Placements.fingerprint))
+    try:
+      os.link(tmpname, filename)
+    except FileExistsError:
+      pass
+    finally:
+      os.remove(tmpname)
+  return open(filename, 'ab')
+
+def journalrecord(configuration, solution):
+  return journalkey.pack(Placements.configurationkey(*configuration)) + bytes(solution)
+
+# The configurations with solutions in a journal, read from offset on. Returns them with
+# the offset to read on from next time, so checking again only reads what was appended.
+def journalconfigurations(filename, offset = 0):
+  try:
+    with open(filename, 'rb') as f:
+      if offset == 0:
+        header = f.read(journalheader.size)
+        if len(header) < journalheader.size:
+          return set(), 0
+        magic, version, parts, fingerprint = journalheader.unpack(header)
+        if (magic != JOURNALMAGIC) or (version != VERSION) or (fingerprint != Placements.fingerprint):
+          raise ValueError(f'{filename} is not a solution journal for this placement table')
+        offset = journalheader.size
+      f.seek(offset)
+      data = f.read()
+  except FileNotFoundError:
+    return set(), offset
+
+  recordsize = journalkey.size + len(Placements.partnames)
+  count = len(data) // recordsize
+  keys = {journalkey.unpack_from(data, n * recordsize)[0] for n in range(0, count)}
+  return {Placements.configurationfromkey(key) for key in keys}, offset + count * recordsize
+
+# Add a solution to the list of its configuration unless it is there already. seen keeps
+# the solutions of each list as a set, so adding millions of them stays linear.
+def addsolution(solutions, seen, configuration, solution):
+  if configuration not in seen:
+    seen[configuration] = set(solutions[configuration])
+  if solution not in seen[configuration]:
+    seen[configuration].add(solution)
+    solutions[configuration].append(solution)
+
+# Read a journal into a dictionary like writepack() takes. A record cut short by a crash
+# while appending is ignored.
+def readjournal(filename, solutions = None):
+  if solutions is None:
+    solutions = collections.defaultdict(list)
+
+  with open(filename, 'rb') as f:
+    data = f.read()
+
+  magic, version, parts, fingerprint = journalheader.unpack_from(data, 0)
+  if (magic != JOURNALMAGIC) or (version != VERSION):
+    raise ValueError(f'{filename} is not a solution journal')
+  if (parts != len(Placements.partnames)) or (fingerprint != Placements.fingerprint):
+    raise ValueError(f'{filename} was written for a different placement table')
+
+  seen = {}
+  recordsize = journalkey.size + parts
+  for offset in range(journalheader.size, len(data) - recordsize + 1, recordsize):
+    configuration = Placements.configurationfromkey(journalkey.unpack_from(data, offset)[0])
+    solution = tuple(data[offset + journalkey.size:offset + recordsize])
+    addsolution(solutions, seen, configuration, solution)
+
+  return solutions
+
+# Read a folder of JSON solutions as written by the solvers. The configuration is
+# taken from the data or, for the legacy format, from the filename. Solutions that
+# do not describe a valid board for their configuration are reported and skipped.
+def readjsoncatalog(folder):
+  solutions = collections.defaultdict(list)
+  seen = {}
+  with os.scandir(folder) as entries:
+    for entry in sorted(entries, key = lambda entry: entry.name):
+      if not (entry.name.endswith('.json') and entry.name[0:6].isdigit()):
+        continue
+
+      with open(entry.path) as f:
+        jsondata = json.load(f)
+
+      if isinstance(jsondata, dict) and 'configuration' in jsondata:
+        c = jsondata['configuration']
+        configuration = (c['month'], c['day'], c['weekday'])
+      elif entry.name[0:6].isdigit():
+        configuration = (int(entry.name[0:2]), int(entry.name[2:4]), int(entry.name[4:6]))
+      else:
+        print(f'  {entry.name}: No configuration, skipped')
+        continue
+
+      solution = Placements.solutionfromjson(jsondata)
+      if (solution is None) or (Placements.configurationofsolution(solution) != configuration):
+        print(f'  {entry.name}: Not a valid solution, skipped')
+        continue
+
+      addsolution(solutions, seen, configuration, solution)
+
+  return solutions
+
+# Write solutions to a folder of JSON files in the format of Solver3.py. The first solution
+# for each configuration goes to the usual catalog name, any further ones are numbered.
+def writejsoncatalog(solutions, folder):
+  os.makedirs(folder, exist_ok = True)
+  count = 0
+  for configuration, configurationsolutions in solutions.items():
+    for n, solution in enumerate(configurationsolutions):
+      filename = Placements.catalogname(*configuration) + ('' if n == 0 else f'.{n+1}') + '.json'
+      with open(os.path.join(folder, filename), 'w') as f:
+        json.dump(Placements.jsonfromsolution(solution, configuration), f, sort_keys = True, indent = 4)
+      count += 1
+  return count
+
+# Rewrite the JSON files in the legacy format of Solver2.py, which are just the list of
+# parts, as objects with the configuration taken from the file name. Returns the number
+# of files changed.
+def migratejsoncatalog(folder):
+  count = 0
+  with os.scandir(folder) as entries:
+    for entry in sorted(entries, key = lambda entry: entry.name):
+      if not (entry.name.endswith('.json') and entry.name[0:6].isdigit()):
+        continue
+
+      with open(entry.path) as f:
+        jsondata = json.load(f)
+
+      if not isinstance(jsondata, list):
+        continue
+
+      month = int(entry.name[0:2])
+      day = int(entry.name[2:4])
+      weekday = int(entry.name[4:6])
+
+      jsondata = {
+        'configuration': {
+          'month': month,
+          'monthlabel': Placements.monthlabels[month-1],
+          'day': day,
+          'weekday': weekday,
+          'weekdaylabel': Placements.weekdaylabels[weekday]
+        },
+        'parts': jsondata
+      }
+
+      with open(entry.path + '.tmp', 'w') as f:
+        json.dump(jsondata, f, sort_keys = False, indent = 4)
+      os.replace(entry.path + '.tmp', entry.path)
+      count += 1
+
+  return count
+
+def parse_commandline():
+  parser = argparse.ArgumentParser(
+    description = 'Convert Calendar-puzzle solutions between JSON files and a solution pack.'
+  )
+  subparsers = parser.add_subparsers(dest = 'command', required = True)
+
+  p = subparsers.add_parser('pack', help = 'Pack a folder of JSON solutions')
+  p.add_argument('folder')
+  p.add_argument('packfile')
+  p.add_argument('-j', '--journal',
+    action = 'append',
+    default = [],
+    help = 'Also merge in the solutions from a journal, may be given more than once',
+    dest = 'journals',
+    metavar = 'file'
+  )
+
+  p = subparsers.add_parser('unpack', help = 'Write the solutions in a pack as JSON files')
+  p.add_argument('packfile')
+  p.add_argument('folder')
+
+  p = subparsers.add_parser('info', help = 'Show statistics for a pack')
+  p.add_argument('packfile')
+
+  p = subparsers.add_parser('migrate', help = 'Add the configuration to JSON files in the legacy format of Solver2.py')
+  p.add_argument('folder')
+
+  return parser.parse_args()
+
+def main():
+  options = parse_commandline()
+
+  if options.command == 'pack':
+    solutions = readjsoncatalog(options.folder)
+    for journal in options.journals:
+      readjournal(journal, solutions)
+    count = writepack(options.packfile, solutions)
+    print(f'Packed {count} solutions for {len(solutions)} configurations into {options.packfile} ({os.path.getsize(options.packfile)} bytes).')
+
+  elif options.command == 'unpack':
+    count = writejsoncatalog(readpack(options.packfile), options.folder)
+    print(f'Wrote {count} solutions to {options.folder}.')
+
+  elif options.command == 'info':
+    with SolutionPack(options.packfile) as pack:
+      configurations = list(pack.configurations())
+      print(f'{options.packfile}: {len(pack)} solutions for {len(configurations)} configurations, {pack.recordsize} bytes per solution.')
+
+  elif options.command == 'migrate':
+    count = migratejsoncatalog(options.folder)
+    print(f'Migrated {count} solutions in {options.folder}.')
+
+if __name__ == '__main__':
+  main()
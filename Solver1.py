@@ -22,9 +22,19 @@ import json
 import calendar
 import portalocker
 import platform
+import collections
+import concurrent.futures
+import numpy
 
+import Placements
+import Orientations
+import SolutionIndex
+import Scheduler
+
+import shapely
 from shapely.geometry.polygon import Polygon
 from shapely.geometry.point import Point
+from shapely.geometry import mapping
 from shapely.affinity import translate
 from shapely.affinity import rotate
 from shapely.affinity import scale
@@ -37,6 +47,7 @@ from matplotlib import pyplot
 # Global variables
 starttime = datetime.datetime.now().replace(microsecond=0)
 options = None
+solutionindex = SolutionIndex.SolutionIndex()
 finalpositions = 0
 solutions = 0
 
@@ -45,8 +56,8 @@ solutions = 0
 # the operation of the solver and a final_polygon method that returns the polygon in the position and
 # attitude specified with the separate members.
 #
-# When a Part is constructed __init__ checks the geometry to see in which of the 90-degree rotations it
-# is distinct. This list is also kept with the Part so we can optimize the placement during solving to
+# The distinct orientations of the part as (ismirrored, rotation) pairs come from Orientations.py for
+# the whole catalog and are kept with the Part so we can optimize the placement during solving to
 # eliminate duplicates.
 class Part:
   
@@ -61,14 +72,10 @@ class Part:
     self.ismirrored = False
     self.candidatepositions = []
 
-    # build a list of distinct rotations
-    self.rotations = [0]
-    rotation_polys = [self.polygon]
-    for rotation in range(90, 360, 90):
-      test = rotate(self.polygon, rotation)
-      if not any(test.equals(poly) for poly in rotation_polys):
-        self.rotations.append(rotation)
-        rotation_polys.append(test)
+    self.orientations = [(False, 0)]
+
+    # The polygon in each of its orientations, by (ismirrored, rotation).
+    self.orientedpolygons = {}
 
   def __copy__(self):
     clone = Part(self.name, self.polygon, self.color, self.mirror)
@@ -77,19 +84,36 @@ class Part:
     clone.rotation = self.rotation
     clone.ismirrored = self.ismirrored
     clone.candidatepositions = self.candidatepositions.copy()
+    clone.orientations = self.orientations
+    clone.orientedpolygons = self.orientedpolygons
 
     return clone
 
-  def finalpolygon(self):
-    p = self.polygon
-
-    if self.ismirrored:
-      p = scale(p, -1)
-    p = rotate(p, self.rotation)
-    p = translate(p, self.xoffset, self.yoffset)
+  # Geometry is never modified, so copies of the board can share the part and its
+  # orientation cache instead of copying all the polygons.
+  def __deepcopy__(self, memo):
+    return copy.copy(self)
+
+  # The polygon mirrored and rotated in place, cached per orientation.
+  def orientedpolygon(self, ismirrored, rotation):
+    key = (ismirrored, rotation)
+    p = self.orientedpolygons.get(key)
+    if p is None:
+      p = self.polygon
+      if ismirrored:
+        p = scale(p, -1)
+      p = rotate(p, rotation)
+      self.orientedpolygons[key] = p
 
     return p
 
+  # The unit cells the polygon covers, for working out its distinct orientations.
+  def cells(self):
+    return Placements.rasterize([(round(x), round(y)) for x, y in self.polygon.exterior.coords])
+
+  def finalpolygon(self):
+    return translate(self.orientedpolygon(self.ismirrored, self.rotation), self.xoffset, self.yoffset)
+
 monthlabels = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
 weekdaylabels = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
 
@@ -97,7 +121,10 @@ weekdaylabels = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
 # The target geometry is created according to the selections for month, day and day of week
 # that are to be kept free in the .
 class CalendarConfiguration:
-  
+
+  # The overall shape of the cutout
+  cutout = Polygon([ (0, 0), (4, 0), (4, -1), (7, -1), (7, 5), (6, 5), (6, 7), (0, 7), (0, 0)])
+
   def __init__(self, weekday, day, month):
     self.weekday = weekday
     self.day = day
@@ -111,9 +138,6 @@ class CalendarConfiguration:
   def create_target(self):
     self.name = monthlabels[self.month-1] + '-' + str(self.day) + '-' + weekdaylabels[self.weekday]
 
-    # The overall shape of the cutout
-    outer = Polygon([ (0, 0), (4, 0), (4, -1), (7, -1), (7, 5), (6, 5), (6, 7), (0, 7), (0, 0)])
-
     # Which square to leave free for the month
     monthx = (self.month-1) % 6      # 0..5
     monthy = 6- (self.month-1) // 6  # 6 or 5
@@ -145,7 +169,7 @@ class CalendarConfiguration:
   
     # Create the over all shape by taking the cutout and removing
     # the three squares.
-    self.target = outer.difference(monthsquare).difference(daysquare).difference(weekdaysquare)
+    self.target = self.cutout.difference(monthsquare).difference(daysquare).difference(weekdaysquare)
     
 # BoardState is the main object class for the solver. It carries a reference to the puzzle being solved
 # (name, list of parts and the complete geometry of the target). It has a list of parts still available,
@@ -157,7 +181,6 @@ class BoardState:
 
   framenr = 0
   logger = logging.getLogger('Board')
-  extents = Point()
 
   def __init__(self, calendarconfiguration, parts_placed, parts_available):
     self.calendarconfiguration = calendarconfiguration
@@ -181,11 +204,11 @@ class BoardState:
     self.logger.info('Parts available in descending order of area:')
     totalarea = 0
     for part in BoardState.partscatalog:
-      self.logger.info('{name}: area={area}, mirror={mirror}, distinct rotations={rotations}'.format(
+      self.logger.info('{name}: area={area}, mirror={mirror}, distinct orientations={orientations}'.format(
           name=part.name, 
           mirror=('Yes' if part.mirror else 'No'),
           area=part.polygon.area, 
-          rotations=part.rotations
+          orientations=part.orientations
         ))
       totalarea += part.polygon.area
     self.logger.info('Total area of parts={totalarea}'.format(totalarea=totalarea))
@@ -245,61 +268,36 @@ class BoardState:
 
   # Plot the current board as a matplotlib-image and save to disk as an image. Images
   # are named with a framenumber, optionally followed by a caption denoting wether this
-  # is a solution, a dead-end or an intermediate step. The remaining parameters can be
-  # used to further specify which type of a frame is being generated.
-  def plot(self, caption = ''):
+  # is a solution, a dead-end or an intermediate step. If copyname is given the image
+  # and the json file are also copied to that name.
+  #
+  # The image is not drawn here. The board is captured as a snapshot of plain outlines
+  # and drawn by the frame pool in the background, so the search does not wait for
+  # matplotlib.
+  def plot(self, caption = '', copyname = None):
     
     global options
 
-    fig = pyplot.figure(1, figsize=(5,5), dpi=90)
-    ax = fig.add_subplot(1,1,1) # rows, columns, index
-    
-    # No axes ticks
-    ax.yaxis.set_major_locator(pyplot.NullLocator())
-    ax.xaxis.set_major_formatter(pyplot.NullFormatter())
-    ax.yaxis.set_minor_locator(pyplot.NullLocator())
-    ax.xaxis.set_minor_formatter(pyplot.NullFormatter())
-
-    xoffset = 0
-    yoffset = 0
+    basename = '{n:05d}'.format(n=BoardState.framenr)
+    if options.decorateframes and caption:
+      basename += '.' + caption
     
-    # Plot the target polygon
+    figname = options.runfolder + '/' + basename + '.png'
+
+    snapshot = {
+      'figname': figname,
+      'copyname': copyname + '.png' if copyname else None,
+      'target': None,
+      'parts': [(mapping(part.finalpolygon()), part.color) for part in self.parts_placed]
+    }
     if (self.remaining_target.area > 0) and (
       (
           self.remaining_target.geom_type == 'MultiPolygon') 
           or (self.remaining_target.geom_type == 'Polygon')
       ):
-      patch = PolygonPatch(self.remaining_target, facecolor='#cccccc')
-      ax.add_patch(patch)
-      BoardState.extents = BoardState.extents.union(self.remaining_target)
+      snapshot['target'] = mapping(self.remaining_target)
 
-    # Plot the placed parts on top of the target
-    for part in self.parts_placed:
-      polygon = part.finalpolygon()
-      BoardState.extents = BoardState.extents.union(polygon)
-      patch = PolygonPatch(polygon, facecolor=part.color)
-      ax.add_patch(patch)
-  
-    # Update the overall bounds carried over from frame to frame. We want them
-    # to nicely align for montage.
-    bounds = BoardState.extents.bounds
-
-    ax.set_title('Calendar')
-    xrange = [bounds[0]-1, bounds[2]+1]
-    yrange = [bounds[1]-1, bounds[3]+1]
-    ax.set_xlim(*xrange)
-    ax.set_ylim(*yrange)
-    ax.set_aspect(1)
-    
-    basename = '{n:05d}'.format(n=BoardState.framenr)
-    if options.decorateframes and caption:
-      basename += '.' + caption
-    basename += '.png'
-    
-    figname = options.runfolder + '/' + basename 
-    fig.savefig(figname)
-
-    pyplot.close(fig)
+    queueframe(snapshot)
     
     # Save solution as json so we have the option of plotting it in a different way.
     jsonparts = []
@@ -327,11 +325,89 @@ class BoardState:
     jsonname = os.path.splitext(figname)[0] + '.json'
     with open(jsonname, 'w') as f:
       json.dump(jsondata, f, sort_keys=True, indent=4)
+    if copyname:
+      shutil.copyfile(jsonname, copyname + '.json')
 
     BoardState.framenr += 1
 
     return basename
 
+# Look up the distinct orientations of the parts once for the whole catalog.
+orientationtable = Orientations.table({part.name: (part.cells(), part.mirror) for part in BoardState.partscatalog}, 'shapely')
+for part in BoardState.partscatalog:
+  part.orientations = orientationtable[part.name]
+
+# Frames are drawn by a pool of background processes. Each process sets up one figure
+# with the extents of the whole cutout so all frames align for montage, and reuses it
+# for every frame it draws. The queue of frames is bounded so a fast search cannot pile
+# up snapshots without end.
+framepool = None
+framesqueued = collections.deque()
+frameaxes = None
+
+def initframeworker(extents):
+  global frameaxes
+
+  fig = pyplot.figure(1, figsize=(5,5), dpi=90)
+  ax = fig.add_subplot(1,1,1) # rows, columns, index
+    
+  # No axes ticks
+  ax.yaxis.set_major_locator(pyplot.NullLocator())
+  ax.xaxis.set_major_formatter(pyplot.NullFormatter())
+  ax.yaxis.set_minor_locator(pyplot.NullLocator())
+  ax.xaxis.set_minor_formatter(pyplot.NullFormatter())
+
+  ax.set_title('Calendar')
+  ax.set_xlim(extents[0]-1, extents[2]+1)
+  ax.set_ylim(extents[1]-1, extents[3]+1)
+  ax.set_aspect(1)
+
+  frameaxes = ax
+
+# Draw one snapshot taken by BoardState.plot(). Runs in a frame pool process.
+def drawframe(snapshot):
+  ax = frameaxes
+
+  for patch in list(ax.patches):
+    patch.remove()
+
+  # Plot the target polygon and the placed parts on top of it
+  if snapshot['target']:
+    ax.add_patch(PolygonPatch(snapshot['target'], facecolor='#cccccc'))
+  for outline, color in snapshot['parts']:
+    ax.add_patch(PolygonPatch(outline, facecolor=color))
+
+  ax.figure.savefig(snapshot['figname'])
+
+  if snapshot['copyname']:
+    shutil.copyfile(snapshot['figname'], snapshot['copyname'])
+
+def queueframe(snapshot):
+  global framepool
+
+  # Without frame workers draw right here.
+  if options.plotworkers == 0:
+    if frameaxes is None:
+      initframeworker(CalendarConfiguration.cutout.bounds)
+    drawframe(snapshot)
+    return
+
+  if framepool is None:
+    framepool = concurrent.futures.ProcessPoolExecutor(
+      max_workers = options.plotworkers,
+      initializer = initframeworker,
+      initargs = (CalendarConfiguration.cutout.bounds,))
+
+  while len(framesqueued) >= options.plotworkers * 16:
+    framesqueued.popleft().result()
+
+  framesqueued.append(framepool.submit(drawframe, snapshot))
+
+# Wait for all frames queued so far to be written.
+def flushframes():
+  while framesqueued:
+    framesqueued.popleft().result()
+
 # Quick check for overlapping boundary boxes before going in deep.
 def overlap(bounds1, bounds2):
   minx1 = bounds1[0]
@@ -361,8 +437,8 @@ def mayfit(target, part):
     return False
   elif (target.area == part.polygon.area):
     targetbounds = target.bounds
-    for rotation in part.rotations:
-      poly = rotate(part.polygon, rotation)
+    for ismirrored, rotation in part.orientations:
+      poly = part.orientedpolygon(ismirrored, rotation)
       partbounds = poly.bounds
       if (partbounds[2]-partbounds[0] == targetbounds[2]-targetbounds[0]) and (partbounds[3]-partbounds[1] == targetbounds[3]-targetbounds[1]):
         # same bounding box size. Move part over target and check
@@ -382,6 +458,7 @@ def solve(board):
   global finalpositions
   global solutions
   global options
+  global solutionindex
   
   logger = logging.getLogger('solve')
 
@@ -396,6 +473,13 @@ def solve(board):
 
     solutions += 1
 
+    # Make the solution known to the index so solvefordate() can answer with it.
+    configuration = (board.calendarconfiguration.month, board.calendarconfiguration.day, board.calendarconfiguration.weekday)
+    jsonparts = [{'name': part.name, 'xoffset': part.xoffset, 'yoffset': part.yoffset, 'rotation': part.rotation, 'ismirrored': part.ismirrored} for part in board.parts_placed]
+    solution = Placements.solutionfromparts(jsonparts, Placements.shapelycells)
+    if solution:
+      solutionindex.add(configuration, solution)
+
     #if options.playfanfare:
     #  wavfilename = os.path.dirname(os.path.realpath(__file__)) + '/fanfare.wav'
     #  if os.path.isfile(wavfilename):
@@ -403,15 +487,9 @@ def solve(board):
     #    wav.play()
 
     if options.plotsolutions:
-      figname = board.plot('solution')
-      figname = os.path.splitext(figname)[0]
-      filenames = glob.glob(options.runfolder + '/' + figname + '.*')
-      
       # Copy all solution files out under a name for convenient lookup.
       catalogname = f'{board.calendarconfiguration.month:02d}{board.calendarconfiguration.day:02d}{board.calendarconfiguration.weekday:02d}-{monthlabels[board.calendarconfiguration.month-1]}-{board.calendarconfiguration.day:02d}-{weekdaylabels[board.calendarconfiguration.weekday]}'
-      for filename in filenames:
-        destname = options.runfolder + '/../catalog/' + catalogname + os.path.splitext(filename)[1]
-        shutil.copyfile(filename, destname)
+      board.plot('solution', options.catalogfolder + '/' + catalogname)
       
   else:
     # There are parts left to place, we need to recurse further down.
@@ -478,65 +556,60 @@ def solve(board):
       # part in steps over the bounds of the target and checking the conditions.
       # The scanning happens in steps and is repeated for each possible 90 degree
       # rotation.
+      #
+      # The remaining target is prepared once so the containment tests for all
+      # the positions run against the same prepared geometry.
+      shapely.prepare(board.remaining_target)
       targetbounds = board.remaining_target.bounds
       targetwidth = targetbounds[2]-targetbounds[0]
       targetheight = targetbounds[3]-targetbounds[1]
 
       nextpart.candidatepositions = []
 
-      mirror = [False]
-      if nextpart.mirror:
-        mirror.append(True)
+      for m, rotation in nextpart.orientations:
+        # The (possibly mirrored) part rotated in place, from the per-part cache.
+        poly = nextpart.orientedpolygon(m, rotation)
 
-      for m in mirror:  
-        if m:
-          np = scale(nextpart.polygon, -1)
-        else:
-          np = nextpart.polygon
-        
-        for rotation in nextpart.rotations:
-          # Clone (possibly mirrored) part in default position 
-          part = copy.copy(nextpart)
+        # Figure out the part bounds in that orientation. This will not change
+        # during the scan.
+        partbounds = poly.bounds
+        partwidth = partbounds[2]-partbounds[0]
+        partheight = partbounds[3]-partbounds[1]
+        if (partwidth > targetwidth) or (partheight > targetheight):
+          continue
 
-          # Rotate in place
-          poly = rotate(np, rotation)
-      
-          # Figure out the part bounds in that orientation. This will not change
-          # during the scan.
-          partbounds = poly.bounds
-          partwidth = partbounds[2]-partbounds[0]
-          partheight = partbounds[3]-partbounds[1]
-          
-          # Initialize offsets so that the part is placed at the bottom-left
-          # corner of the target from its position agnostic catalog-state.
-          initialxoffset = targetbounds[0]-partbounds[0]
-          initialyoffset = targetbounds[1]-partbounds[1]
-          
-          # Scan over the width and height of the target bounds.
-          xoffset = 0
-          while xoffset + partwidth <= targetwidth:
-            yoffset = 0
-            
-            while yoffset + partheight <= targetheight:          
-              part.ismirrored = m
-              part.rotation = rotation
-              part.xoffset = initialxoffset + xoffset
-              part.yoffset = initialyoffset + yoffset
-
-              # What about this position? Generate the polygon first.
-              testpoly = part.finalpolygon()
-
-              # To be a valid position the candidate part has to be completely 
-              # inside the remaining target geometry
-              #
-              # We have removed all the area covered by parts already placed
-              # from the target. So we do not need to check for overlaps with
-              # placed parts, this is already covered.          
-              if board.remaining_target.contains(testpoly):
-                nextpart.candidatepositions.append(copy.copy(part))
-
-              yoffset = yoffset + 1
-            xoffset = xoffset + 1
+        # Initialize offsets so that the part is placed at the bottom-left
+        # corner of the target from its position agnostic catalog-state.
+        initialxoffset = targetbounds[0]-partbounds[0]
+        initialyoffset = targetbounds[1]-partbounds[1]
+
+        # All the offsets of the scan over the width and height of the target
+        # bounds, x in the outer and y in the inner loop like the scan always
+        # went.
+        xoffsets, yoffsets = numpy.meshgrid(
+          initialxoffset + numpy.arange(math.floor(targetwidth - partwidth) + 1),
+          initialyoffset + numpy.arange(math.floor(targetheight - partheight) + 1),
+          indexing='ij')
+        offsets = numpy.stack([xoffsets.ravel(), yoffsets.ravel()], axis=1)
+
+        # Build the polygons for all the offsets at once by moving the outline
+        # of the part. Parts have no holes, so the exterior is all there is.
+        outline = shapely.get_coordinates(poly.exterior)
+        testpolys = shapely.polygons(outline[numpy.newaxis, :, :] + offsets[:, numpy.newaxis, :])
+
+        # To be a valid position the candidate part has to be completely
+        # inside the remaining target geometry
+        #
+        # We have removed all the area covered by parts already placed
+        # from the target. So we do not need to check for overlaps with
+        # placed parts, this is already covered.
+        for xoffset, yoffset in offsets[shapely.contains(board.remaining_target, testpolys)]:
+          part = copy.copy(nextpart)
+          part.ismirrored = m
+          part.rotation = rotation
+          part.xoffset = float(xoffset)
+          part.yoffset = float(yoffset)
+          nextpart.candidatepositions.append(part)
 
       # If there are no candidate positions for a part, we have hit a dead end.
       if len(nextpart.candidatepositions) == 0:
@@ -608,12 +681,22 @@ def solve(board):
           
           i += 1
           
-# Controller for preparing a puzzle and starting the solver.
+# Controller for preparing a puzzle and starting the solver. Dates with a known solution
+# are answered from the solution index, only missing configurations are solved.
 def solvefordate(date):
 
+  global solutionindex
+
   logger = logging.getLogger('solvefordate')
   logger.info(f'solvefordate({date})')
 
+  configuration, known = solutionindex.lookup(date)
+  if known:
+    logger.info(f'solvefordate({date}) - {Placements.catalogname(*configuration)} answered from solution index')
+    for row in Placements.boardrows(known[0], configuration):
+      logger.info(f'  {row}')
+    return known[0]
+
   # Extract relevant parts from the date. 
   weekday = date.weekday() # 0 = Monday matches weekdaylabels
   day = date.day # 1..31
@@ -621,6 +704,9 @@ def solvefordate(date):
 
   solvefor(month, day, weekday)
 
+  # The solution found, if any, was added to the index by solve().
+  return solutionindex.solution(date)
+
 def solvefor(month, day, weekday):
 
   global finalpositions
@@ -652,6 +738,31 @@ def solvefor(month, day, weekday):
   duration = end - start
   logger.info(f'solvefor({month}, {day}, {weekday} \"{weekdaylabels[weekday]}\") - finished after {duration}')
   
+# Solve one configuration handed out by Scheduler.py.
+def solvescheduled(configuration, date):
+  try:
+    return Scheduler.solvelocked(solvefor, options.catalogfolder, configuration, date)
+  finally:
+    # Worker processes are not told when the scheduler is done, so have the frames of
+    # this configuration written before reporting back.
+    flushframes()
+
+# Set up a worker process of the scheduler.
+def initworker(workeroptions):
+  global options
+  global solutionindex
+
+  # Each worker numbers its frames from 0, so they go to a folder of their own.
+  options = copy.copy(workeroptions)
+  options.runfolder = options.runfolder + f'/worker-{os.getpid()}'
+  os.makedirs(options.runfolder, exist_ok = True)
+  random.seed(options.seed)
+
+  if not logging.getLogger().handlers:
+    setup_logging()
+
+  solutionindex = SolutionIndex.loadindex(options.solutionpack)
+
 # Conversion function for argparse booleans
 def str2bool(v):
   if v.lower() in ('yes', 'true', 't', 'y', '1'):
@@ -661,6 +772,13 @@ def str2bool(v):
   else:
     raise argparse.ArgumentTypeError('Boolean value expected.')
 
+# Conversion function for argparse counts that may be 0 but not negative.
+def nonnegativeint(v):
+  value = int(v)
+  if value < 0:
+    raise argparse.ArgumentTypeError('Count of 0 or more expected.')
+  return value
+
 # Set up argparse and get the command line options.
 def parse_commandline():
 
@@ -712,6 +830,14 @@ def parse_commandline():
     metavar = 'seed'
   )
 
+  parser.add_argument('-sp', '--solution-pack',
+    action = 'store',
+    default = '',
+    help = 'Solution pack to answer known dates from (default: catalog.pack next to the catalog folder)',
+    dest = 'solutionpack',
+    metavar = 'file'
+  )
+
   parser.add_argument('-pf', '--play-fanfare',
     action = 'store',
     default = True,
@@ -730,12 +856,43 @@ def parse_commandline():
     metavar = 'flag'
   )
 
+  parser.add_argument('-pw', '--plot-workers',
+    action = 'store',
+    default = 2,
+    type = nonnegativeint,
+    help = 'Number of background processes drawing frames, 0 to draw them in the solver (default: %(default)s)',
+    dest = 'plotworkers',
+    metavar = 'count'
+  )
+
+  parser.add_argument('-j', '--jobs',
+    action = 'store',
+    default = 1,
+    type = int,
+    help = 'Number of processes solving configurations, 0 for one per core (default: %(default)s)',
+    dest = 'jobs',
+    metavar = 'count'
+  )
+
+  parser.add_argument('-o', '--order',
+    action = 'store',
+    default = 'need',
+    choices = Scheduler.orders,
+    help = 'Solve the configurations needed soonest or the hardest first (default: %(default)s)',
+    dest = 'order'
+  )
+
   options = parser.parse_args()
   options.log_level_int = getattr(logging, options.log_level, logging.INFO)
 
   if not options.runfolder:
     options.runfolder = os.path.dirname(os.path.realpath(__file__)) + '/' + time.strftime('%Y-%m-%d-%H-%M-%S', time.localtime())
 
+  options.catalogfolder = options.runfolder + '/../catalog'
+
+  if not options.solutionpack:
+    options.solutionpack = options.runfolder + '/../catalog.pack'
+
 # Set up a logger each for a file in the output folder and the console.      
 def setup_logging():
   
@@ -763,6 +920,7 @@ def setup_logging():
 def main():
   
   global options
+  global solutionindex
   
   parse_commandline()
   setup_logging()
@@ -778,73 +936,26 @@ def main():
   logger.info('Random seed in use: {0}.'.format(options.seed))
   random.seed(options.seed)
 
+  # Known solutions to answer from before solving anything.
+  solutionindex = SolutionIndex.loadindex(options.solutionpack)
+  logger.info(f'{len(solutionindex)} configurations known from {options.solutionpack}.')
+
   #date = datetime.date.today() + datetime.timedelta(days=1)
   #solvefordate(date)
   #quit()
 
-  # I have determined that the years 2022 to 2048 (inclusive) use all possible
-  # configurations of month, day and weekday. Solve for each of them:
-  for year in range(2022, 2049):    
-    # Just regular:
-    months = range(1,13)
-    days = range(1,32)
-
-    # Starting on a certain date:
-    startmonth = 1
-    startday = 1
-    months = list(range(startmonth,13)) + list(range(1,startmonth))
-    days = list(range(startday,32)) + list(range(1,startday))
-    
-    for month in months:
-      for day in days:
+  # Every date from 2022 on maps to one of the configurations of month, day and weekday.
+  # Solve each of them once, in the order the scheduler hands them out.
+  Scheduler.solveall(options.catalogfolder, solvescheduled,
+    order = options.order,
+    jobs = options.jobs,
+    known = solutionindex.configurations(),
+    initializer = initworker,
+    initargs = (options,))
 
-        # Skip invalid dates:
-        if (month == 2) and (day > (29 if calendar.isleap(year) else 28)):
-          continue
-        elif (month in [4,6,9,11]) and (day > 30):
-          continue
+  # Wait for the frames still being drawn.
+  flushframes()
 
-        weekday = datetime.datetime(year, month, day).weekday() # 0=Mon, 1=Tue, 2=Wed, 3=Thu, 4=Fri, 5=Sat, 6=Sun
-            
-        # Attempt to clean up stale lock files
-        lockfiles = glob.glob(options.runfolder + '/../catalog/*.lck')
-        for lockfile in lockfiles:
-            try:
-              os.remove(lockfile)
-            except:
-              pass # Most propably still locked
-
-        catalogname = f'{month:02d}{day:02d}{weekday:02d}-{monthlabels[month-1]}-{day:02d}-{weekdaylabels[weekday]}'
-      
-        # Already solved?
-        if glob.glob(options.runfolder + '/../catalog/' + catalogname + '.json'): # and glob.glob(options.runfolder + '/../catalog/' + catalogname + '.png'):
-          logger.info(f'Already done {catalogname}')
-        else:
-          # No solution exists yet. Create a lock file so other processes know we are working on this.
-          lockfilename = options.runfolder + '/../catalog/' + catalogname + '.lck'
-          try:
-            with portalocker.Lock(lockfilename, 'wt', timeout = 1) as lockfile:              
-              lockfile.write(f'PID {os.getpid()}, started {datetime.datetime.now()}')
-              lockfile.flush()
-              os.fsync(lockfile.fileno())
-
-              # In Windows rename the shell title.
-              if platform.system() == 'Windows':
-                os.system(f'cmd.exe /C title {year:04d}-{month:02d}-{day:02d}')
-                              
-              logger.info(f'Now solving for {catalogname}')        
-              os.makedirs(options.runfolder, exist_ok = True)                            
-              solvefor(month, day, weekday)
-        
-          except portalocker.exceptions.LockException:
-              logger.info(f'{catalogname} locked, being solved by concurrent process')
-
-          finally:
-            try:
-              os.remove(lockfilename)
-            except:
-              pass
-    
   endtime = datetime.datetime.now().replace(microsecond=0)
   runtime = (endtime-starttime)
   logger.info('Finished. Total runtime: {runtime}'.format(runtime=runtime))
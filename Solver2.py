@@ -14,12 +14,16 @@ import glob
 import sys
 import time
 import copy
+import functools
 import datetime
 import argparse 
 import math
 import json
 import calendar
 
+import Placements
+import Orientations
+
 from shapely.geometry.polygon import Polygon
 from shapely.geometry.point import Point
 from shapely.affinity import translate
@@ -35,13 +39,39 @@ from matplotlib import pyplot
 starttime = datetime.datetime.now().replace(microsecond=0)
 options = None
 
+# Search state that goes into a checkpoint: the branch taken at each depth of the
+# recursion, some counters, the new configurations found so far and the number of tilings
+# found for each configuration.
+position = []
+counters = {
+  'tilings': 0,
+  'new': 0,
+  'duplicate': 0,
+  'invalid': 0,
+  'deadends': 0,
+  'pruned': 0
+}
+found = []
+solutioncounts = {}
+partsorder = []
+resumeposition = None
+lastcheckpoint = time.monotonic()
+
+# Board masks of the configurations that have no solution in the catalog yet, see
+# Placements.configurationmask().
+missingmasks = set()
+
+# Catalog names of the configurations that already have a solution in the output folder.
+# Seeded from the folder at startup so duplicates do not cost a look at the disk.
+known = set()
+
 # Part encapsulates a single part in the puzzle. It has geometry as a shapely.geometry.polygon which is
 # never transformed after creation. It has separate x/y-offset and rotation members which are set during
 # the operation of the solver and a final_polygon method that returns the polygon in the position and
 # attitude specified with the separate members.
 #
-# When a Part is constructed __init__ checks the geometry to see in which of the 90-degree rotations it
-# is distinct. This list is also kept with the Part so we can optimize the placement during solving to
+# The distinct orientations of the part as (ismirrored, rotation) pairs come from Orientations.py for
+# the whole catalog and are kept with the Part so we can optimize the placement during solving to
 # eliminate duplicates.
 class Part:
   
@@ -55,15 +85,7 @@ class Part:
     self.mirror = mirror
     self.ismirrored = False
     self.candidatepositions = []
-
-    # build a list of distinct rotations
-    self.rotations = [0]
-    rotation_polys = [self.polygon]
-    for rotation in range(90, 360, 90):
-      test = rotate(self.polygon, rotation)
-      if not any(test.equals(poly) for poly in rotation_polys):
-        self.rotations.append(rotation)
-        rotation_polys.append(test)
+    self.orientations = [(False, 0)]
 
   def __copy__(self):
     clone = Part(self.name, self.polygon, self.color, self.mirror)
@@ -72,9 +94,18 @@ class Part:
     clone.rotation = self.rotation
     clone.ismirrored = self.ismirrored
     clone.candidatepositions = self.candidatepositions.copy()
+    clone.orientations = self.orientations
 
     return clone
 
+  # Bitmask of the board cells the part covers in its current position.
+  def cellmask(self):
+    return partmask(self.name, self.xoffset, self.yoffset, self.rotation, self.ismirrored)
+
+  # The unit cells the polygon covers, for working out its distinct orientations.
+  def cells(self):
+    return Placements.rasterize([(round(x), round(y)) for x, y in self.polygon.exterior.coords])
+
   def finalpolygon(self):
     p = self.polygon
 
@@ -85,8 +116,36 @@ class Part:
 
     return p
 
+# Positions repeat all the time during the search, so cache their masks.
+@functools.lru_cache(maxsize = None)
+def partmask(name, xoffset, yoffset, rotation, ismirrored):
+  return Placements.mask(Placements.shapelycells(name, xoffset, yoffset, rotation, ismirrored))
+
 monthlabels = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
 weekdaylabels = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+# Static tables for working with masks of board cells, see Placements.boardcells: The name
+# of the square each cell stands for and the neighbours of each cell.
+squarenames = [monthlabels[value-1] if kind == 'month' else weekdaylabels[value] if kind == 'weekday' else str(value) for kind, value in Placements.cellkinds]
+neighbourmasks = [Placements.mask([n for n in [(x-1, y), (x+1, y), (x, y-1), (x, y+1)] if n in Placements.cellindex]) for x, y in Placements.boardcells]
+
+# Split a mask of cells into its connected regions by flood filling from the lowest cell
+# still left.
+def regions(mask):
+  result = []
+  while mask:
+    region = frontier = mask & -mask
+    while frontier:
+      grown = 0
+      while frontier:
+        bit = frontier & -frontier
+        grown |= neighbourmasks[bit.bit_length()-1]
+        frontier ^= bit
+      frontier = grown & mask & ~region
+      region |= frontier
+    result.append(region)
+    mask &= ~region
+  return result
     
 # BoardState is the main object class for the solver. It carries a reference to the puzzle being solved
 # (name, list of parts and the complete geometry of the target). It has a list of parts still available,
@@ -107,80 +166,33 @@ class BoardState:
     self.parts_available = parts_available
     self.candidateposition = None
 
+    # The board cells not covered by a part yet, see Placements.boardcells.
+    self.freemask = Placements.fullmask
+
     # self.sanity()
 
   def clearmappedsquares(self):
-    self.freecoords = []
     self.squarenames = []
     self.monthsquares = []
     self.daysquares = []
     self.weekdaysquares = []
     
-  def mapsquares(self, target):
+  # Map the cells in mask to months, days and weekdays.
+  def mapsquares(self, mask):
+    while mask:
+      bit = mask & -mask
+      mask ^= bit
+
+      i = bit.bit_length()-1
+      kind, value = Placements.cellkinds[i]
+      if kind == 'month':
+        self.monthsquares.append(value)
+      elif kind == 'day':
+        self.daysquares.append(value)
+      else:
+        self.weekdaysquares.append(value)
+      self.squarenames.append(squarenames[i])
 
-    #logger = logging.getLogger('mapsquares')
-    #logger.debug('target.area={area}'.format(
-    #  area=target.area
-    #))
-    
-    # Find uncovered squares in the polygon target and map them 
-    # to months, days and weekdays.
-    freecoords = []
-    for x in range(0, 8):
-        for y in range(-1, 7):
-            square = Polygon([(x,y), (x+1, y), (x+1, y+1), (x, y+1), (x,y)])
-            i = target.intersection(square)
-            if (i.area):
-                minx, miny, _, _ = i.bounds
-                self.freecoords.append((int(minx), int(miny)))
-                freecoords.append((int(minx), int(miny)))
-                #logger.debug('free square ({x},{y})'.format(
-                #  x=minx,
-                #  y=miny
-                #))
-
-    for square in freecoords:
-        x, y = square
-
-        weekday = None
-
-        if y == 6: # Top row of months
-          month = x + 1
-          self.monthsquares.append(month)
-          self.squarenames.append(monthlabels[month-1])
-        elif y == 5: # Bottom row of months
-          month = x + 7
-          self.monthsquares.append(month)
-          self.squarenames.append(monthlabels[month-1])
-        elif ((y == 0) and (x <= 2)) or (y in range(1, 5)): # Day-rows
-          row = 4-y # Top row: 4-4 = 0, bottom row 4-0 = 4
-          day = 7*row + x + 1
-          self.daysquares.append(day)
-          self.squarenames.append(str(day))
-        
-        elif (x == 4) and (y == 0):
-          weekday = 0 # 'Mon'
-        elif (x == 5) and (y == 0):
-          weekday = 1 # 'Tue'
-        elif (x == 6) and (y == 0):
-          weekday = 2 # 'Wed'
-        elif (x == 4) and (y == -1):
-          weekday = 3 # 'Thu'
-        elif (x == 5) and (y == -1):
-          weekday = 4 # 'Fri'
-        elif (x == 6) and (y == -1):
-          weekday = 5 # 'Sat'
-        elif (x == 3) and (y == 0):
-          weekday = 6 # 'Sun'
-
-        if weekday != None:
-          self.weekdaysquares.append(weekday)
-          self.squarenames.append(weekdaylabels[weekday])
-
-    #logger.debug('squarenames={squares}'.format(
-    #  squares=','.join(self.squarenames)
-    #))
-    
   def __copy__(self):
     clone = BoardState(self.remaining_target, self.parts_placed.copy(), self.parts_available.copy())
     #clone.calendarconfiguration = self.calendarconfiguration
@@ -244,9 +256,11 @@ class BoardState:
 
     logger = logging.getLogger('plot')
 
+    counters['tilings'] += 1
+
     # Find uncovered squares. There should be exactly three.
     self.clearmappedsquares()
-    self.mapsquares(self.remaining_target)
+    self.mapsquares(self.freemask)
     
     # Is this a valid calendarpuzzle-solution?
     valid = False
@@ -270,9 +284,10 @@ class BoardState:
         )
 
         # Is this a new solution?
-        isnew = not os.path.isfile(options.runfolder + '/' + catalogname + '.png')
+        isnew = catalogname not in known
+        solutioncounts[catalogname] = solutioncounts.get(catalogname, 0) + 1
           
-        logger.info('Valid {isnew} solution for {monthlabel}-{day:02d}-{weekdaylabel}.'.format(
+        logger.log(logging.INFO if isnew else logging.DEBUG, 'Valid {isnew} solution for {monthlabel}-{day:02d}-{weekdaylabel}.'.format(
           isnew= ('new' if isnew else 'duplicate'),
           monthlabel=monthlabels[self.monthsquares[0]-1],
           day=self.daysquares[0],
@@ -280,11 +295,18 @@ class BoardState:
         ))
         
         if not isnew:
+          counters['duplicate'] += 1
           return # don't plot duplicates.
 
+        counters['new'] += 1
+        found.append(catalogname)
+        known.add(catalogname)
+        missingmasks.discard(Placements.configurationmask(self.monthsquares[0], self.daysquares[0], self.weekdaysquares[0]))
+
     else:
         catalogname = 'xxxxxx-'
-        logger.info('Invalid solution (' + ','.join(self.squarenames) + ')')    
+        counters['invalid'] += 1
+        logger.debug('Invalid solution (' + ','.join(self.squarenames) + ')')
 
         return # Done. No point in plotting this.
   
@@ -356,51 +378,52 @@ class BoardState:
 
     return
 
+# Look up the distinct orientations of the parts once for the whole catalog.
+orientationtable = Orientations.table({part.name: (part.cells(), part.mirror) for part in BoardState.partscatalog}, 'shapely')
+for part in BoardState.partscatalog:
+  part.orientations = orientationtable[part.name]
+
+# Names of the JSON files in a catalog folder without extension, read in one go.
+def catalogfiles(folder):
+  result = set()
+  try:
+    with os.scandir(folder) as entries:
+      for entry in entries:
+        name, ext = os.path.splitext(entry.name)
+        if (ext == '.json') and name[:6].isdigit():
+          result.add(name)
+  except FileNotFoundError:
+    pass
+  return result
+
 def loadmissing():
   # Find all missing configurations.
 
   global options
-  global missingconfigurations
 
   logger = logging.getLogger('loadmissing')
 
-  missingconfigurations = {}
-  missingcount = 0
+  missingmasks.clear()
 
   catalogfolder = options.runfolder + '/../catalog' 
+  catalognames = catalogfiles(catalogfolder)
+
   for year in range(2022,2049):
     start = datetime.datetime(year, 1, 1)
     end = datetime.datetime(year, 12, 31)
     d = start
     while (d<=end):
-      catalogbasename = '{month:02d}{day:02d}{weekday:02d}-{monthlabel}-{day:02d}-{weekdaylabel}'.format(
-        month=d.month,
-        day=d.day,
-        weekday=d.weekday(),
-        monthlabel=monthlabels[d.month-1],
-        weekdaylabel=weekdaylabels[d.weekday()]
-      )
-      configuration = '{month}-{day}-{weekday}'.format(
-        month=d.month,
-        day=d.day,
-        weekday=d.weekday()  
-      )
-          
-      jsonfile = catalogfolder + '/' + catalogbasename + '.json'
-      if not os.path.isfile(jsonfile):
-        if not d.month in missingconfigurations:
-          missingconfigurations[d.month] = {}
-          missingcount += 1          
-        if not d.day in missingconfigurations[d.month]:
-          missingconfigurations[d.month][d.day] = []
-          missingcount += 1
-        if not d.weekday() in missingconfigurations[d.month][d.day]:
-          missingconfigurations[d.month][d.day].append(d.weekday())
-          missingcount += 1
+      configuration = (d.month, d.day, d.weekday())
+      if not Placements.catalogname(*configuration) in catalognames:
+        missingmasks.add(Placements.configurationmask(*configuration))
   
       d = d + datetime.timedelta(days = 1)
 
-  logger.debug('{missingcount} missing configurations identified.'.format(missingcount=missingcount))
+  # Those found by the run we resume are not missing anymore.
+  for catalogname in found:
+    missingmasks.discard(Placements.configurationmask(int(catalogname[0:2]), int(catalogname[2:4]), int(catalogname[4:6])))
+
+  logger.info('{missingcount} missing configurations identified.'.format(missingcount=len(missingmasks)))
 
 # Quick check for overlapping boundary boxes before going in deep.
 def overlap(bounds1, bounds2):
@@ -425,15 +448,78 @@ def overlap(bounds1, bounds2):
   else:
     return True # overlapping
     
+# Write the search state to the output folder if the checkpoint interval has passed or
+# if forced. The file is replaced atomically so a kill while writing leaves the previous
+# checkpoint intact.
+def checkpoint(force = False, finished = False):
+
+  global lastcheckpoint
+
+  if not force and (time.monotonic() - lastcheckpoint < options.checkpointinterval):
+    return
+
+  jsondata = {
+    'seed': options.seed,
+    'parts': partsorder,
+    'position': position,
+    'counters': counters,
+    'found': found,
+    'solutioncounts': solutioncounts,
+    'finished': finished,
+    'saved': datetime.datetime.now().isoformat()
+  }
+
+  checkpointname = options.runfolder + '/checkpoint.json'
+  with open(checkpointname + '.tmp', 'w') as f:
+    json.dump(jsondata, f, indent=4)
+    f.flush()
+    os.fsync(f.fileno())
+  os.replace(checkpointname + '.tmp', checkpointname)
+
+  lastcheckpoint = time.monotonic()
+
+  logger = logging.getLogger('checkpoint')
+  logger.debug('Checkpoint at |{position}|'.format(position='|'.join(str(i) for i in position)))
+
+# Restore the search state from the checkpoint in the output folder.
+def loadcheckpoint():
+
+  global options
+  global resumeposition
+  global found
+
+  logger = logging.getLogger('loadcheckpoint')
+
+  checkpointname = options.runfolder + '/checkpoint.json'
+  with open(checkpointname) as f:
+    jsondata = json.load(f)
+
+  options.seed = jsondata['seed']
+  counters.update(jsondata['counters'])
+  found = jsondata['found']
+  solutioncounts.update(jsondata.get('solutioncounts', {}))
+  resumeposition = jsondata['position']
+
+  logger.info('Resuming from checkpoint of {saved} at |{position}| with {new} new solutions found.'.format(
+    saved=jsondata['saved'],
+    position='|'.join(str(i) for i in resumeposition),
+    new=counters['new']
+  ))
+
+  return jsondata
+
 # Main meat of the recursive solver. Called with a board state checks wether it is already solved.
 # If not solved it generates candidate positions for available parts and can identify the board 
 # as a dead end if none are found. If candidate positions are found recurse for each of them.
 def solve(board, progress):
 
   global options
+  global resumeposition
   
   logger = logging.getLogger('solve')
 
+  checkpoint()
+
   indent = '  ' * len(board.parts_placed)
   
   if not board.parts_available:
@@ -448,15 +534,12 @@ def solve(board, progress):
     # them with parts. So when mapping them if we find more than one of
     # day, month and weekday each we are done with this branch.
     board.clearmappedsquares()
-    if board.remaining_target.geom_type == 'MultiPolygon':
-      for p in board.remaining_target.geoms:
-        if p.area <= 3:
-          board.mapsquares(p)
-    else:
-      if board.remaining_target.area <= 3:
-        board.mapsquares(board.remaining_target) 
+    for region in regions(board.freemask):
+      if region.bit_count() <= 3:
+        board.mapsquares(region)
     
     if len(board.daysquares)>1 or len(board.monthsquares)>1 or len(board.weekdaysquares)>1:
+      counters['deadends'] += 1
       level = len(board.parts_placed)
       ll = logging.DEBUG if level>options.infolevel else logging.INFO
       logger.log(ll, '{progress}{indent}Dead end: Small disjoints violate valid solution ({squares}).'.format(
@@ -468,38 +551,17 @@ def solve(board, progress):
     else:  
       # Not a dead-end after the check for disjoint areas.
 
-      # For each missing configuration check wether it can still be done. If none remains we have hit
-      # a dead end for a new solution.
-      board.clearmappedsquares()
-      board.mapsquares(board.remaining_target)
-    
-      foundmissing = True
-      if False:
-        for missingmonth in missingconfigurations.keys():
-          if foundmissing or (missingmonth in board.monthsquares):
-            foundmissing = True
-            break
-          else:
-            for missingday in missingconfigurations[missingmonth].keys():
-              if foundmissing or (missingday in board.daysquares):
-                foundmissing = True
-                break
-              else:
-                for missingweekday in missingconfigurations[missingmonth][missingday]:
-                  if foundmissing or (missingweekday in board.weekdaysquares):
-                    foundmissing = True
-                    break
-      
-      if not foundmissing:
+      # For each missing configuration check wether it can still be done. Its three squares
+      # must all still be free. If none remains we have hit a dead end for a new solution.
+      if options.targeted and not any((board.freemask & m) == m for m in missingmasks):
+        counters['pruned'] += 1
         level = len(board.parts_placed)
         ll = logging.DEBUG if level>options.infolevel else logging.INFO
-        logger.log(ll, '{progress}{indent}Dead end: Cannot arrive at a missing solution anymore ({squares}).'.format(
+        logger.log(ll, '{progress}{indent}Dead end: Cannot arrive at a missing solution anymore.'.format(
           progress=progress.ljust(options.infolevel*len('xxx/xxx|')),
-          indent=indent,
-          squares=','.join(board.squarenames)
+          indent=indent
         ))
 
-        quit()
       else:
         # Not a dead end after checking for missing solutions.
 
@@ -517,62 +579,58 @@ def solve(board, progress):
 
         nextpart.candidatepositions = []
 
-        mirror = [False]
-        if nextpart.mirror:
-          mirror.append(True)
-
-        for m in mirror:  
+        for m, rotation in nextpart.orientations:
           if m:
             np = scale(nextpart.polygon, -1)
           else:
             np = nextpart.polygon
-          
-          for rotation in nextpart.rotations:
-            # Clone (possibly mirrored) part in default position 
-            part = copy.copy(nextpart)
 
-            # Rotate in place
-            poly = rotate(np, rotation)
-        
-            # Figure out the part bounds in that orientation. This will not change
-            # during the scan.
-            partbounds = poly.bounds
-            partwidth = partbounds[2]-partbounds[0]
-            partheight = partbounds[3]-partbounds[1]
-            
-            # Initialize offsets so that the part is placed at the bottom-left
-            # corner of the target from its position agnostic catalog-state.
-            initialxoffset = targetbounds[0]-partbounds[0]
-            initialyoffset = targetbounds[1]-partbounds[1]
+          # Clone (possibly mirrored) part in default position 
+          part = copy.copy(nextpart)
+
+          # Rotate in place
+          poly = rotate(np, rotation)
+      
+          # Figure out the part bounds in that orientation. This will not change
+          # during the scan.
+          partbounds = poly.bounds
+          partwidth = partbounds[2]-partbounds[0]
+          partheight = partbounds[3]-partbounds[1]
+          
+          # Initialize offsets so that the part is placed at the bottom-left
+          # corner of the target from its position agnostic catalog-state.
+          initialxoffset = targetbounds[0]-partbounds[0]
+          initialyoffset = targetbounds[1]-partbounds[1]
+          
+          # Scan over the width and height of the target bounds.
+          xoffset = 0
+          while xoffset + partwidth <= targetwidth:
+            yoffset = 0
             
-            # Scan over the width and height of the target bounds.
-            xoffset = 0
-            while xoffset + partwidth <= targetwidth:
-              yoffset = 0
-              
-              while yoffset + partheight <= targetheight:          
-                part.ismirrored = m
-                part.rotation = rotation
-                part.xoffset = initialxoffset + xoffset
-                part.yoffset = initialyoffset + yoffset
-
-                # What about this position? Generate the polygon first.
-                testpoly = part.finalpolygon()
-
-                # To be a valid position the candidate part has to be completely 
-                # inside the remaining target geometry
-                #
-                # We have removed all the area covered by parts already placed
-                # from the target. So we do not need to check for overlaps with
-                # placed parts, this is already covered.          
-                if board.remaining_target.contains(testpoly):
-                  nextpart.candidatepositions.append(copy.copy(part))
-
-                yoffset = yoffset + 1
-              xoffset = xoffset + 1
+            while yoffset + partheight <= targetheight:          
+              part.ismirrored = m
+              part.rotation = rotation
+              part.xoffset = initialxoffset + xoffset
+              part.yoffset = initialyoffset + yoffset
+
+              # What about this position? Generate the polygon first.
+              testpoly = part.finalpolygon()
+
+              # To be a valid position the candidate part has to be completely 
+              # inside the remaining target geometry
+              #
+              # We have removed all the area covered by parts already placed
+              # from the target. So we do not need to check for overlaps with
+              # placed parts, this is already covered.          
+              if board.remaining_target.contains(testpoly):
+                nextpart.candidatepositions.append(copy.copy(part))
+
+              yoffset = yoffset + 1
+            xoffset = xoffset + 1
 
         # If there are no candidate positions for a part, we have hit a dead end.
         if len(nextpart.candidatepositions) == 0:
+          counters['deadends'] += 1
           level = len(board.parts_placed)
           ll = logging.DEBUG if level>options.infolevel else logging.INFO
           logger.log(ll, '{progress}{indent}Dead end: Found no candidate positions for part {name}.'.format(
@@ -592,6 +650,7 @@ def solve(board, progress):
             nextboard.candidateposition = candidate
             nextboard.parts_placed.append(candidate)
             nextboard.remaining_target = nextboard.remaining_target.difference(candidate.finalpolygon())
+            nextboard.freemask = board.freemask & ~candidate.cellmask()
 
             nextboards.append(nextboard)
             
@@ -608,10 +667,22 @@ def solve(board, progress):
           # Update candidatepositions to include any filtering that has happened.
           nextpart.candidatepositions = list(map(lambda board: board.candidateposition, nextboards))
 
-          # Now recurse down into each candidate board to find solutions.
-          random.shuffle(nextboards)
+          # Now recurse down into each candidate board to find solutions. The order is random
+          # but derived from the position in the tree, so a resumed run takes the same path.
+          random.Random(options.seed + progress).shuffle(nextboards)
+
+          # When resuming skip the branches that were done before the checkpoint.
+          level = len(board.parts_placed)
+          first = 1
+          if resumeposition and (level < len(resumeposition)):
+            first = resumeposition[level]
+
           i = 1
           for nextboard in nextboards:        
+            if i < first:
+              i += 1
+              continue
+
             level = len(board.parts_placed)
             ll = logging.DEBUG if level>options.infolevel else logging.INFO
             logger.log(ll, '{progress}{indent}{parts_placed} parts placed. Try next position {i:2d} of {nextboards:2d} for part {name}.'.format(
@@ -627,7 +698,12 @@ def solve(board, progress):
               i=i,
               nextboards=len(nextboards)
             )
+            position.append(i)
             solve(nextboard, prog)
+            position.pop()
+
+            # Once the branch we resumed into is done everything after it is new.
+            resumeposition = None
           
             i += 1
           
@@ -682,6 +758,35 @@ def parse_commandline():
     metavar = 'seed'
   )
 
+  parser.add_argument('-ci', '--checkpoint-interval',
+    action = 'store',
+    default = 60,
+    type = float,
+    help = 'Seconds between checkpoints of the search state (default: %(default)s)',
+    dest = 'checkpointinterval',
+    metavar = 'seconds'
+  )
+
+  parser.add_argument('-re', '--resume',
+    action = 'store',
+    default = False,
+    nargs = '?',
+    const = True,
+    type = str2bool,
+    help = 'Resume the run in the output folder from its checkpoint (default: %(default)s)',
+    dest = 'resume',
+    metavar = 'flag'
+  )
+
+  parser.add_argument('-ta', '--targeted',
+    action = 'store',
+    default = True,
+    type = str2bool,
+    help = 'Only search for configurations missing from the catalog, prune branches that cannot lead to one (default: %(default)s)',
+    dest = 'targeted',
+    metavar = 'flag'
+  )
+
   parser.add_argument('-pf', '--play-fanfare',
     action = 'store',
     default = True,
@@ -694,6 +799,9 @@ def parse_commandline():
   options = parser.parse_args()
   options.log_level_int = getattr(logging, options.log_level, logging.INFO)
 
+  if options.resume and not options.runfolder:
+    parser.error('--resume needs the --output-folder of the run to resume')
+
   if not options.runfolder:
     options.runfolder = os.path.dirname(os.path.realpath(__file__)) + '/' + time.strftime('%Y-%m-%d-%H-%M-%S', time.localtime())
 
@@ -724,6 +832,7 @@ def setup_logging():
 def main():
   
     global options
+    global partsorder
 
     parse_commandline()
     setup_logging()
@@ -731,6 +840,14 @@ def main():
     logger = logging.getLogger('main')
     logger.info('Starting. Output goes to {runfolder}'.format(runfolder=options.runfolder))
 
+    # When resuming seed and order of parts come from the checkpoint.
+    resumed = None
+    if options.resume:
+      resumed = loadcheckpoint()
+      if resumed['finished']:
+        logger.info('The run in {runfolder} has already finished.'.format(runfolder=options.runfolder))
+        return
+
     # Initialize random generator. This is here so that we can copy the seed and
     # put it into the code to repeat a run.
     if not options.seed:
@@ -739,17 +856,31 @@ def main():
     logger.info('Random seed in use: {0}.'.format(options.seed))
     random.seed(options.seed)
 
-    loadmissing()
+    known.update(catalogfiles(options.runfolder))
+    logger.info('{count} configurations already solved in {runfolder}.'.format(count=len(known), runfolder=options.runfolder))
+
+    if options.targeted:
+      loadmissing()
 
     target = Polygon([ (0, 0), (4, 0), (4, -1), (7, -1), (7, 5), (6, 5), (6, 7), (0, 7), (0, 0)])
     parts_available = copy.copy(BoardState.partscatalog)
     random.shuffle(parts_available)
+    if resumed:
+      parts_available.sort(key=lambda part: resumed['parts'].index(part.name))
+    partsorder = [part.name for part in parts_available]
+
     board = BoardState(target, [], parts_available)
     solve(board, '')
+    checkpoint(force=True, finished=True)
 
     endtime = datetime.datetime.now().replace(microsecond=0)
     runtime = (endtime-starttime)
     logger.info('Finished. Total runtime: {runtime}'.format(runtime=runtime))
+    logger.info('{tilings} tilings, {new} new, {duplicate} duplicate and {invalid} invalid solutions, {deadends} dead ends, {pruned} pruned.'.format(**counters))
+    logger.info('Solutions found for {count} configurations, at most {most} for one.'.format(
+      count=len(solutioncounts),
+      most=max(solutioncounts.values(), default=0)
+    ))
     
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -23,9 +23,18 @@ import calendar
 import portalocker
 import platform
 
+import Placements
+import Orientations
+import SolutionIndex
+import SolutionPack
+import CatalogWriter
+import Scheduler
+
 # Global variables
 starttime = datetime.datetime.now().replace(microsecond=0)
 options = None
+solutionindex = SolutionIndex.SolutionIndex()
+catalogwriter = None
 finalpositions = 0
 
 # Given a 2D-array set a True at coords. Resize as required padding
@@ -133,15 +142,14 @@ def PolyArrayFill(polyarray, x, y, oldvalue, newvalue):
 # the operation of the solver and a final_polygon method that returns the polygon in the position and
 # attitude specified with the separate members.
 #
-# When a Part is constructed __init__ checks the geometry to see in which of the 90-degree rotations it
-# is distinct. This list is also kept with the Part so we can optimize the placement during solving to
+# The distinct orientations of the part as (ismirrored, rotation) pairs come from Orientations.py for
+# the whole catalog and are kept with the Part so we can optimize the placement during solving to
 # eliminate duplicates.
 class Part:
   
-  def __init__(self, name, polygon, color, rotationangles, mirror):
+  def __init__(self, name, polygon, color, mirror):
     self.name = name
     self.polygon = polygon
-    self.rotationangles = rotationangles
     self.color = color
     self.xoffset = 0
     self.yoffset = 0
@@ -149,17 +157,23 @@ class Part:
     self.mirror = mirror
     self.ismirrored = False
     self.candidatepositions = []
+    self.orientations = [(False, 0)]
 
   def __copy__(self):
-    clone = Part(self.name, self.polygon, self.color, self.rotationangles, self.mirror)
+    clone = Part(self.name, self.polygon, self.color, self.mirror)
     clone.xoffset = self.xoffset
     clone.yoffset = self.yoffset
     clone.rotation = self.rotation
     clone.ismirrored = self.ismirrored
     clone.candidatepositions = self.candidatepositions.copy()
+    clone.orientations = self.orientations
 
     return clone
 
+  # The cells of the part array, for working out its distinct orientations.
+  def cells(self):
+    return [(x, y) for x in range(0, len(self.polygon)) for y in range(0, len(self.polygon[x])) if self.polygon[x][y]]
+
   def finalpolygon(self):
     p = copy.deepcopy(self.polygon)
 
@@ -293,11 +307,11 @@ class BoardState:
     self.logger.info('Parts available in descending order of area:')
     totalarea = 0
     for part in BoardState.partscatalog:
-      self.logger.info('{name}: area={area}, mirror={mirror}, distinct rotations={rotations}'.format(
+      self.logger.info('{name}: area={area}, mirror={mirror}, distinct orientations={orientations}'.format(
           name=part.name, 
           mirror=('Yes' if part.mirror else 'No'),
           area=part.polygon.area, 
-          rotations=part.rotations
+          orientations=part.orientations
         ))
       totalarea += part.polygon.area
     self.logger.info('Total area of parts={totalarea}'.format(totalarea=totalarea))
@@ -351,24 +365,27 @@ class BoardState:
     return result
 
   partscatalog = [
-    Part('A', Polygon([(0, 0), (1, 0), (2, 0), (3, 0)]),          'firebrick',  [0, 90],            False),        
-    Part('B', Polygon([(0, 0), (1, 0), (2, 0), (3, 0), (0, 1)]),  'green',      [0, 90, 180, 270],  True),    
-    Part('C', Polygon([(0, 0), (1, 0), (2, 0), (0, 1)]),          'blue',       [0, 90, 180, 270],  True),
-    Part('D', Polygon([(0, 0), (1, 0), (2, 0), (1, 1), (1, 2)]),  'purple',     [0, 90, 180, 270],  False),
-    Part('E', Polygon([(0, 0), (1, 0), (1, 1), (1, 2), (2, 2)]),  'yellow',     [0, 90],            True),
-    Part('F', Polygon([(0, 0), (1, 0), (0, 1), (1, 1), (2, 1)]),  'firebrick',  [0, 90, 180, 270],  True),    
-    Part('G', Polygon([(0, 0), (1, 0), (2, 0), (2, 1), (2, 2)]),  'green',      [0, 90, 180, 270],  False),    
-    Part('H', Polygon([(0, 0), (1, 0), (2, 0), (0, 1), (2, 1)]),  'blue',       [0, 90, 180, 270],  False),    
-    Part('I', Polygon([(0, 0), (1, 0), (2, 0), (2, 1), (3, 1)]),  'purple',     [0, 90, 180, 270],  True),
-    Part('J', Polygon([(0, 0), (1, 0), (1, 1), (2, 1)]),          'yellow',     [0, 90],            True)
+    Part('A', Polygon([(0, 0), (1, 0), (2, 0), (3, 0)]),          'firebrick', False),        
+    Part('B', Polygon([(0, 0), (1, 0), (2, 0), (3, 0), (0, 1)]),  'green',     True),    
+    Part('C', Polygon([(0, 0), (1, 0), (2, 0), (0, 1)]),          'blue',      True),
+    Part('D', Polygon([(0, 0), (1, 0), (2, 0), (1, 1), (1, 2)]),  'purple',    False),
+    Part('E', Polygon([(0, 0), (1, 0), (1, 1), (1, 2), (2, 2)]),  'yellow',    True),
+    Part('F', Polygon([(0, 0), (1, 0), (0, 1), (1, 1), (2, 1)]),  'firebrick', True),    
+    Part('G', Polygon([(0, 0), (1, 0), (2, 0), (2, 1), (2, 2)]),  'green',     False),    
+    Part('H', Polygon([(0, 0), (1, 0), (2, 0), (0, 1), (2, 1)]),  'blue',      False),    
+    Part('I', Polygon([(0, 0), (1, 0), (2, 0), (2, 1), (3, 1)]),  'purple',    True),
+    Part('J', Polygon([(0, 0), (1, 0), (1, 1), (2, 1)]),          'yellow',    True)
   ]
 
   random.shuffle(partscatalog)
 
-  # Save the current board.
+  # Save the current board. The solution is handed to the catalog writer which puts it
+  # to disk in the background, the search carries on right away.
   def save(self):
     
     global options
+    global catalogwriter
+    global solutionindex
 
     jsonparts = []
     for part in self.parts_placed:
@@ -381,24 +398,22 @@ class BoardState:
       }
       jsonparts.append(jsonpart)
 
-    jsondata = {
-        'configuration': {
-            'month': self.calendarconfiguration.month,
-            'monthlabel': monthlabels[self.calendarconfiguration.month-1],
-            'day': self.calendarconfiguration.day,
-            'weekday': self.calendarconfiguration.weekday,
-            'weekdaylabel': weekdaylabels[self.calendarconfiguration.weekday]
-        },
-        'board': PolyArrayFormat(self.remaining_target),
-        'parts': jsonparts
-    }
-
-    catalogname = f'{self.calendarconfiguration.month:02d}{self.calendarconfiguration.day:02d}{self.calendarconfiguration.weekday:02d}-{monthlabels[self.calendarconfiguration.month-1]}-{self.calendarconfiguration.day:02d}-{weekdaylabels[self.calendarconfiguration.weekday]}'
-    destname = options.runfolder + '/../catalog3/' + catalogname + '.json'
-        
-    with open(destname, 'w') as f:
-      json.dump(jsondata, f, sort_keys=True, indent=4)
+    configuration = (self.calendarconfiguration.month, self.calendarconfiguration.day, self.calendarconfiguration.weekday)
+    solution = Placements.solutionfromparts(jsonparts, Placements.arraycells)
+
+    # A board the placement table does not know would break the journal. Report it and carry on.
+    if solution is None:
+      logging.getLogger('save').error(f'{Placements.catalogname(*configuration)}: Parts do not map to placements, not saved: {jsonparts}')
+      return
+
+    catalogwriter.put(configuration, solution)
+    solutionindex.add(configuration, solution)
     
+# Look up the distinct orientations of the parts once for the whole catalog.
+orientationtable = Orientations.table({part.name: (part.cells(), part.mirror) for part in BoardState.partscatalog}, 'array')
+for part in BoardState.partscatalog:
+  part.orientations = orientationtable[part.name]
+
 # Main meat of the recursive solver. Called with a board state checks wether it is already solved.
 # If not solved it generates candidate positions for available parts and can identify the board 
 # as a dead end if none are found. If candidate positions are found recurse for each of them.
@@ -473,59 +488,54 @@ def solve(board):
 
       nextpart.candidatepositions = []
 
-      mirror = [False]
-      if nextpart.mirror:
-        mirror.append(True)
-
-      for m in mirror:  
-        for rotation in nextpart.rotationangles:
-          # Clone (possibly mirrored) part in default position 
-          part = copy.copy(nextpart)
-          part.rotation = rotation
-          part.ismirrored = m
-          poly = part.finalpolygon()
-
-          for xoffset in range(0, targetwidth):
-            for yoffset in range(0, targetheight):
-
-              fits = True
-              for partx in range(0, len(poly)):              
-                x = partx + xoffset
-                if x<0 or x>=len(board.remaining_target):
+      for m, rotation in nextpart.orientations:
+        # Clone (possibly mirrored) part in default position 
+        part = copy.copy(nextpart)
+        part.rotation = rotation
+        part.ismirrored = m
+        poly = part.finalpolygon()
+
+        for xoffset in range(0, targetwidth):
+          for yoffset in range(0, targetheight):
+
+            fits = True
+            for partx in range(0, len(poly)):              
+              x = partx + xoffset
+              if x<0 or x>=len(board.remaining_target):
+                # Part sticks out
+                fits = False
+                break # partx
+
+              for party in range(0, len(poly[partx])):
+                y = party + yoffset
+                if y<0 or y>=len(board.remaining_target[x]):
                   # Part sticks out
                   fits = False
-                  break # partx
-
-                for party in range(0, len(poly[partx])):
-                  y = party + yoffset
-                  if y<0 or y>=len(board.remaining_target[x]):
-                    # Part sticks out
-                    fits = False
-                    break # party
+                  break # party
+                else:
+                  # Is there substance to the part here?
+                  if poly[partx][party]:
+                    # Yes. We need space on the target
+                    if board.remaining_target[x][y] == None:
+                      # There is no space here on the board
+                      fits = False
+                      break # party
+                    if PolyArrayValue(board.remaining_target,x,y)[0]:
+                      # Space on the board already occupied
+                      fits = False
+                      break # party
                   else:
-                    # Is there substance to the part here?
-                    if poly[partx][party]:
-                      # Yes. We need space on the target
-                      if board.remaining_target[x][y] == None:
-                        # There is no space here on the board
-                        fits = False
-                        break # party
-                      if PolyArrayValue(board.remaining_target,x,y)[0]:
-                        # Space on the board already occupied
-                        fits = False
-                        break # party
-                    else:
-                      # No, this is empty bit in the part array.
-                      pass
-
-                if not fits:
-                  break # partx  
-
-              if fits:
-                part.polygon = poly
-                part.xoffset = xoffset
-                part.yoffset = yoffset
-                nextpart.candidatepositions.append(copy.copy(part))                
+                    # No, this is empty bit in the part array.
+                    pass
+
+              if not fits:
+                break # partx  
+
+            if fits:
+              part.polygon = poly
+              part.xoffset = xoffset
+              part.yoffset = yoffset
+              nextpart.candidatepositions.append(copy.copy(part))                
 
       random.shuffle(nextpart.candidatepositions)
 
@@ -603,18 +613,28 @@ def solve(board):
               name=nextpart.name
             ))
 
-          if solve(nextboard):
+          if solve(nextboard) and options.singlesolution:
             # Found a solution. Unwind recursion.
             return True
           
           i += 1
           
-# Controller for preparing a puzzle and starting the solver.
+# Controller for preparing a puzzle and starting the solver. Dates with a known solution
+# are answered from the solution index, only missing configurations are solved.
 def solvefordate(date):
 
+  global solutionindex
+
   logger = logging.getLogger('solvefordate')
   logger.info(f'solvefordate({date})')
 
+  configuration, known = solutionindex.lookup(date)
+  if known:
+    logger.info(f'solvefordate({date}) - {Placements.catalogname(*configuration)} answered from solution index')
+    for row in Placements.boardrows(known[0], configuration):
+      logger.info(f'  {row}')
+    return known[0]
+
   # Extract relevant parts from the date. 
   weekday = date.weekday() # 0 = Monday matches weekdaylabels
   day = date.day # 1..31
@@ -622,6 +642,9 @@ def solvefordate(date):
 
   solvefor(month, day, weekday)
 
+  # The solution found, if any, was added to the index by BoardState.save().
+  return solutionindex.solution(date)
+
 def solvefor(month, day, weekday):
 
   global finalpositions
@@ -647,6 +670,68 @@ def solvefor(month, day, weekday):
   duration = end - start
   logger.info(f'solvefor({month}, {day}, {weekday} \"{weekdaylabels[weekday]}\") - finished after {duration}')
   
+# Solutions found are written to the catalog in the background.
+def startcatalogwriter():
+  return CatalogWriter.CatalogWriter(options.catalogjournal, options.catalogfolder if options.writejson else None).start()
+
+# Solve a configuration for the scheduler. The lock on it is released when this returns, so
+# have the solutions written and synced first, otherwise a concurrent process could take the
+# configuration before they are on disk.
+def solveandflush(month, day, weekday):
+  solvefor(month, day, weekday)
+  catalogwriter.flush()
+
+# Configurations found in the solution journal so far, and how far it has been read.
+journalconfigurations = set()
+journaloffset = 0
+
+# The configurations with a solution in the journal. Only the records appended since the
+# last call are read. Without JSON output the journal is the only record of what has been
+# solved.
+def journalsolved():
+  global journaloffset
+
+  configurations, journaloffset = SolutionPack.journalconfigurations(options.catalogjournal, journaloffset)
+  journalconfigurations.update(configurations)
+  return journalconfigurations
+
+def solvedinjournal(configuration):
+  return configuration in journalsolved()
+
+# Solve one configuration handed out by Scheduler.py. Worker processes do not run atexit
+# handlers, so there each configuration gets a catalog writer of its own that is closed
+# before reporting back.
+def solvescheduled(configuration, date):
+  global catalogwriter
+
+  inworker = catalogwriter is None
+  if inworker:
+    catalogwriter = startcatalogwriter()
+
+  try:
+    return Scheduler.solvelocked(solveandflush, options.catalogfolder, configuration, date, solvedinjournal)
+  finally:
+    if inworker:
+      catalogwriter.close()
+      catalogwriter = None
+
+# Set up a worker process of the scheduler.
+def initworker(workeroptions):
+  global options
+  global solutionindex
+  global catalogwriter
+
+  options = workeroptions
+  random.seed(options.seed)
+
+  if not logging.getLogger().handlers:
+    setup_logging()
+
+  solutionindex = SolutionIndex.loadindex(options.solutionpack)
+
+  # A writer inherited from the main process has no thread here.
+  catalogwriter = None
+
 # Conversion function for argparse booleans
 def str2bool(v):
   if v.lower() in ('yes', 'true', 't', 'y', '1'):
@@ -673,6 +758,32 @@ def parse_commandline():
     metavar = 'level'
   )
 
+  parser.add_argument('-ss', '--single-solution',
+    action = 'store',
+    default = True,
+    type = str2bool,
+    help ='Stop after the first solution found (default: %(default)s)',
+    dest ='singlesolution',
+    metavar = 'flag'
+  )
+
+  parser.add_argument('-cj', '--catalog-journal',
+    action = 'store',
+    default = '',
+    help = 'Journal to append solutions to (default: catalog3.journal next to the catalog folder)',
+    dest = 'catalogjournal',
+    metavar = 'file'
+  )
+
+  parser.add_argument('-wj', '--write-json',
+    action = 'store',
+    default = True,
+    type = str2bool,
+    help = 'Also write the first solution for each configuration to the catalog folder as JSON (default: %(default)s)',
+    dest = 'writejson',
+    metavar = 'flag'
+  )
+
   parser.add_argument('-of', '--output-folder',
     action = 'store',
     default = '',
@@ -689,6 +800,14 @@ def parse_commandline():
     metavar = 'seed'
   )
 
+  parser.add_argument('-sp', '--solution-pack',
+    action = 'store',
+    default = '',
+    help = 'Solution pack to answer known dates from (default: catalog3.pack next to the catalog folder)',
+    dest = 'solutionpack',
+    metavar = 'file'
+  )
+
   parser.add_argument('-pf', '--play-fanfare',
     action = 'store',
     default = True,
@@ -698,12 +817,37 @@ def parse_commandline():
     metavar = 'flag'
   )
 
+  parser.add_argument('-j', '--jobs',
+    action = 'store',
+    default = 1,
+    type = int,
+    help = 'Number of processes solving configurations, 0 for one per core (default: %(default)s)',
+    dest = 'jobs',
+    metavar = 'count'
+  )
+
+  parser.add_argument('-o', '--order',
+    action = 'store',
+    default = 'need',
+    choices = Scheduler.orders,
+    help = 'Solve the configurations needed soonest or the hardest first (default: %(default)s)',
+    dest = 'order'
+  )
+
   options = parser.parse_args()
   options.log_level_int = getattr(logging, options.log_level, logging.INFO)
 
   if not options.runfolder:
     options.runfolder = os.path.dirname(os.path.realpath(__file__)) + '/' + time.strftime('%Y-%m-%d-%H-%M-%S', time.localtime())
 
+  options.catalogfolder = options.runfolder + '/../catalog3'
+
+  if not options.solutionpack:
+    options.solutionpack = options.runfolder + '/../catalog3.pack'
+
+  if not options.catalogjournal:
+    options.catalogjournal = options.runfolder + '/../catalog3.journal'
+
 # Set up a logger each for a file in the output folder and the console.      
 def setup_logging():
   
@@ -728,6 +872,8 @@ def setup_logging():
 def main():
   
   global options
+  global solutionindex
+  global catalogwriter
   
   parse_commandline()
   setup_logging()
@@ -743,77 +889,30 @@ def main():
   logger.info('Random seed in use: {0}.'.format(options.seed))
   random.seed(options.seed)
 
+  # Known solutions to answer from before solving anything.
+  solutionindex = SolutionIndex.loadindex(options.solutionpack)
+  logger.info(f'{len(solutionindex)} configurations known from {options.solutionpack}.')
+
+  # Solutions found are written to the catalog in the background.
+  catalogwriter = startcatalogwriter()
+
   # solvefor(2, 29, 4)
   # quit()
 
-  date = datetime.date(2023, 9, 11)
+  # date = datetime.date(2023, 9, 11)
   # date = datetime.date.today()
-  solvefordate(date)
-  quit()
-
-  # I have determined that the years 2022 to 2048 (inclusive) use all possible
-  # configurations of month, day and weekday. Solve for each of them:
-  for year in range(2022, 2049):    
-    # Just regular:
-    months = range(1,13)
-    days = range(1,32)
-
-    # Starting on a certain date:
-    startmonth = 1
-    startday = 1
-    months = list(range(startmonth,13)) + list(range(1,startmonth))
-    days = list(range(startday,32)) + list(range(1,startday))
-    
-    for month in months:
-      for day in days:
-
-        # Skip invalid dates:
-        if (month == 2) and (day > (29 if calendar.isleap(year) else 28)):
-          continue
-        elif (month in [4,6,9,11]) and (day > 30):
-          continue
-
-        weekday = datetime.datetime(year, month, day).weekday() # 0=Mon, 1=Tue, 2=Wed, 3=Thu, 4=Fri, 5=Sat, 6=Sun
-            
-        # Attempt to clean up stale lock files
-        lockfiles = glob.glob(options.runfolder + '/../catalog3/*.lck')
-        for lockfile in lockfiles:
-            try:
-              os.remove(lockfile)
-            except:
-              pass # Most propably still locked
-
-        catalogname = f'{month:02d}{day:02d}{weekday:02d}-{monthlabels[month-1]}-{day:02d}-{weekdaylabels[weekday]}'
-      
-        # Already solved?
-        if glob.glob(options.runfolder + '/../catalog3/' + catalogname + '.json'):
-          logger.info(f'Already done {catalogname}')
-        else:
-          # No solution exists yet. Create a lock file so other processes know we are working on this.
-          lockfilename = options.runfolder + '/../catalog3/' + catalogname + '.lck'
-          try:
-            with portalocker.Lock(lockfilename, 'wt', timeout = 1) as lockfile:              
-              lockfile.write(f'PID {os.getpid()}, started {datetime.datetime.now()}')
-              lockfile.flush()
-              os.fsync(lockfile.fileno())
-
-              # In Windows rename the shell title.
-              if platform.system() == 'Windows':
-                os.system(f'cmd.exe /C title {year:04d}-{month:02d}-{day:02d}')
-                              
-              logger.info(f'Now solving for {catalogname}')        
-              os.makedirs(options.runfolder, exist_ok = True)                            
-              solvefor(month, day, weekday)
-        
-          except portalocker.exceptions.LockException:
-              logger.info(f'{catalogname} locked, being solved by concurrent process')
-
-          finally:
-            try:
-              os.remove(lockfilename)
-            except:
-              pass
-    
+  # solvefordate(date)
+  # quit()
+
+  # Every date from 2022 on maps to one of the configurations of month, day and weekday.
+  # Solve each of them once, in the order the scheduler hands them out.
+  Scheduler.solveall(options.catalogfolder, solvescheduled,
+    order = options.order,
+    jobs = options.jobs,
+    known = solutionindex.configurations() + list(journalsolved()),
+    initializer = initworker,
+    initargs = (options,))
+
   endtime = datetime.datetime.now().replace(microsecond=0)
   runtime = (endtime-starttime)
   logger.info('Finished. Total runtime: {runtime}'.format(runtime=runtime))